@@ -0,0 +1,76 @@
+# This Python script exercises the adaptive partition concurrency controller against the local stand-in for the
+# Unstructured partition API. The stand-in accepts a limited number of concurrent requests (answering 429 beyond it),
+# can fail a share of requests with 500 and simulates a per-page processing time. Each window sends
+# (documents in flight x split concurrency) concurrent page requests, feeds the latencies and status codes to the
+# controller and applies its adjustment, so that the level the controller settles on can be checked against the
+# capacity of the stand-in.
+#
+# Usage: python airflow/benchmarks/benchmark_concurrency.py [--capacity 12] [--windows 20] [--error-rate 0.0]
+
+import os
+import sys
+import time
+import argparse
+import requests
+import pymupdf
+from concurrent.futures import ThreadPoolExecutor
+
+# Make the data_load package of the DAGs folder importable
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "dags"))
+
+from fake_services import FakePartitionServer
+from data_load.adaptive_concurrency import AIMDLevel, PartitionConcurrencyController
+
+def create_page_pdf() -> bytes:
+    """
+    Returns a one-page PDF, the unit of work of a split PDF page request.
+    """
+    with pymupdf.open() as doc:
+        page = doc.new_page()
+        page.insert_text((72, 72), "Adaptive concurrency benchmark page")
+        return doc.tobytes()
+
+def send_page(session: requests.Session, url: str, pdf_data: bytes) -> tuple:
+    started = time.perf_counter()
+    try:
+        response = session.post(url, files={"files": ("page.pdf", pdf_data, "application/pdf")}, timeout=60)
+        status_code = response.status_code
+    except requests.RequestException:
+        status_code = None
+    return time.perf_counter() - started, status_code
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the partition concurrency controller against a local fake API.")
+    parser.add_argument("--capacity", type=int, default=12, help="Concurrent requests accepted by the fake API")
+    parser.add_argument("--page-latency", type=float, default=0.2, help="Seconds of simulated processing per page")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests failed with 500")
+    parser.add_argument("--windows", type=int, default=20, help="Number of adjustment windows")
+    args = parser.parse_args()
+
+    controller = PartitionConcurrencyController(
+        documents=AIMDLevel("documents in flight", 1, 1, 8),
+        split_concurrency=AIMDLevel("split PDF concurrency", 2, 1, 15),
+        backoff=0.5, max_backoff=4
+    )
+    pdf_data = create_page_pdf()
+
+    with FakePartitionServer(page_latency=args.page_latency, error_rate=args.error_rate,
+                             max_concurrency=args.capacity) as server, requests.Session() as session:
+        for window in range(args.windows):
+            concurrency = controller.documents.level * controller.split_concurrency.level
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                outcomes = list(pool.map(lambda _: send_page(session, server.url, pdf_data), range(concurrency * 2)))
+            for latency, status_code in outcomes:
+                controller.record(latency, status_code)
+            throttled = sum(1 for _, status_code in outcomes if status_code == 429)
+            pause = controller.adjust()
+            print(f"window {window + 1}: {concurrency} concurrent request(s), {throttled} throttled -> "
+                  f"{controller.documents.level} document(s) x {controller.split_concurrency.level} page request(s)")
+            time.sleep(pause)
+
+    controller.log_summary()
+    print(f"Settled at {controller.documents.settled_level()} document(s) x "
+          f"{controller.split_concurrency.settled_level()} page request(s) for a capacity of {args.capacity}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+# This Python script benchmarks the PDF extraction paths of the pipeline over a local corpus of PDF files:
+#   - the open source path (pymupdf4llm, as run by `process_pdf_open_source`), with images inlined or externalised;
+#   - the Unstructured path, sending each PDF to the partition API with the options of `run_unstructured_pipeline`.
+# S3 is replaced by moto when it is installed and by an in-memory fake otherwise, and the Unstructured API by a local
+# stand-in server, so that no credentials are needed. Each extractor and option set runs in a fresh process, and the
+# script reports pages/sec, p50/p95 per-document latency, the RSS high-water mark, output bytes and output tokens.
+# Results are printed and appended as one JSON line per run to a results file, so that runs can be compared over time.
+#
+# Usage: python airflow/benchmarks/benchmark_extraction.py <corpus_dir> [--extractors ...] [--output results.jsonl]
+
+import os
+import sys
+import json
+import time
+import glob
+import math
+import argparse
+import platform
+import resource
+import subprocess
+import multiprocessing
+from datetime import datetime, timezone
+from concurrent.futures import ProcessPoolExecutor
+
+# Make the data_load package of the DAGs folder importable
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "dags"))
+
+from fake_services import FakeS3Client, FakePartitionServer
+
+BENCHMARK_BUCKET = "extraction-benchmark"
+DEFAULT_OUTPUT = "extraction_benchmark_results.jsonl"
+
+# Extractors and option sets that can be benchmarked
+BENCHMARKS = {
+    "pymupdf4llm": {"extractor": "pymupdf4llm", "options": {"externalize_images": False}},
+    "pymupdf4llm-external-images": {"extractor": "pymupdf4llm", "options": {"externalize_images": True}},
+    "unstructured": {"extractor": "unstructured", "options": {}},
+}
+
+def percentile(values: list, fraction: float) -> float:
+    """
+    Returns the nearest-rank percentile of a list of values, or None for an empty list.
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[max(0, math.ceil(fraction * len(ordered)) - 1)], 3)
+
+def get_token_counter():
+    """
+    Returns a function counting the tokens of a text with the cl100k_base encoding, or None if tiktoken is missing.
+    """
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    encoding = tiktoken.get_encoding("cl100k_base")
+    return lambda text: len(encoding.encode(text, disallowed_special=()))
+
+def create_s3_client():
+    """
+    Returns an S3 client for the benchmark bucket and the context keeping it alive: a moto-backed boto3 client when
+    moto is installed, the in-memory fake otherwise.
+    """
+    try:
+        import boto3
+        from moto import mock_aws
+    except ImportError:
+        return FakeS3Client(), None
+    mock = mock_aws()
+    mock.start()
+    s3_client = boto3.client("s3", region_name="us-east-1", aws_access_key_id="benchmark", aws_secret_access_key="benchmark")
+    s3_client.create_bucket(Bucket=BENCHMARK_BUCKET)
+    return s3_client, mock
+
+def get_prefix_size(s3_client, prefix: str) -> int:
+    """
+    Returns the total size of the objects under a prefix of the benchmark bucket.
+    """
+    if isinstance(s3_client, FakeS3Client):
+        return s3_client.total_bytes(BENCHMARK_BUCKET, prefix)
+    paginator = s3_client.get_paginator("list_objects_v2")
+    return sum(obj["Size"] for page in paginator.paginate(Bucket=BENCHMARK_BUCKET, Prefix=prefix)
+               for obj in page.get("Contents", []))
+
+def run_pymupdf(pdf_data: bytes, name: str, s3_client, options: dict) -> str:
+    from data_load import pdf_conversion
+    # Reuse the benchmark client as the client of this worker process
+    pdf_conversion._s3_client = s3_client
+    output_key = f"open_source_processed/{name}.txt"
+    pdf_conversion.convert_pdf_to_s3(pdf_data, BENCHMARK_BUCKET, output_key, "benchmark", "benchmark",
+                                     options["externalize_images"])
+    return s3_client.get_object(Bucket=BENCHMARK_BUCKET, Key=output_key)["Body"].read().decode("utf-8")
+
+def run_unstructured(pdf_data: bytes, name: str, s3_client, options: dict) -> str:
+    import requests
+    from data_load.pdf_extraction_unstructured import PARTITION_STRATEGY, ADDITIONAL_PARTITION_ARGS
+    form = {"strategy": PARTITION_STRATEGY}
+    for option, value in ADDITIONAL_PARTITION_ARGS.items():
+        # Form fields are sent the way the Unstructured client serialises them
+        if isinstance(value, bool):
+            form[option] = str(value).lower()
+        elif isinstance(value, (list, dict)):
+            form[option] = json.dumps(value)
+        else:
+            form[option] = str(value)
+    response = requests.post(options["partition_url"], files={"files": (name, pdf_data, "application/pdf")},
+                             data=form, timeout=600)
+    response.raise_for_status()
+    output_key = f"unstructured_extract/{name}.json"
+    s3_client.put_object(Bucket=BENCHMARK_BUCKET, Key=output_key, Body=response.content)
+    return response.text
+
+def run_benchmark(name: str, corpus: list, partition_url: str) -> dict:
+    """
+    Runs one extractor and option set over the corpus; meant to run in a fresh process so that its RSS high-water
+    mark is not affected by the other runs.
+
+    Args:
+        name (str): The name of the benchmark in BENCHMARKS.
+        corpus (list): The paths of the PDF files.
+        partition_url (str): The URL of the Unstructured partition API stand-in.
+
+    Returns:
+        dict: The metrics of the run.
+    """
+    from data_load.pdf_conversion import count_pages
+    benchmark = BENCHMARKS[name]
+    options = {**benchmark["options"], "partition_url": partition_url}
+    extract = run_pymupdf if benchmark["extractor"] == "pymupdf4llm" else run_unstructured
+    count_tokens = get_token_counter()
+    s3_client, mock = create_s3_client()
+
+    latencies, failures = [], {}
+    pages = output_bytes = output_tokens = 0
+    started = time.perf_counter()
+    try:
+        for path in corpus:
+            with open(path, "rb") as f:
+                pdf_data = f.read()
+            document_started = time.perf_counter()
+            try:
+                output = extract(pdf_data, os.path.basename(path), s3_client, options)
+            except Exception as e:
+                failures[os.path.basename(path)] = str(e)
+                continue
+            latencies.append(time.perf_counter() - document_started)
+            pages += count_pages(pdf_data)
+            output_bytes += len(output.encode("utf-8"))
+            if count_tokens is not None:
+                output_tokens += count_tokens(output)
+        elapsed = time.perf_counter() - started
+        # Images externalised to their own objects are part of the output size
+        image_bytes = get_prefix_size(s3_client, "open_source_images/")
+    finally:
+        if mock is not None:
+            mock.stop()
+
+    return {
+        "benchmark": name,
+        "extractor": benchmark["extractor"],
+        "options": benchmark["options"],
+        "documents": len(latencies),
+        "failed": failures,
+        "pages": pages,
+        "seconds": round(elapsed, 3),
+        "pages_per_sec": round(pages / elapsed, 3) if elapsed else None,
+        "latency_p50_sec": percentile(latencies, 0.50),
+        "latency_p95_sec": percentile(latencies, 0.95),
+        # ru_maxrss is reported in kilobytes on Linux and in bytes on macOS
+        "rss_high_water_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1),
+        "output_bytes": output_bytes,
+        "image_bytes": image_bytes,
+        "output_tokens": output_tokens if count_tokens is not None else None,
+    }
+
+def get_git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the PDF extraction paths over a local corpus of PDFs.")
+    parser.add_argument("corpus", help="Directory holding the PDF files")
+    parser.add_argument("--extractors", nargs="+", choices=sorted(BENCHMARKS), default=sorted(BENCHMARKS),
+                        help="Extractors and option sets to run (default: all)")
+    parser.add_argument("--page-latency", type=float, default=0.0,
+                        help="Seconds of simulated processing time per page in the partition API stand-in")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="JSON lines file the results are appended to")
+    args = parser.parse_args()
+
+    corpus = sorted(glob.glob(os.path.join(args.corpus, "*.pdf")))
+    if not corpus:
+        parser.error(f"No PDF files found in {args.corpus}")
+
+    run = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "commit": get_git_commit(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "corpus": {"path": os.path.abspath(args.corpus), "documents": len(corpus),
+                   "bytes": sum(os.path.getsize(path) for path in corpus)},
+        "page_latency": args.page_latency,
+        "results": [],
+    }
+
+    with FakePartitionServer(page_latency=args.page_latency) as partition_server:
+        for name in args.extractors:
+            # Run each benchmark in a fresh spawned process, one at a time
+            with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+                result = pool.submit(run_benchmark, name, corpus, partition_server.url).result()
+            run["results"].append(result)
+            print(f"{name}: {result['documents']} documents, {result['pages']} pages in {result['seconds']}s "
+                  f"({result['pages_per_sec']} pages/sec), p50 {result['latency_p50_sec']}s, "
+                  f"p95 {result['latency_p95_sec']}s, RSS {result['rss_high_water_mb']} MB, "
+                  f"{result['output_bytes']} output bytes, {result['output_tokens']} tokens, "
+                  f"{len(result['failed'])} failed")
+
+    with open(args.output, "a") as f:
+        f.write(json.dumps(run) + "\n")
+    print(f"Results appended to {args.output}")
+
+if __name__ == "__main__":
+    main()
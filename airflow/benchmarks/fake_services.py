@@ -0,0 +1,191 @@
+# This Python script provides local stand-ins for the external services used by the extraction pipelines, so that
+# they can be benchmarked and exercised without AWS or Unstructured credentials:
+#   - FakeS3Client: an in-memory implementation of the subset of the boto3 S3 client used by the pipelines.
+#   - FakePartitionServer: a local HTTP server that mimics the Unstructured partition API. It returns one element per
+#     text block (extracted with PyMuPDF), can simulate per-page latency, and can inject 429 and 5xx responses.
+
+import io
+import hashlib
+import json
+import time
+import random
+import threading
+import email.parser
+import email.policy
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import pymupdf
+from botocore.exceptions import ClientError
+
+def _not_found(operation: str, key: str) -> ClientError:
+    return ClientError({"Error": {"Code": "NoSuchKey", "Message": f"{key} not found"}}, operation)
+
+def _etag(data: bytes) -> str:
+    return f'"{hashlib.md5(data).hexdigest()}"'
+
+class FakeS3Client:
+    """
+    In-memory stand-in for a boto3 S3 client, supporting the operations used by the extraction pipelines.
+    """
+    def __init__(self):
+        self.objects = {}
+        self.uploads = {}
+        self._lock = threading.Lock()
+
+    def put_object(self, Bucket, Key, Body=b'', **kwargs):
+        data = Body.encode('utf-8') if isinstance(Body, str) else bytes(Body)
+        with self._lock:
+            self.objects[(Bucket, Key)] = data
+        return {"ETag": _etag(data)}
+
+    def get_object(self, Bucket, Key, **kwargs):
+        try:
+            data = self.objects[(Bucket, Key)]
+        except KeyError:
+            raise _not_found("GetObject", Key)
+        return {"Body": io.BytesIO(data), "ContentLength": len(data)}
+
+    def head_object(self, Bucket, Key, **kwargs):
+        if (Bucket, Key) not in self.objects:
+            raise ClientError({"Error": {"Code": "404", "Message": "Not Found"}}, "HeadObject")
+        data = self.objects[(Bucket, Key)]
+        return {"ContentLength": len(data), "ETag": _etag(data)}
+
+    def copy_object(self, Bucket, Key, CopySource, **kwargs):
+        data = self.get_object(CopySource['Bucket'], CopySource['Key'])['Body'].read()
+        return {"CopyObjectResult": self.put_object(Bucket, Key, data)}
+
+    def delete_object(self, Bucket, Key, **kwargs):
+        with self._lock:
+            self.objects.pop((Bucket, Key), None)
+        return {}
+
+    def create_multipart_upload(self, Bucket, Key, **kwargs):
+        with self._lock:
+            upload_id = str(len(self.uploads) + 1)
+            self.uploads[upload_id] = {}
+        return {"UploadId": upload_id}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body, **kwargs):
+        self.uploads[UploadId][PartNumber] = bytes(Body)
+        return {"ETag": f'"part-{PartNumber}"'}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload, **kwargs):
+        parts = self.uploads.pop(UploadId)
+        data = b''.join(parts[part['PartNumber']] for part in MultipartUpload['Parts'])
+        return self.put_object(Bucket, Key, data)
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId, **kwargs):
+        self.uploads.pop(UploadId, None)
+        return {}
+
+    def total_bytes(self, bucket_name: str, prefix: str = '') -> int:
+        return sum(len(data) for (bucket, key), data in self.objects.items()
+                   if bucket == bucket_name and key.startswith(prefix))
+
+def partition_pdf_locally(pdf_data: bytes, filename: str) -> list:
+    """
+    Produces Unstructured-style elements for a PDF: one element per text block, with its page number.
+    """
+    elements = []
+    with pymupdf.open(stream=pdf_data, filetype="pdf") as doc:
+        for page in doc:
+            for block in page.get_text("blocks"):
+                text = block[4].strip()
+                if text:
+                    elements.append({
+                        "type": "NarrativeText",
+                        "element_id": f"{page.number}-{block[5]}",
+                        "text": text,
+                        "metadata": {"page_number": page.number + 1, "filename": filename}
+                    })
+    return elements
+
+class FakePartitionServer:
+    """
+    Local HTTP stand-in for the Unstructured partition API (POST /general/v0/general with a multipart "files" field).
+
+    Args:
+        page_latency (float, optional): Seconds of simulated processing time per page. Defaults to 0.
+        error_rate (float, optional): Probability of answering with a 500 error. Defaults to 0.
+        max_concurrency (int, optional): Number of requests served at once before answering 429; None for no limit.
+    """
+    def __init__(self, page_latency: float = 0.0, error_rate: float = 0.0, max_concurrency: int = None):
+        self.page_latency = page_latency
+        self.error_rate = error_rate
+        self.max_concurrency = max_concurrency
+        self.active_requests = 0
+        self.requests_served = 0
+        self.throttled = 0
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/general/v0/general"
+
+    def start(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                with fake._lock:
+                    if fake.max_concurrency is not None and fake.active_requests >= fake.max_concurrency:
+                        fake.throttled += 1
+                        self.send_response(429)
+                        self.send_header("Retry-After", "1")
+                        self.end_headers()
+                        return
+                    fake.active_requests += 1
+                try:
+                    self.handle_partition()
+                finally:
+                    with fake._lock:
+                        fake.active_requests -= 1
+                        fake.requests_served += 1
+
+            def handle_partition(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+                    f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode() + body)
+                upload = next((part for part in message.iter_parts() if part.get_param('name', header='content-disposition') == 'files'), None)
+                if upload is None:
+                    self.send_response(422)
+                    self.end_headers()
+                    return
+                if random.random() < fake.error_rate:
+                    self.send_response(500)
+                    self.end_headers()
+                    return
+
+                elements = partition_pdf_locally(upload.get_payload(decode=True), upload.get_filename() or "document.pdf")
+                pages = max((element["metadata"]["page_number"] for element in elements), default=0)
+                time.sleep(fake.page_latency * pages)
+
+                payload = json.dumps(elements).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+        return False
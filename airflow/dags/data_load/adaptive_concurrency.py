@@ -0,0 +1,164 @@
+# This Python script implements the adaptive concurrency controller used by the Unstructured extraction pipeline.
+# Instead of fixed settings, the number of documents partitioned at the same time and the number of concurrent page
+# requests per document (split_pdf_concurrency_level) are tuned from the observed latency and 429/5xx rates with AIMD:
+# both levels grow additively while the API keeps up, and are cut multiplicatively, with an exponential backoff pause,
+# as soon as requests are throttled or fail, or the latency rises well above the best latency seen so far. Latencies
+# are recorded with their unit (e.g. seconds per request or seconds per MB), and each unit has a best latency of its own.
+# The levels used at every adjustment and the levels the controller settles on are written to the data storage log.
+
+import math
+import statistics
+from collections import Counter
+import data_load.data_storage_log as logging_module
+
+# Share of throttled or failed requests in a window above which the API is considered congested
+DEFAULT_ERROR_THRESHOLD = 0.05
+
+# Latency (relative to the best window seen) above which the API is considered congested
+DEFAULT_LATENCY_TOLERANCE = 2.0
+
+# Base and maximum pause (in seconds) after a congested window
+DEFAULT_BACKOFF = 2
+DEFAULT_MAX_BACKOFF = 60
+
+# Unit of the latencies recorded without one: seconds per partition API request
+REQUEST_LATENCY = "request"
+
+# Number of most recent adjustments used to report the level the controller settled on
+SETTLE_WINDOW = 5
+
+class AIMDLevel:
+    """
+    A single concurrency level tuned with additive increase and multiplicative decrease.
+
+    Args:
+        name (str): The name of the level, used in log messages.
+        initial (int): The starting level.
+        minimum (int): The lowest level.
+        maximum (int): The highest level.
+        increase (int, optional): The step added after a healthy window. Defaults to 1.
+        decrease_factor (float, optional): The factor applied after a congested window. Defaults to 0.7, which about
+            halves the total number of concurrent requests when both levels of a controller are cut.
+    """
+    def __init__(self, name: str, initial: int, minimum: int, maximum: int, increase: int = 1, decrease_factor: float = 0.7):
+        if not 1 <= minimum <= initial <= maximum:
+            raise ValueError(f"{name}: expected 1 <= minimum <= initial <= maximum.")
+        self.name = name
+        self.level = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.increase_step = increase
+        self.decrease_factor = decrease_factor
+        self.history = [initial]
+
+    def increase(self) -> None:
+        self.level = min(self.maximum, self.level + self.increase_step)
+        self.history.append(self.level)
+
+    def decrease(self) -> None:
+        self.level = max(self.minimum, math.floor(self.level * self.decrease_factor))
+        self.history.append(self.level)
+
+    def settled_level(self) -> int:
+        """
+        Returns the median level over the most recent adjustments, around which AIMD oscillates once it has converged.
+        """
+        return statistics.median_low(self.history[-SETTLE_WINDOW:])
+
+class PartitionConcurrencyController:
+    """
+    Tunes the number of documents in flight and the split PDF concurrency level of the Unstructured partition API.
+    Observations are recorded with `record` and applied once per window with `adjust`, which returns the pause
+    (in seconds) to observe before sending more work. Latencies are only compared with the best latency of their unit.
+
+    Args:
+        documents (AIMDLevel): The number of documents partitioned at the same time.
+        split_concurrency (AIMDLevel): The number of concurrent page requests per document.
+        error_threshold (float, optional): The share of throttled or failed requests that counts as congestion.
+        latency_tolerance (float, optional): The latency, relative to the best window, that counts as congestion.
+        backoff (float, optional): The pause after the first congested window, doubled for each following one.
+        max_backoff (float, optional): The longest pause.
+    """
+    def __init__(self, documents: AIMDLevel, split_concurrency: AIMDLevel, error_threshold: float = DEFAULT_ERROR_THRESHOLD,
+                 latency_tolerance: float = DEFAULT_LATENCY_TOLERANCE, backoff: float = DEFAULT_BACKOFF,
+                 max_backoff: float = DEFAULT_MAX_BACKOFF):
+        self.documents = documents
+        self.split_concurrency = split_concurrency
+        self.error_threshold = error_threshold
+        self.latency_tolerance = latency_tolerance
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.best_latency = {}
+        self.congested_windows = 0
+        self.totals = Counter()
+        self._window = []
+
+    def record(self, latency: float = None, status_code: int = 200, unit: str = REQUEST_LATENCY) -> None:
+        """
+        Records the outcome of one request or document.
+
+        Args:
+            latency (float, optional): The latency, normalised per unit of work (e.g. seconds per page or per MB).
+            status_code (int, optional): The HTTP status; None for a failure without a response. Defaults to 200.
+            unit (str, optional): The unit of the latency. Defaults to REQUEST_LATENCY.
+        """
+        self._window.append((latency, status_code, unit))
+
+    def adjust(self) -> float:
+        """
+        Applies the observations of the current window to the concurrency levels and starts a new window.
+
+        Returns:
+            float: The number of seconds to wait before sending more work, 0 unless the window was congested.
+        """
+        window, self._window = self._window, []
+        if not window:
+            return 0
+
+        throttled = sum(1 for _, status, _ in window if status == 429)
+        errors = sum(1 for _, status, _ in window if status is None or status >= 500)
+        latencies = {}
+        for latency, status, unit in window:
+            if latency is not None and status is not None and status < 400:
+                latencies.setdefault(unit, []).append(latency)
+        medians = {unit: statistics.median(values) for unit, values in latencies.items()}
+        self.totals.update(requests=len(window), throttled=throttled, errors=errors)
+
+        reason = None
+        if (throttled + errors) / len(window) > self.error_threshold:
+            reason = f"{throttled} throttled and {errors} failed of {len(window)} requests"
+        for unit, latency in medians.items():
+            best = self.best_latency.get(unit)
+            if reason is None and best is not None and latency > best * self.latency_tolerance:
+                reason = f"median latency {latency:.2f} per {unit} above {self.latency_tolerance}x the best {best:.2f}"
+        if reason is None:
+            for unit, latency in medians.items():
+                self.best_latency[unit] = min(self.best_latency.get(unit, latency), latency)
+
+        if reason is None:
+            self.congested_windows = 0
+            self.documents.increase()
+            self.split_concurrency.increase()
+            pause = 0
+        else:
+            self.congested_windows += 1
+            self.documents.decrease()
+            self.split_concurrency.decrease()
+            pause = min(self.max_backoff, self.backoff * 2 ** (self.congested_windows - 1))
+
+        logging_module.log_success(
+            f"Partition concurrency {'reduced' if reason else 'raised'} to {self.documents.level} document(s) x "
+            f"{self.split_concurrency.level} page request(s)" + (f" ({reason}), backing off {pause}s" if reason else "")
+        )
+        return pause
+
+    def log_summary(self) -> None:
+        """
+        Logs the concurrency levels the controller settled on and the request totals of the run.
+        """
+        logging_module.log_success(
+            f"Partition concurrency settled at {self.documents.settled_level()} document(s) x "
+            f"{self.split_concurrency.settled_level()} page request(s) after {len(self.documents.history) - 1} "
+            f"adjustment(s): {self.totals['requests']} request(s), {self.totals['throttled']} throttled, "
+            f"{self.totals['errors']} failed."
+        )
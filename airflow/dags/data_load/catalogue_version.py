@@ -0,0 +1,31 @@
+# This Python script publishes a new version of the question catalogue once a DAG run has changed
+# gaia_metadata_tbl_pdf. The version is a counter in the single-row `gaia_catalogue_version` table (created by the
+# schema migrations); the FastAPI service polls it to invalidate its cached catalogue as soon as the run finishes,
+# instead of waiting for the cache TTL.
+
+import data_load.data_storage_log as logging_module
+from data_load.db_connection import get_db_connection
+
+def publish_catalogue_version() -> int:
+    """
+    Increments the question catalogue version, so that the API rebuilds its cached catalogue.
+
+    Returns:
+        int: The new catalogue version.
+    """
+    connection = get_db_connection()
+    cursor = connection.cursor()
+    try:
+        cursor.execute("UPDATE gaia_catalogue_version SET version = version + 1 WHERE id = 1")
+        cursor.execute("SELECT version FROM gaia_catalogue_version WHERE id = 1")
+        version = cursor.fetchone()[0]
+        connection.commit()
+        logging_module.log_success(f"Published question catalogue version {version}.")
+        return version
+    except Exception as e:
+        connection.rollback()
+        logging_module.log_error(f"Error publishing the question catalogue version: {e}")
+        raise
+    finally:
+        cursor.close()
+        connection.close()
@@ -0,0 +1,139 @@
+# This Python script provides the configuration provider shared by the Airflow pipeline (`parameter_config_airflow.py`)
+# and by the FastAPI service and the Streamlit app (`parameter_config.py` at the root of the repository, whose image
+# copies this file next to it). Parameters are read from the AWS SSM Parameter Store on first access rather than at
+# import, and are cached in the process for CONFIG_TTL_SECONDS. When SSM cannot be reached, the last values saved in
+# an encrypted on-disk cache (encrypted with the Fernet key in CONFIG_CACHE_KEY) are used, and parameters found in
+# neither fall back to environment variables of the same name. This module only depends on boto3, so that both
+# deployments can import it.
+
+import os
+import json
+import time
+import logging
+import threading
+import boto3
+from botocore.config import Config
+from botocore.exceptions import BotoCoreError, ClientError
+
+# AWS region of the Parameter Store
+SSM_REGION = os.getenv("CONFIG_SSM_REGION", "us-east-1")
+
+# Seconds for which resolved values are reused, and before SSM is tried again after a failure
+CONFIG_TTL_SECONDS = int(os.getenv("CONFIG_TTL_SECONDS", "900"))
+CONFIG_RETRY_SECONDS = 60
+
+# Fernet key of the encrypted on-disk cache of the last values read from SSM; the cache is disabled without a key
+CONFIG_CACHE_KEY = os.getenv("CONFIG_CACHE_KEY")
+
+# Short timeouts and few retries, so that an unreachable SSM falls back quickly
+SSM_CLIENT_CONFIG = Config(connect_timeout=2, read_timeout=5, retries={'max_attempts': 2})
+
+# SSM returns at most 10 parameters per get_parameters call
+SSM_BATCH_SIZE = 10
+
+logger = logging.getLogger(__name__)
+
+class ConfigProvider:
+    """
+    Lazily resolves parameters from the SSM Parameter Store and caches them in the process with a TTL, falling back to
+    the encrypted disk cache and to environment variables. Safe to use from several threads.
+
+    Args:
+        names (list): The names of the parameters to resolve.
+        cache_path (str): The path of the encrypted disk cache.
+        region (str, optional): The AWS region of the Parameter Store. Defaults to SSM_REGION.
+        ttl (int, optional): The seconds for which resolved values are reused. Defaults to CONFIG_TTL_SECONDS.
+        cache_key (str, optional): The Fernet key of the disk cache. Defaults to CONFIG_CACHE_KEY.
+    """
+    def __init__(self, names: list, cache_path: str, region: str = SSM_REGION, ttl: int = CONFIG_TTL_SECONDS,
+                 cache_key: str = CONFIG_CACHE_KEY):
+        self.names = names
+        self.region = region
+        self.ttl = ttl
+        self.cache_path = cache_path
+        self.cache_key = cache_key
+        self.values = None
+        self.expires_at = 0
+        self._lock = threading.Lock()
+
+    def get(self, name: str) -> str:
+        """
+        Returns the value of a parameter, resolving all parameters on first access and once the TTL has expired.
+
+        Args:
+            name (str): The parameter name.
+
+        Returns:
+            str: The value, or None if the parameter is not found in any source.
+        """
+        with self._lock:
+            if self.values is None or time.monotonic() >= self.expires_at:
+                self.refresh()
+            value = self.values.get(name)
+        return value if value is not None else os.getenv(name)
+
+    def invalidate(self) -> None:
+        """
+        Forces the parameters to be read again on the next access.
+        """
+        with self._lock:
+            self.expires_at = 0
+
+    def refresh(self) -> None:
+        try:
+            values = self.fetch_parameters()
+            self.values, self.expires_at = values, time.monotonic() + self.ttl
+            self.write_disk_cache(values)
+            return
+        except (BotoCoreError, ClientError) as e:
+            logger.error(f"Error reading parameters from SSM: {e}")
+
+        # Keep the values already resolved, or use the disk cache, and try SSM again shortly
+        if self.values is None:
+            self.values = self.read_disk_cache() or {}
+        self.expires_at = time.monotonic() + min(self.ttl, CONFIG_RETRY_SECONDS)
+
+    def fetch_parameters(self) -> dict:
+        ssm_client = boto3.client('ssm', region_name=self.region, config=SSM_CLIENT_CONFIG)
+        values = {}
+        for start in range(0, len(self.names), SSM_BATCH_SIZE):
+            # Ensure secure strings are decrypted
+            response = ssm_client.get_parameters(Names=self.names[start:start + SSM_BATCH_SIZE], WithDecryption=True)
+            values.update({param['Name']: param['Value'] for param in response.get('Parameters', [])})
+        return values
+
+    def get_fernet(self):
+        if not self.cache_key:
+            return None
+        try:
+            from cryptography.fernet import Fernet
+        except ImportError:
+            logger.warning("cryptography is not installed, the encrypted parameter cache is disabled.")
+            return None
+        return Fernet(self.cache_key)
+
+    def write_disk_cache(self, values: dict) -> None:
+        fernet = self.get_fernet()
+        if fernet is None:
+            return
+        try:
+            temp_path = f"{self.cache_path}.{os.getpid()}.tmp"
+            # Only the owner may read the cache file
+            with open(os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'wb') as f:
+                f.write(fernet.encrypt(json.dumps(values).encode('utf-8')))
+            os.replace(temp_path, self.cache_path)
+        except OSError as e:
+            logger.error(f"Error writing the parameter cache: {e}")
+
+    def read_disk_cache(self) -> dict:
+        fernet = self.get_fernet()
+        if fernet is None or not os.path.exists(self.cache_path):
+            return None
+        try:
+            with open(self.cache_path, 'rb') as f:
+                values = json.loads(fernet.decrypt(f.read()))
+            logger.warning("SSM is unavailable, using the cached parameters.")
+            return values
+        except Exception as e:
+            logger.error(f"Error reading the parameter cache: {e}")
+            return None
@@ -1,6 +1,7 @@
 '''This script automates the process of loading GAIA metadata into AWS RDS MySQL and uploading files to AWS S3.
 It connects to Hugging Face to fetch the GAIA dataset, processes it, and inserts the metadata into MySQL.
 Files are downloaded from Hugging Face, uploaded to S3, and the MySQL table is updated with S3 URLs and file extensions.
+In the optional fused mode, each PDF is also converted to markdown from the bytes just uploaded, without reading it back from S3.
 Error handling is included for database connections, API requests, and file operations, ensuring smooth execution.
 The script is designed to handle large datasets efficiently while logging success and failure at each step.
 '''
@@ -10,30 +11,127 @@ from datasets import load_dataset
 from huggingface_hub import login
 import json
 import boto3
-import requests
 import mysql.connector
 from mysql.connector import Error
-from data_load.parameter_config_airflow import AWS_ACCESS_KEY_ID , AWS_SECRET_ACCESS_KEY, AWS_S3_BUCKET_NAME, AWS_RDS_HOST, AWS_RDS_USERNAME, AWS_RDS_PASSWORD, AWS_RDS_DB_PORT, AWS_RDS_DATABASE, HUGGINGFACE_TOKEN
 import data_load.data_storage_log as logging_module
 from data_load.db_connection import get_db_connection
+from data_load.schema_migrations import apply_migrations
+from data_load.s3_transfer import transfer_files_to_s3, DEFAULT_MAX_WORKERS, DEFAULT_MAX_RETRIES
+from data_load.s3_listing import list_s3_etags
+from data_load.sync_manifest import load_manifest, save_manifest, fetch_source_fingerprints, plan_sync
 import pandas as pd
+import pyarrow as pa
 import logging
-import data_load.parameter_config_airflow
-
-# Getting environmental variables
-aws_access_key_id = AWS_ACCESS_KEY_ID
-aws_secret_access_key = AWS_SECRET_ACCESS_KEY
-aws_bucket_name = AWS_S3_BUCKET_NAME
-aws_rds_host = AWS_RDS_HOST
-aws_rds_user = AWS_RDS_USERNAME
-aws_rds_password = AWS_RDS_PASSWORD
-aws_rds_port = AWS_RDS_DB_PORT
-aws_rds_database = AWS_RDS_DATABASE
-hugging_face_token = HUGGINGFACE_TOKEN
+import time
+import math
+import data_load.gaia_snapshot as gaia_snapshot
+from data_load.pipeline_metrics import StageMetrics
+# The configuration is resolved when the tasks run, not when the DAG is parsed
+import data_load.parameter_config_airflow as config
+
+# Columns of gaia_metadata_tbl_pdf filled by the metadata load, paired with the dataset columns they are read from
+METADATA_COLUMNS = [
+    ('task_id', 'task_id'),
+    ('Question', 'Question'),
+    ('Level', 'Level'),
+    ('final_answer', 'Final answer'),
+    ('file_name', 'file_name'),
+    ('file_path', 'file_path'),
+    ('Annotator_Metadata', 'Annotator Metadata'),
+    ('source', 'source')
+]
+
+# Default number of rows sent to MySQL in a single multi-row INSERT
+METADATA_INSERT_BATCH_SIZE = 500
+
+def bulk_insert_metadata(cursor, metadata: pa.Table, batch_size: int = METADATA_INSERT_BATCH_SIZE) -> int:
+    """
+    Inserts the GAIA metadata into gaia_metadata_tbl_pdf using batched multi-row INSERT statements,
+    so that each batch costs a single round trip to RDS instead of one per row.
+
+    Args:
+        cursor: An open MySQL cursor.
+        metadata (pa.Table): The filtered GAIA metadata to be inserted.
+        batch_size (int, optional): The number of rows sent per INSERT statement. Defaults to METADATA_INSERT_BATCH_SIZE.
+
+    Returns:
+        int: The number of rows inserted.
+    """
+    if batch_size < 1:
+        raise ValueError("batch_size must be a positive integer.")
+
+    table_columns = ", ".join(column for column, _ in METADATA_COLUMNS)
+    row_placeholder = "(" + ", ".join(["%s"] * len(METADATA_COLUMNS)) + ")"
+
+    # Build the parameter arrays column by column straight from the Arrow columns
+    column_values = [metadata.column(source_column).to_pylist() for _, source_column in METADATA_COLUMNS]
+    rows = list(zip(*column_values))
+
+    start_time = time.perf_counter()
+    for batch_start in range(0, len(rows), batch_size):
+        batch = rows[batch_start:batch_start + batch_size]
+        insert_query = f"INSERT INTO gaia_metadata_tbl_pdf ({table_columns}) VALUES " + ", ".join([row_placeholder] * len(batch))
+        cursor.execute(insert_query, [value for row in batch for value in row])
+    elapsed = time.perf_counter() - start_time
+
+    rows_per_second = len(rows) / elapsed if elapsed > 0 else float(len(rows))
+    logging_module.log_success(
+        f"Inserted {len(rows)} rows into gaia_metadata_tbl_pdf in {elapsed:.2f}s "
+        f"({rows_per_second:.1f} rows/sec, batch size {batch_size})."
+    )
+    return len(rows)
+
+def fetch_gaia_metadata(revision: str) -> pa.Table:
+    """
+    Downloads a revision of the GAIA dataset from Hugging Face and returns the PDF rows of both splits.
+
+    Args:
+        revision (str): The dataset revision to download.
+
+    Returns:
+        pa.Table: The filtered GAIA PDF metadata, limited to the columns loaded into RDS.
+    """
+    # Login with Hugging Face token
+    login(token=config.HUGGINGFACE_TOKEN)
+    logging_module.log_success("Logged in to Hugging Face successfully.")
+
+    # Load the GAIA dataset from Hugging Face
+    ds = load_dataset(gaia_snapshot.GAIA_DATASET_ID, "2023_all", revision=revision)
+    logging_module.log_success(f"GAIA dataset revision {revision} read from Hugging Face successfully.")
+
+    validation_df = ds['validation'].to_pandas()
+    validation_df['source'] = 'validation'
+    test_df = ds['test'].to_pandas()
+    test_df['source'] = 'test'
+
+    all_df = pd.concat([validation_df, test_df])
+    filtered_df = all_df[all_df['file_name'].str.endswith('.pdf')].copy()
+    filtered_df['Annotator Metadata'] = filtered_df['Annotator Metadata'].apply(json.dumps)
+
+    source_columns = [source_column for _, source_column in METADATA_COLUMNS]
+    return pa.Table.from_pandas(filtered_df[source_columns], preserve_index=False)
+
+def get_metadata_row_count(connection) -> int:
+    """
+    Returns the number of rows in gaia_metadata_tbl_pdf, or None if the table does not exist.
+    """
+    cursor = connection.cursor()
+    try:
+        cursor.execute("SELECT COUNT(*) FROM gaia_metadata_tbl_pdf")
+        return cursor.fetchone()[0]
+    except Error:
+        return None
+    finally:
+        cursor.close()
 
 # Function to load the GAIA metadata into MySQL RDS
-def load_gaia_metadata_tbl():
-    """Loads the GAIA dataset from Hugging Face into an AWS RDS MySQL table"""
+def load_gaia_metadata_tbl(batch_size: int = METADATA_INSERT_BATCH_SIZE, snapshot_only: bool = False):
+    """Loads the GAIA dataset from Hugging Face into an AWS RDS MySQL table using batched multi-row inserts.
+    The filtered metadata is cached in a local Parquet snapshot keyed by dataset revision, the table is only reloaded
+    when the revision changes, and in snapshot only mode the table is rebuilt offline from the latest snapshot."""
+    metrics = StageMetrics("load_gaia_metadata_tbl")
+    error = None
+
     # MySQL connection to AWS RDS
     try:
         connection = get_db_connection()
@@ -41,81 +139,142 @@ def load_gaia_metadata_tbl():
             logging_module.log_success("MySQL connection established successfully.")
     except Error as e:
         logging_module.log_error(f"Error while connecting to MySQL: {e}")
+        metrics.finish(error=str(e))
         return
 
-    # Login with Hugging Face token
+    cursor = None
     try:
-        login(token=hugging_face_token)
-        logging_module.log_success("Logged in to Hugging Face successfully.")
-    except Exception as e:
-        logging_module.log_error(f"Failed to login to Hugging Face: {e}")
-        return
+        # Resolve the GAIA metadata, downloading the dataset only when there is no snapshot for its revision
+        try:
+            if snapshot_only:
+                revision = gaia_snapshot.read_state().get('latest_revision')
+                metadata = gaia_snapshot.read_snapshot(revision) if revision else None
+                if metadata is None:
+                    error = "Snapshot only mode requested but no GAIA snapshot is available."
+                    logging_module.log_error(error)
+                    return
+                logging_module.log_success(f"Rebuilding gaia_metadata_tbl_pdf offline from snapshot {revision}.")
+            else:
+                revision = gaia_snapshot.get_dataset_revision(config.HUGGINGFACE_TOKEN)
+                state = gaia_snapshot.read_state()
+                if state.get('loaded_revision') == revision and get_metadata_row_count(connection) == state.get('loaded_rows'):
+                    logging_module.log_success(f"GAIA dataset revision {revision} is already loaded, skipping the metadata load.")
+                    return
 
-    # Load the GAIA dataset from Hugging Face
-    try:
-        ds = load_dataset("gaia-benchmark/GAIA", "2023_all")
-        logging_module.log_success("GAIA dataset read from Hugging Face successfully.")
-    except Exception as e:
-        logging_module.log_error(f"Error reading GAIA dataset from Hugging Face: {e}")
-        return
+                metadata = gaia_snapshot.read_snapshot(revision)
+                if metadata is None:
+                    gaia_snapshot.write_snapshot(fetch_gaia_metadata(revision), revision)
+                    metadata = gaia_snapshot.read_snapshot(revision)
+                    logging_module.log_success(f"Saved GAIA snapshot for revision {revision}.")
+                else:
+                    logging_module.log_success(f"Read GAIA snapshot for revision {revision}.")
+        except Exception as e:
+            error = str(e)
+            logging_module.log_error(f"Error reading GAIA dataset from Hugging Face: {e}")
+            return
 
-    # Process the dataset and insert into MySQL table
-    try:
-        validation_df = ds['validation'].to_pandas()
-        validation_df['source'] = 'validation'
-        test_df = ds['test'].to_pandas()
-        test_df['source'] = 'test'
-
-        all_df = pd.concat([validation_df, test_df])
-        filtered_df = all_df[all_df['file_name'].str.endswith('.pdf')].copy()
-        filtered_df['Annotator Metadata'] = filtered_df['Annotator Metadata'].apply(json.dumps)
-        
+        # Insert the metadata into the MySQL table
         cursor = connection.cursor()
 
-        # Drop table if it exists and create a new one
-        cursor.execute("DROP TABLE IF EXISTS gaia_metadata_tbl_pdf;")
-        logging_module.log_success("Dropped table gaia_metadata_tbl_pdf if it already existed.")
-
-        create_table_query = """
-        CREATE TABLE gaia_metadata_tbl_pdf (
-            task_id VARCHAR(255),
-            Question TEXT,
-            Level VARCHAR(3),
-            final_answer VARCHAR(255),
-            file_name VARCHAR(255),
-            file_path VARCHAR(255),
-            Annotator_Metadata TEXT,
-            source VARCHAR(255),
-            s3_url VARCHAR(255),
-            file_extension VARCHAR(255),
-            unstructured_api_url VARCHAR(255),
-            opensource_url VARCHAR(255)
-        );
-        """
-        cursor.execute(create_table_query)
-        logging_module.log_success("Table gaia_metadata_tbl_pdf created successfully.")
+        # Bring the schema up to date, then replace the rows while keeping the keys and indexes
+        apply_migrations(connection)
+        cursor.execute("TRUNCATE TABLE gaia_metadata_tbl_pdf")
+        logging_module.log_success("Truncated table gaia_metadata_tbl_pdf.")
 
-        # Insert the data into the table
-        insert_query = """
-        INSERT INTO gaia_metadata_tbl_pdf (task_id, Question, Level, final_answer, file_name, file_path, Annotator_Metadata, source)
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-        """
-        for _, row in filtered_df.iterrows():
-            cursor.execute(insert_query, (row['task_id'], row['Question'], row['Level'], row['Final answer'], row['file_name'], row['file_path'], row['Annotator Metadata'], row['source']))
+        # Insert the data into the table in batches
+        rows_inserted = bulk_insert_metadata(cursor, metadata, batch_size)
 
         connection.commit()
+        # TRUNCATE, the INSERT batches and the commit (the migrations are not counted)
+        metrics.add(rows_written=rows_inserted, db_round_trips=2 + math.ceil(rows_inserted / batch_size))
+        gaia_snapshot.update_state(loaded_revision=revision, loaded_rows=rows_inserted)
         logging_module.log_success("GAIA metadata inserted into AWS RDS successfully.")
     except Exception as e:
+        error = str(e)
         logging_module.log_error(f"Error saving GAIA metadata to MySQL: {e}")
     finally:
         if connection.is_connected():
-            cursor.close()
+            if cursor is not None:
+                cursor.close()
             connection.close()
             logging_module.log_success("MySQL connection closed after metadata insertion.")
+        metrics.finish(error=error)
+
+# Default number of (task_id, s3_url) pairs applied per UPDATE statement
+S3_URL_UPDATE_BATCH_SIZE = 200
+
+class S3UrlBatchWriter:
+    """
+    Collects (task_id, s3_url) pairs and applies them to gaia_metadata_tbl_pdf in chunked, set-based UPDATE statements.
+    Each chunk joins the table against a derived table of the pending pairs, sets the S3 URL and the file extension in
+    the same statement and is committed once, so the number of round trips scales with batches instead of files.
+    """
+    def __init__(self, connection, batch_size: int = S3_URL_UPDATE_BATCH_SIZE):
+        if batch_size < 1:
+            raise ValueError("batch_size must be a positive integer.")
+        self.connection = connection
+        self.batch_size = batch_size
+        self.pending = []
+        self.rows_updated = 0
+        self.batches_written = 0
+
+    def add(self, task_id: str, s3_url: str) -> None:
+        """
+        Queues a record update and writes a batch once enough updates are pending.
+
+        Args:
+            task_id (str): The task_id of the record to update.
+            s3_url (str): The S3 URL of the uploaded file.
+        """
+        self.pending.append((task_id, s3_url))
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        Writes all pending updates as a single UPDATE ... JOIN statement followed by one commit.
+        """
+        if not self.pending:
+            return
+
+        batch, self.pending = self.pending, []
+        pending_rows = " UNION ALL ".join(["SELECT %s AS task_id, %s AS s3_url"] * len(batch))
+        update_query = f"""
+            UPDATE gaia_metadata_tbl_pdf AS t
+            JOIN ({pending_rows}) AS u ON t.task_id = u.task_id
+            SET t.s3_url = u.s3_url,
+                t.file_extension = SUBSTRING_INDEX(t.file_name, '.', -1)
+        """
+        cursor = self.connection.cursor()
+        try:
+            cursor.execute(update_query, [value for pair in batch for value in pair])
+            self.connection.commit()
+            self.rows_updated += cursor.rowcount
+            self.batches_written += 1
+            logging_module.log_success(f"Updated {len(batch)} record(s) with S3 URL and file extension in one batch.")
+        except Exception as e:
+            self.connection.rollback()
+            logging_module.log_error(f"Error updating S3 URL and file extension for task_ids {[task_id for task_id, _ in batch]}: {e}")
+        finally:
+            cursor.close()
 
 # Function to download files from Hugging Face, upload them to S3, and update MySQL RDS
-def upload_gaia_files_to_s3_and_update_rds():
-    """Downloads GAIA dataset files from Hugging Face, uploads them to AWS S3, and updates the corresponding MySQL RDS records with S3 URLs and file extensions."""
+def upload_gaia_files_to_s3_and_update_rds(max_workers: int = DEFAULT_MAX_WORKERS, max_retries: int = DEFAULT_MAX_RETRIES,
+                                           incremental: bool = True, update_batch_size: int = S3_URL_UPDATE_BATCH_SIZE,
+                                           fused: bool = False):
+    """Streams GAIA dataset files from Hugging Face into AWS S3 on a bounded thread pool, and updates the corresponding MySQL RDS records with S3 URLs and file extensions.
+    In incremental mode, files whose upstream fingerprint matches the sync manifest are not transferred again, and byte-identical files are only downloaded and stored once.
+    In fused mode, every transferred PDF is also converted with the open source pipeline from the in-memory bytes that were uploaded,
+    and the open source keys that were converted are returned as {"converted": [...], "conversion_failed": {...}}."""
+    metrics = StageMetrics("upload_gaia_files_to_s3")
+    error = None
+
+    # Getting the configuration
+    aws_access_key_id = config.AWS_ACCESS_KEY_ID
+    aws_secret_access_key = config.AWS_SECRET_ACCESS_KEY
+    aws_bucket_name = config.AWS_S3_BUCKET_NAME
+    hugging_face_token = config.HUGGINGFACE_TOKEN
+
     # MySQL connection to AWS RDS
     try:
         connection = get_db_connection()
@@ -123,6 +282,7 @@ def upload_gaia_files_to_s3_and_update_rds():
             logging_module.log_success("MySQL connection established successfully.")
     except Error as e:
         logging_module.log_error(f"Error while connecting to MySQL: {e}")
+        metrics.finish(error=str(e))
         return
 
     # AWS S3 setup
@@ -131,11 +291,15 @@ def upload_gaia_files_to_s3_and_update_rds():
         logging_module.log_success("Connected to S3 bucket.")
     except Exception as e:
         logging_module.log_error(f"Error connecting to S3: {e}")
+        metrics.finish(error=str(e))
         return
 
     # Hugging Face base URL for validation files
     huggingface_base_url = 'https://huggingface.co/datasets/gaia-benchmark/GAIA/resolve/main/2023/'
 
+    converter = None
+    conversions = None
+
     # Fetch records from MySQL and update them with S3 URLs
     try:
         headers = {
@@ -150,8 +314,10 @@ def upload_gaia_files_to_s3_and_update_rds():
         records = cursor.fetchall()
         logging_module.log_success("Fetched records from gaia_metadata_tbl_pdf.")
 
+        url_writer = S3UrlBatchWriter(connection, update_batch_size)
+
+        transfers = []
         for record in records:
-            task_id = record['task_id']
             file_name = record['file_name'].strip()
             category = record['source']
 
@@ -161,47 +327,105 @@ def upload_gaia_files_to_s3_and_update_rds():
             else:
                 file_url = huggingface_base_url + 'test/' + file_name
 
-            # Download file from Hugging Face and upload it to S3
+            transfers.append({
+                "task_id": record['task_id'],
+                "file_name": file_name,
+                "file_url": file_url,
+                "s3_key": f"gaia_files/{file_name}"
+            })
+
+        # Compare the upstream fingerprints and the bucket contents with the sync manifest
+        if incremental:
+            manifest = load_manifest(s3, aws_bucket_name)
+            fingerprints = fetch_source_fingerprints(transfers, headers, max_workers)
+            s3_etags = list_s3_etags(s3, aws_bucket_name, 'gaia_files/')
+            unchanged, groups = plan_sync(transfers, manifest, fingerprints, s3_etags)
+        else:
+            manifest = {}
+            unchanged, groups = [], [[transfer] for transfer in transfers]
+        logging_module.log_success(f"Sync plan: {len(unchanged)} file(s) unchanged, {len(groups)} unique file(s) to transfer.")
+
+        # Unchanged files are already in S3, only their records need the S3 URL
+        for transfer in unchanged:
+            url_writer.add(transfer['task_id'], f"https://{aws_bucket_name}.s3.amazonaws.com/{transfer['s3_key']}")
+
+        # Only the first file of each group of identical files is downloaded
+        primaries = []
+        for group in groups:
+            primaries.append({**group[0], "duplicates": group[1:]})
+
+        if fused:
+            # Imported here so that the DAG parse does not load the PDF conversion libraries
+            from data_load.pdf_extraction_open_source import InMemoryPdfConverter
+            converter = InMemoryPdfConverter(s3, metrics)
+
+        # Stream the files from Hugging Face to S3 concurrently; the MySQL connection is only used from this thread
+        for result in transfer_files_to_s3(primaries, s3, aws_bucket_name, headers, max_workers, max_retries,
+                                           keep_body=fused):
+            body = result.pop("body", None)
+            # Transfers are streamed, so every byte downloaded from Hugging Face is uploaded to S3
+            metrics.record_file(result['s3_key'], result["error"], bytes_downloaded=result["bytes"],
+                                bytes_uploaded=result["bytes"])
+            if not result["success"]:
+                continue
+
+            # Hand the uploaded bytes straight to the converter; duplicates share the object and its outputs
+            if converter is not None and result['s3_key'].endswith('.pdf'):
+                converter.submit(result['s3_key'], body, result['sha256'])
+            body = None
+
             try:
-                response = requests.get(file_url, headers=headers)
-                if response.status_code == 200:
-                    file_data = response.content
-                    logging_module.log_success(f"Downloaded {file_name} from Hugging Face.")
-
-                    s3_key = f"gaia_files/{file_name}"
-                    s3.put_object(Bucket=aws_bucket_name, Key=s3_key, Body=file_data)
-                    s3_url = f"https://{aws_bucket_name}.s3.amazonaws.com/{s3_key}"
-                    logging_module.log_success(f"Uploaded {file_name} to S3 at {s3_url}")
-
-                    # Update the MySQL table with the S3 URL and file extension
-                    try:
-                        update_s3url_query = """UPDATE gaia_metadata_tbl_pdf
-                                                SET s3_url = %s
-                                                WHERE task_id = %s"""
-                        cursor.execute(update_s3url_query, (s3_url, task_id))
-                        connection.commit()
-                        logging_module.log_success(f"Updated record {task_id} with S3 URL.")
-
-                        update_file_ext_query = """
-                            UPDATE gaia_metadata_tbl_pdf
-                            SET file_extension = SUBSTRING_INDEX(file_name, '.', -1)
-                            WHERE task_id = %s
-                        """
-                        cursor.execute(update_file_ext_query, (task_id,))
-                        connection.commit()
-                        logging_module.log_success(f"Updated record {task_id} with file extension.")
-                    except Exception as e:
-                        logging_module.log_error(f"Error updating S3 URL or file extension for task_id {task_id}: {e}")
-                else:
-                    logging_module.log_error(f"Failed to download {file_name}: HTTP {response.status_code}")
+                s3_etag = s3.head_object(Bucket=aws_bucket_name, Key=result['s3_key'])['ETag']
+            except Exception as e:
+                logging_module.log_error(f"Error reading ETag of {result['s3_key']}: {e}")
+                s3_etag = None
+
+            # Identical content is stored once: the records of the other names point at the object just uploaded
+            synced = [(result, s3_etag)] + [({**duplicate, "s3_key": result['s3_key']}, s3_etag)
+                                            for duplicate in result["duplicates"]]
+
+            for transfer, etag in synced:
+                s3_url = f"https://{aws_bucket_name}.s3.amazonaws.com/{transfer['s3_key']}"
+                logging_module.log_success(f"Uploaded {transfer['file_name']} to S3 at {s3_url}")
+                url_writer.add(transfer['task_id'], s3_url)
+
+                if transfer.get('source_etag') and etag:
+                    manifest[transfer['file_name']] = {
+                        "source_etag": transfer['source_etag'],
+                        "sha256": result['sha256'],
+                        "size": result['bytes'],
+                        "s3_key": transfer['s3_key'],
+                        "s3_etag": etag
+                    }
 
-            except requests.exceptions.RequestException as e:
-                logging_module.log_error(f"Error downloading {file_name}: {e}")
+        url_writer.flush()
+        logging_module.log_success(f"Updated {url_writer.rows_updated} record(s) in {url_writer.batches_written} batch(es).")
+
+        if converter is not None:
+            conversions, converter = converter.close(), None
+            logging_module.log_success(
+                f"Fused extraction: {len(conversions['succeeded'])} PDF(s) converted, {len(conversions['failed'])} failed."
+            )
+        # The SELECT of the records and one UPDATE per batch
+        metrics.add(rows_written=url_writer.rows_updated, db_round_trips=1 + url_writer.batches_written)
+
+        if incremental:
+            try:
+                save_manifest(s3, aws_bucket_name, manifest)
+            except Exception as e:
+                logging_module.log_error(f"Error saving sync manifest: {e}")
 
     except Error as e:
+        error = str(e)
         logging_module.log_error(f"Error while connecting to MySQL: {e}")
     finally:
+        if converter is not None:
+            converter.close()
         if connection.is_connected():
             cursor.close()
             connection.close()
             logging_module.log_success("MySQL connection closed after file upload to S3.")
+        metrics.finish(error=error)
+
+    if conversions is not None:
+        return {"converted": conversions["succeeded"], "conversion_failed": conversions["failed"]}
@@ -10,7 +10,7 @@ logging.basicConfig(
     filename='bigdatateam7_data_storage.log',  # Name of the log file
     level=logging.INFO,      # Set the logging level to INFO
     format='%(asctime)s - %(levelname)s - %(message)s',  # Log format
-    filemode='w'             # Overwrite the log file each run; use 'a' to append
+    filemode='a'             # Append, so the log of earlier runs is kept; structured metrics are in pipeline_metrics
 )
 
 # Creating logger objects for success and error
@@ -0,0 +1,169 @@
+# This Python script implements the delta index used by the Unstructured extraction pipeline to skip unchanged PDFs.
+# The delta state is a JSON object stored in S3 (outside of `gaia_files/` and the output prefix) that records, for every
+# source PDF key, the ETag of the source object, its content hash, the key of its `.json` output and the ETag of that
+# output. A PDF is skipped when its source ETag is unchanged and its output is still in S3 with the recorded ETag, so
+# unchanged documents are neither hashed, restored from the extraction cache nor partitioned again. A summary of the
+# skipped and processed documents is written to the data storage log and next to the delta state after every run.
+# Runs (e.g. concurrent shards) only write back the entries of the PDFs they saw, merged into the latest state with a
+# conditional write (If-Match on the ETag that was read), which is retried on a newer state if another run wrote first.
+
+import json
+import time
+import random
+from botocore.exceptions import ClientError
+import data_load.data_storage_log as logging_module
+
+# S3 keys of the delta state and of the summary of the last run
+DELTA_STATE_KEY = 'unstructured_state/delta_index.json'
+DELTA_SUMMARY_KEY = 'unstructured_state/last_run_summary.json'
+
+# Attempts at writing the delta state, and the base delay (in seconds) after a conflicting write
+DELTA_STATE_WRITE_ATTEMPTS = 5
+DELTA_STATE_RETRY_BACKOFF = 0.5
+
+# Error codes of a conditional write that lost against another writer
+CONFLICT_ERROR_CODES = ('PreconditionFailed', 'ConditionalRequestConflict')
+
+def read_delta_state(s3_client, bucket_name: str) -> tuple:
+    """
+    Reads the delta state and its ETag from S3.
+
+    Returns:
+        tuple: The state and its ETag, or an empty dictionary and None if no state exists yet.
+
+    Raises:
+        ClientError: If the state exists but cannot be read.
+    """
+    try:
+        state_obj = s3_client.get_object(Bucket=bucket_name, Key=DELTA_STATE_KEY)
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') in ('NoSuchKey', '404'):
+            return {}, None
+        raise
+    return json.loads(state_obj['Body'].read()), state_obj['ETag']
+
+def load_delta_state(s3_client, bucket_name: str) -> dict:
+    """
+    Loads the delta state of the Unstructured pipeline from S3.
+
+    Args:
+        s3_client: A boto3 S3 client.
+        bucket_name (str): The S3 bucket holding the delta state.
+
+    Returns:
+        dict: A mapping of source S3 key to delta entry, or an empty dictionary if no state exists yet.
+    """
+    try:
+        state, etag = read_delta_state(s3_client, bucket_name)
+    except ClientError as e:
+        logging_module.log_error(f"Error loading Unstructured delta state, all PDFs will be processed: {e}")
+        return {}
+    if etag is None:
+        logging_module.log_success("No Unstructured delta state found, all PDFs will be processed.")
+    else:
+        logging_module.log_success(f"Loaded Unstructured delta state with {len(state)} entries.")
+    return state
+
+def save_delta_state(s3_client, bucket_name: str, state: dict, keys) -> dict:
+    """
+    Merges the entries of the given source keys into the latest delta state in S3, so that concurrent runs over
+    different PDFs do not overwrite each other's entries. The state is written only if it is still the one that was
+    read, and merged again into the newer state otherwise.
+
+    Args:
+        s3_client: A boto3 S3 client.
+        bucket_name (str): The S3 bucket holding the delta state.
+        state (dict): The delta state of this run, a mapping of source S3 key to delta entry.
+        keys: The source keys this run is responsible for; keys missing from `state` are removed from the index.
+
+    Returns:
+        dict: The delta state that was written.
+
+    Raises:
+        RuntimeError: If every attempt lost against another writer.
+    """
+    for attempt in range(1, DELTA_STATE_WRITE_ATTEMPTS + 1):
+        latest_state, etag = read_delta_state(s3_client, bucket_name)
+        for key in keys:
+            if key in state:
+                latest_state[key] = state[key]
+            else:
+                latest_state.pop(key, None)
+        # Only replace the state that was read, or create it if there was none
+        condition = {'IfMatch': etag} if etag else {'IfNoneMatch': '*'}
+        try:
+            s3_client.put_object(Bucket=bucket_name, Key=DELTA_STATE_KEY, ContentType='application/json',
+                                 Body=json.dumps(latest_state, indent=2, sort_keys=True), **condition)
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') not in CONFLICT_ERROR_CODES:
+                raise
+            logging_module.log_error(f"Unstructured delta state changed while saving (attempt {attempt}), merging again.")
+            time.sleep(DELTA_STATE_RETRY_BACKOFF * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+            continue
+        logging_module.log_success(f"Saved Unstructured delta state with {len(latest_state)} entries.")
+        return latest_state
+    raise RuntimeError(f"Could not save the Unstructured delta state after {DELTA_STATE_WRITE_ATTEMPTS} attempts.")
+
+def is_unchanged(state: dict, source_obj: dict, output_key: str, output_etags: dict) -> bool:
+    """
+    Checks whether a source PDF and its output are both unchanged since they were recorded in the delta state.
+
+    Args:
+        state (dict): The delta state.
+        source_obj (dict): The S3 listing entry of the source PDF.
+        output_key (str): The S3 key of the PDF's `.json` output.
+        output_etags (dict): A mapping of output S3 key to ETag, from the listing of the output prefix.
+
+    Returns:
+        bool: True if the PDF can be skipped.
+    """
+    entry = state.get(source_obj['Key'])
+    return (entry is not None
+            and entry.get("source_etag") == source_obj['ETag']
+            and entry.get("output_key") == output_key
+            and output_key in output_etags
+            and entry.get("output_etag") == output_etags[output_key])
+
+def record_output(state: dict, s3_client, bucket_name: str, source_obj: dict, content_sha256: str, output_key: str) -> None:
+    """
+    Records a source PDF and its current output in the delta state; outputs that cannot be found are not recorded.
+
+    Args:
+        state (dict): The delta state.
+        s3_client: A boto3 S3 client.
+        bucket_name (str): The S3 bucket holding the outputs.
+        source_obj (dict): The S3 listing entry of the source PDF.
+        content_sha256 (str): The SHA-256 of the source PDF.
+        output_key (str): The S3 key of the PDF's `.json` output.
+    """
+    try:
+        output_etag = s3_client.head_object(Bucket=bucket_name, Key=output_key)['ETag']
+    except ClientError as e:
+        logging_module.log_error(f"Output {output_key} of {source_obj['Key']} not found, it is not recorded: {e}")
+        state.pop(source_obj['Key'], None)
+        return
+    state[source_obj['Key']] = {
+        "source_etag": source_obj['ETag'],
+        "sha256": content_sha256,
+        "output_key": output_key,
+        "output_etag": output_etag
+    }
+
+def publish_summary(s3_client, bucket_name: str, summary: dict) -> None:
+    """
+    Logs the skipped versus processed counts of a run and writes them next to the delta state.
+
+    Args:
+        s3_client: A boto3 S3 client.
+        bucket_name (str): The S3 bucket holding the delta state.
+        summary (dict): The counts of the run, keyed by outcome.
+    """
+    logging_module.log_success(
+        f"Unstructured delta run: {summary['skipped']} skipped, {summary['restored']} restored from the cache, "
+        f"{summary['partitioned']} partitioned, {summary['failed']} failed, {summary['removed']} removed from the index."
+    )
+    try:
+        s3_client.put_object(Bucket=bucket_name, Key=DELTA_SUMMARY_KEY, Body=json.dumps(summary, indent=2),
+                             ContentType='application/json')
+    except ClientError as e:
+        logging_module.log_error(f"Error writing the Unstructured delta summary: {e}")
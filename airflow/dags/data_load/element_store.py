@@ -0,0 +1,203 @@
+# This Python script post-processes the JSON element lists written by the Unstructured pipeline into a compact,
+# columnar element store. Each `unstructured_extract/<file>.json` array is converted into a Parquet file under
+# `unstructured_elements/` with one row per element (element id, type, page number, text, table HTML, image reference
+# and the remaining metadata as JSON) and one row group per page. A per-page offset index, stored in the Parquet
+# schema metadata, lists the page number, row offset and row count of every row group, so consumers can read only the
+# text column or a page range instead of the full JSON blob. Base64 images are stripped into content-addressed side
+# objects under `unstructured_images/` and referenced by key. Element stores that are already up to date with their
+# JSON source (compared by ETag) are skipped.
+
+import json
+import base64
+import hashlib
+import boto3
+import pyarrow as pa
+import pyarrow.parquet as pq
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from botocore.exceptions import ClientError
+import data_load.data_storage_log as logging_module
+from data_load.s3_listing import iter_s3_objects
+from data_load.pipeline_metrics import StageMetrics
+import data_load.parameter_config_airflow as config
+
+# S3 prefixes of the Unstructured JSON output, the element stores and the stripped images
+SOURCE_PREFIX = 'unstructured_extract/'
+ELEMENT_PREFIX = 'unstructured_elements/'
+IMAGE_PREFIX = 'unstructured_images/'
+
+# Default number of element stores built at the same time
+DEFAULT_MAX_WORKERS = 8
+
+# Metadata fields moved into columns of their own (or into side objects) rather than the metadata column
+EXTRACTED_METADATA_FIELDS = ('page_number', 'text_as_html', 'image_base64', 'image_mime_type')
+
+ELEMENT_SCHEMA = pa.schema([
+    ('element_id', pa.string()),
+    ('type', pa.string()),
+    ('page_number', pa.int32()),
+    ('text', pa.string()),
+    ('text_as_html', pa.string()),
+    ('image_key', pa.string()),
+    ('metadata', pa.string())
+])
+
+def get_element_store_key(json_key: str) -> str:
+    """
+    Returns the S3 key of the element store of an Unstructured JSON output.
+
+    Args:
+        json_key (str): The S3 key of the JSON output, e.g. `unstructured_extract/<file>.pdf.json`.
+
+    Returns:
+        str: The S3 key of the Parquet element store, e.g. `unstructured_elements/<file>.pdf.parquet`.
+    """
+    return ELEMENT_PREFIX + json_key.split('/')[-1].removesuffix('.json') + '.parquet'
+
+def store_image(s3_client, bucket_name: str, image_base64: str, mime_type: str, stored_images: set) -> str:
+    """
+    Writes a base64 image to a content-addressed S3 object, unless it is already stored, and returns its key.
+    """
+    image_data = base64.b64decode(image_base64)
+    image_format = (mime_type or 'image/png').split('/')[-1]
+    image_key = f"{IMAGE_PREFIX}{hashlib.sha256(image_data).hexdigest()}.{image_format}"
+    if image_key not in stored_images:
+        try:
+            s3_client.head_object(Bucket=bucket_name, Key=image_key)
+        except ClientError:
+            s3_client.put_object(Bucket=bucket_name, Key=image_key, Body=image_data, ContentType=mime_type or 'image/png')
+        stored_images.add(image_key)
+    return image_key
+
+def elements_to_table(elements: list, s3_client, bucket_name: str, stored_images: set) -> tuple:
+    """
+    Converts a list of Unstructured elements into a table sorted by page, stripping images into side objects.
+
+    Args:
+        elements (list): The elements of one document, as written by the Unstructured pipeline.
+        s3_client: A boto3 S3 client.
+        bucket_name (str): The S3 bucket holding the images.
+        stored_images (set): The image keys known to exist in S3, shared across documents.
+
+    Returns:
+        tuple: The element table and the page index, a list of [page_number, row_offset, row_count].
+    """
+    rows = []
+    for element in elements:
+        metadata = dict(element.get('metadata') or {})
+        image_key = None
+        if metadata.get('image_base64'):
+            image_key = store_image(s3_client, bucket_name, metadata['image_base64'], metadata.get('image_mime_type'), stored_images)
+        rows.append({
+            'element_id': element.get('element_id'),
+            'type': element.get('type'),
+            'page_number': metadata.get('page_number') or 0,
+            'text': element.get('text') or '',
+            'text_as_html': metadata.get('text_as_html'),
+            'image_key': image_key,
+            'metadata': json.dumps({k: v for k, v in metadata.items() if k not in EXTRACTED_METADATA_FIELDS},
+                                   separators=(',', ':'))
+        })
+
+    # Keep the reading order within each page
+    rows.sort(key=lambda row: row['page_number'])
+    page_index = []
+    for offset, row in enumerate(rows):
+        if page_index and page_index[-1][0] == row['page_number']:
+            page_index[-1][2] += 1
+        else:
+            page_index.append([row['page_number'], offset, 1])
+    return pa.Table.from_pylist(rows, schema=ELEMENT_SCHEMA), page_index
+
+def write_element_store(table: pa.Table, page_index: list, sink) -> None:
+    """
+    Writes an element table as Parquet with one row group per page and the page index in the schema metadata.
+    """
+    schema = table.schema.with_metadata({b'page_index': json.dumps(page_index).encode()})
+    with pq.ParquetWriter(sink, schema, compression='zstd') as writer:
+        for _, offset, count in page_index:
+            writer.write_table(table.slice(offset, count).replace_schema_metadata(schema.metadata))
+
+def build_element_store(s3_client, bucket_name: str, json_obj: dict, stored_images: set) -> str:
+    """
+    Builds the element store of one Unstructured JSON output, unless it is already up to date.
+
+    Args:
+        s3_client: A boto3 S3 client.
+        bucket_name (str): The S3 bucket.
+        json_obj (dict): The S3 listing entry of the JSON output.
+        stored_images (set): The image keys known to exist in S3.
+
+    Returns:
+        str: "skipped" if the element store was up to date, "built" otherwise.
+    """
+    store_key = get_element_store_key(json_obj['Key'])
+    try:
+        head = s3_client.head_object(Bucket=bucket_name, Key=store_key)
+        if head.get('Metadata', {}).get('source-etag') == json_obj['ETag'].strip('"'):
+            return "skipped"
+    except ClientError:
+        pass
+
+    elements = json.loads(s3_client.get_object(Bucket=bucket_name, Key=json_obj['Key'])['Body'].read())
+    table, page_index = elements_to_table(elements, s3_client, bucket_name, stored_images)
+    sink = pa.BufferOutputStream()
+    write_element_store(table, page_index, sink)
+    s3_client.put_object(Bucket=bucket_name, Key=store_key, Body=sink.getvalue().to_pybytes(),
+                         ContentType='application/vnd.apache.parquet',
+                         Metadata={'source-etag': json_obj['ETag'].strip('"')})
+    return "built"
+
+def iter_json_outputs(s3_client, bucket_name: str, source_keys: list = None):
+    """
+    Yields the listing entries of the Unstructured JSON outputs, or only those of the given source PDFs.
+    """
+    if source_keys is None:
+        yield from (obj for obj in iter_s3_objects(s3_client, bucket_name, SOURCE_PREFIX) if obj['Key'].endswith('.json'))
+        return
+    for source_key in source_keys:
+        json_key = SOURCE_PREFIX + source_key.split('/')[-1] + '.json'
+        try:
+            head = s3_client.head_object(Bucket=bucket_name, Key=json_key)
+            yield {'Key': json_key, 'ETag': head['ETag'], 'Size': head['ContentLength']}
+        except ClientError as e:
+            logging_module.log_error(f"No Unstructured output found for {source_key}: {e}")
+
+def build_element_stores(max_workers: int = DEFAULT_MAX_WORKERS, source_keys: list = None) -> dict:
+    """
+    Converts every Unstructured JSON output under SOURCE_PREFIX into a Parquet element store.
+
+    Args:
+        max_workers (int, optional): The number of documents converted at the same time. Defaults to DEFAULT_MAX_WORKERS.
+        source_keys (list, optional): The S3 keys of the source PDFs whose outputs are converted, e.g. the files
+            reported by object-created events. Defaults to every output under SOURCE_PREFIX.
+
+    Returns:
+        dict: A dictionary with the keys "built", "skipped" (counts) and "failed" (mapping of S3 key to error).
+    """
+    s3_client = boto3.client('s3', aws_access_key_id=config.AWS_ACCESS_KEY_ID, aws_secret_access_key=config.AWS_SECRET_ACCESS_KEY)
+    stored_images = set()
+    results = {"built": 0, "skipped": 0, "failed": {}}
+    metrics = StageMetrics("build_element_stores")
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(build_element_store, s3_client, config.AWS_S3_BUCKET_NAME, obj, stored_images): obj
+            for obj in iter_json_outputs(s3_client, config.AWS_S3_BUCKET_NAME, source_keys)
+        }
+        for future in as_completed(futures):
+            key = futures[future]['Key']
+            try:
+                outcome = future.result()
+                results[outcome] += 1
+                # Up-to-date stores are skipped without reading the JSON output
+                metrics.record_file(key, bytes_downloaded=futures[future]['Size'] if outcome == "built" else 0)
+            except Exception as e:
+                logging_module.log_error(f"Error building the element store of {key}: {e}")
+                results["failed"][key] = str(e)
+                metrics.record_file(key, str(e))
+    metrics.finish()
+
+    logging_module.log_success(
+        f"Element stores: {results['built']} built, {results['skipped']} up to date, {len(results['failed'])} failed."
+    )
+    return results
@@ -0,0 +1,187 @@
+# This Python script implements the extraction cache shared by the open source (pymupdf4llm) and Unstructured
+# extraction pipelines. Extraction outputs are cached under a key made of the PDF content hash, the extractor name,
+# the extractor version and a hash of the extractor options, so a PDF is only converted again when its bytes, the
+# extractor or its settings change. Entries are stored under the `extraction_cache/` prefix of the S3 bucket, or in a
+# local directory stand-in when EXTRACTION_CACHE_DIR is set. Cache hits and misses are counted and logged per run.
+
+import os
+import json
+import shutil
+import hashlib
+import threading
+from botocore.exceptions import ClientError
+import data_load.data_storage_log as logging_module
+
+# S3 prefix holding the cached extraction outputs
+CACHE_PREFIX = 'extraction_cache/'
+
+# Local directory used instead of S3 when set (e.g. for local runs and tests)
+CACHE_DIR = os.getenv("EXTRACTION_CACHE_DIR")
+
+def hash_options(options: dict) -> str:
+    """
+    Returns a stable hash of a dictionary of extractor options.
+
+    Args:
+        options (dict): The extractor options.
+
+    Returns:
+        str: The first 16 hex digits of the SHA-256 of the options serialised with sorted keys.
+    """
+    return hashlib.sha256(json.dumps(options, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+def compute_s3_sha256(s3_client, bucket_name: str, key: str, chunk_size: int = 1024 * 1024) -> str:
+    """
+    Computes the SHA-256 of an S3 object by streaming its body.
+
+    Args:
+        s3_client: A boto3 S3 client.
+        bucket_name (str): The S3 bucket.
+        key (str): The S3 key.
+        chunk_size (int, optional): The number of bytes read at a time. Defaults to 1 MB.
+
+    Returns:
+        str: The hex digest of the object's content.
+    """
+    sha256 = hashlib.sha256()
+    body = s3_client.get_object(Bucket=bucket_name, Key=key)['Body']
+    for chunk in iter(lambda: body.read(chunk_size), b''):
+        sha256.update(chunk)
+    return sha256.hexdigest()
+
+class S3CacheStore:
+    """
+    Stores cache entries as objects under CACHE_PREFIX in the extraction bucket; entries are copied server-side.
+    """
+    def __init__(self, s3_client, bucket_name: str):
+        self.s3_client = s3_client
+        self.bucket_name = bucket_name
+
+    def contains(self, cache_key: str) -> bool:
+        try:
+            self.s3_client.head_object(Bucket=self.bucket_name, Key=CACHE_PREFIX + cache_key)
+            return True
+        except ClientError:
+            return False
+
+    def restore(self, cache_key: str, output_key: str) -> None:
+        self.s3_client.copy_object(Bucket=self.bucket_name, Key=output_key,
+                                   CopySource={'Bucket': self.bucket_name, 'Key': CACHE_PREFIX + cache_key})
+
+    def save(self, cache_key: str, output_key: str) -> None:
+        self.s3_client.copy_object(Bucket=self.bucket_name, Key=CACHE_PREFIX + cache_key,
+                                   CopySource={'Bucket': self.bucket_name, 'Key': output_key})
+
+class LocalCacheStore:
+    """
+    Local directory stand-in for the S3 cache store.
+    """
+    def __init__(self, s3_client, bucket_name: str, directory: str):
+        self.s3_client = s3_client
+        self.bucket_name = bucket_name
+        self.directory = directory
+
+    def path(self, cache_key: str) -> str:
+        return os.path.join(self.directory, *cache_key.split('/'))
+
+    def contains(self, cache_key: str) -> bool:
+        return os.path.exists(self.path(cache_key))
+
+    def restore(self, cache_key: str, output_key: str) -> None:
+        self.s3_client.upload_file(self.path(cache_key), self.bucket_name, output_key)
+
+    def save(self, cache_key: str, output_key: str) -> None:
+        path = self.path(cache_key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.s3_client.download_file(self.bucket_name, output_key, path + ".tmp")
+        shutil.move(path + ".tmp", path)
+
+class ExtractionCache:
+    """
+    Cache of extraction outputs keyed by (content hash, extractor name, extractor version, options hash).
+    Safe to use from several threads; hit and miss counts cover the lifetime of the object, i.e. one run.
+    """
+    def __init__(self, store, extractor: str, version: str, options: dict):
+        self.store = store
+        self.extractor = extractor
+        self.version = version
+        self.options_hash = hash_options(options)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def key_for(self, content_sha256: str) -> str:
+        """
+        Returns the cache key of a PDF for this extractor, version and set of options.
+        """
+        return f"{self.extractor}/{self.version}/{self.options_hash}/{content_sha256}"
+
+    def restore(self, content_sha256: str, output_key: str) -> bool:
+        """
+        Writes the cached output of a PDF to its output location, if the cache holds one.
+
+        Args:
+            content_sha256 (str): The SHA-256 of the PDF.
+            output_key (str): The S3 key the extraction output is expected at.
+
+        Returns:
+            bool: True on a cache hit, False on a miss (the PDF must be extracted).
+        """
+        cache_key = self.key_for(content_sha256)
+        try:
+            hit = self.store.contains(cache_key)
+            if hit:
+                self.store.restore(cache_key, output_key)
+        except Exception as e:
+            logging_module.log_error(f"Error reading extraction cache entry {cache_key}: {e}")
+            hit = False
+
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return hit
+
+    def save(self, content_sha256: str, output_key: str) -> None:
+        """
+        Adds the extraction output of a PDF to the cache. Failures are logged and otherwise ignored.
+
+        Args:
+            content_sha256 (str): The SHA-256 of the PDF.
+            output_key (str): The S3 key of the extraction output.
+        """
+        cache_key = self.key_for(content_sha256)
+        try:
+            self.store.save(cache_key, output_key)
+        except Exception as e:
+            logging_module.log_error(f"Error writing extraction cache entry {cache_key}: {e}")
+
+    def log_summary(self) -> None:
+        """
+        Logs the cache hit and miss counts of the run.
+        """
+        logging_module.log_success(
+            f"Extraction cache for {self.extractor} {self.version} (options {self.options_hash}): "
+            f"{self.hits} hit(s), {self.misses} miss(es)."
+        )
+
+def create_extraction_cache(s3_client, bucket_name: str, extractor: str, version: str, options: dict) -> ExtractionCache:
+    """
+    Creates an extraction cache backed by S3, or by the local directory EXTRACTION_CACHE_DIR when it is set.
+
+    Args:
+        s3_client: A boto3 S3 client.
+        bucket_name (str): The S3 bucket holding the extraction outputs.
+        extractor (str): The name of the extractor.
+        version (str): The version of the extractor.
+        options (dict): The extractor options.
+
+    Returns:
+        ExtractionCache: The extraction cache.
+    """
+    if CACHE_DIR:
+        store = LocalCacheStore(s3_client, bucket_name, CACHE_DIR)
+    else:
+        store = S3CacheStore(s3_client, bucket_name)
+    return ExtractionCache(store, extractor, version, options)
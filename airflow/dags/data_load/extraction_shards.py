@@ -0,0 +1,146 @@
+# This Python script splits the extraction work of the PDF pipeline into shards for Airflow dynamic task mapping.
+# The shards are planned from the sync manifest written by the S3 upload stage (falling back to a listing of
+# `gaia_files/` when no manifest exists yet), balancing the total bytes per shard so that the mapped extraction tasks
+# take similar times. Each shard is extracted by its own mapped task instance, which is retried on its own when one
+# of its PDFs fails, and a reduce step combines the results of all shards once they have finished. PDFs that the
+# upload stage already converted in fused mode are marked in the plan, so the open source shards skip them.
+
+import os
+import heapq
+import boto3
+import data_load.data_storage_log as logging_module
+from data_load.sync_manifest import load_manifest
+from data_load.s3_listing import iter_s3_objects
+import data_load.parameter_config_airflow as config
+
+# Default number of shards, normally at least the number of Airflow workers
+DEFAULT_SHARD_COUNT = int(os.getenv("EXTRACTION_SHARD_COUNT", "8"))
+
+# Prefix holding the source PDFs
+SOURCE_PREFIX = 'gaia_files/'
+
+def list_source_pdfs(s3_client, bucket_name: str) -> list:
+    """
+    Returns the source PDFs recorded in the sync manifest, or listed under SOURCE_PREFIX when there is no manifest.
+
+    Returns:
+        list: The PDFs as dictionaries with the keys "Key" and "Size".
+    """
+    manifest = load_manifest(s3_client, bucket_name)
+    if manifest:
+        # Duplicate files share one S3 object, so deduplicate by key
+        objects = {entry["s3_key"]: entry.get("size") or 0 for entry in manifest.values()
+                   if entry.get("s3_key", "").endswith('.pdf')}
+        return [{"Key": key, "Size": size} for key, size in objects.items()]
+    return [{"Key": obj['Key'], "Size": obj['Size']} for obj in iter_s3_objects(s3_client, bucket_name, SOURCE_PREFIX)
+            if obj['Key'].endswith('.pdf')]
+
+def split_into_shards(objects: list, shard_count: int) -> list:
+    """
+    Splits objects into at most `shard_count` shards of similar total size, assigning the largest objects first.
+
+    Args:
+        objects (list): The objects, as dictionaries with the keys "Key" and "Size".
+        shard_count (int): The maximum number of shards.
+
+    Returns:
+        list: The non-empty shards, each a list of objects.
+    """
+    shards = [[] for _ in range(min(shard_count, len(objects)))]
+    # Heap of (total size, shard index) so that each object goes to the smallest shard so far
+    sizes = [(0, index) for index in range(len(shards))]
+    for obj in sorted(objects, key=lambda obj: obj["Size"], reverse=True):
+        total, index = heapq.heappop(sizes)
+        shards[index].append(obj)
+        heapq.heappush(sizes, (total + obj["Size"], index))
+    return shards
+
+def plan_extraction_shards(shard_count: int = DEFAULT_SHARD_COUNT, ti=None,
+                           upload_task_id: str = 'load_pdf_files_into_s3') -> list:
+    """
+    Plans the shards extracted by the mapped tasks of the PDF pipeline.
+
+    Args:
+        shard_count (int, optional): The maximum number of shards. Defaults to DEFAULT_SHARD_COUNT.
+        ti (optional): The task instance, passed by Airflow; used to read the PDFs converted by the upload stage in
+            fused mode.
+        upload_task_id (str, optional): The task_id of the upload stage. Defaults to 'load_pdf_files_into_s3'.
+
+    Returns:
+        list: One dictionary {"objects": [...]} per shard, used as the op_kwargs of the mapped tasks.
+    """
+    if shard_count < 1:
+        raise ValueError("shard_count must be a positive integer.")
+    s3_client = boto3.client('s3', aws_access_key_id=config.AWS_ACCESS_KEY_ID, aws_secret_access_key=config.AWS_SECRET_ACCESS_KEY)
+    objects = list_source_pdfs(s3_client, config.AWS_S3_BUCKET_NAME)
+
+    # PDFs converted from memory by the fused upload stage need no open source extraction
+    upload_result = ti.xcom_pull(task_ids=upload_task_id) if ti is not None else None
+    converted = set(upload_result.get("converted", [])) if upload_result else set()
+    for obj in objects:
+        if obj["Key"] in converted:
+            obj["converted"] = True
+
+    shards = split_into_shards(objects, shard_count)
+    logging_module.log_success(
+        f"Planned {len(shards)} extraction shard(s) of {[len(shard) for shard in shards]} PDF(s), "
+        f"{len(converted)} already converted in the upload stage."
+    )
+    return [{"objects": shard} for shard in shards]
+
+def to_unstructured_env(shard: dict) -> dict:
+    """
+    Maps a shard to the environment of a mapped run of the Unstructured bash script.
+    """
+    return {"UNSTRUCTURED_SOURCE_KEYS": ",".join(obj["Key"] for obj in shard["objects"])}
+
+def to_source_keys(shard: dict) -> dict:
+    """
+    Maps a shard to the op_kwargs of a mapped task taking the source keys.
+    """
+    return {"source_keys": [obj["Key"] for obj in shard["objects"]]}
+
+def extract_shard_open_source(objects: list) -> dict:
+    """
+    Converts the PDFs of one shard with the open source pipeline; fails if any PDF failed, so that the shard is
+    retried on its own. PDFs marked as converted by the fused upload stage are skipped.
+
+    Args:
+        objects (list): The PDFs of the shard, as dictionaries with the keys "Key" and "Size".
+
+    Returns:
+        dict: The results of the shard, see `process_pdf_open_source`, with the skipped PDFs under "fused".
+    """
+    fused = [obj["Key"] for obj in objects if obj.get("converted")]
+    objects = [obj for obj in objects if not obj.get("converted")]
+    if not objects:
+        return {"succeeded": [], "failed": {}, "fused": fused}
+
+    from data_load.pdf_extraction_open_source import process_pdf_open_source
+    results = process_pdf_open_source(objects=objects)
+    if results is None or results["failed"]:
+        raise RuntimeError(f"Open source extraction failed for: {results and list(results['failed'])}")
+    return {**results, "fused": fused}
+
+def reduce_shard_results(ti, task_id: str) -> dict:
+    """
+    Reduce step: combines the results returned by all mapped instances of a task.
+
+    Args:
+        ti: The task instance of the reduce task.
+        task_id (str): The task_id of the mapped task.
+
+    Returns:
+        dict: The number of shards and the totals of every numeric or list result key.
+    """
+    summary = {"shards": 0}
+    for result in ti.xcom_pull(task_ids=task_id) or []:
+        if not result:
+            continue
+        summary["shards"] += 1
+        for key, value in result.items():
+            count = len(value) if isinstance(value, (list, dict)) else value
+            if isinstance(count, int):
+                summary[key] = summary.get(key, 0) + count
+    logging_module.log_success(f"Results of {task_id}: {summary}")
+    return summary
@@ -0,0 +1,103 @@
+# This Python script manages the local Parquet snapshot of the GAIA PDF metadata used by `load_gaia_metadata_tbl`.
+# Each snapshot holds only the filtered PDF rows and the columns loaded into RDS, and is keyed by the Hugging Face
+# dataset revision (commit sha), so the dataset only has to be downloaded and converted when the revision changes.
+# Snapshots are read back as memory-mapped Arrow tables instead of being materialised as pandas DataFrames.
+# A small state file records the latest snapshot and the revision last loaded into RDS, which allows the metadata
+# table to be rebuilt fully offline ("snapshot only" mode) and the load to be skipped when nothing changed.
+
+import os
+import json
+import pyarrow as pa
+import pyarrow.parquet as pq
+from huggingface_hub import HfApi
+
+# Hugging Face dataset holding the GAIA benchmark
+GAIA_DATASET_ID = "gaia-benchmark/GAIA"
+
+# Directory holding the snapshots; kept outside of the DAGs folder so the scheduler never parses it
+SNAPSHOT_DIR = os.getenv("GAIA_SNAPSHOT_DIR", "/opt/airflow/gaia_snapshots")
+
+# State file recording the latest snapshot and the revision last loaded into RDS
+STATE_FILE = "snapshot_state.json"
+
+def get_dataset_revision(token: str) -> str:
+    """
+    Fetches the current revision (commit sha) of the GAIA dataset without downloading any data.
+
+    Args:
+        token (str): The Hugging Face access token.
+
+    Returns:
+        str: The commit sha of the dataset's default branch.
+    """
+    return HfApi().dataset_info(GAIA_DATASET_ID, token=token).sha
+
+def snapshot_path(revision: str) -> str:
+    """
+    Returns the path of the snapshot for a dataset revision.
+
+    Args:
+        revision (str): The dataset revision.
+
+    Returns:
+        str: The path of the Parquet snapshot.
+    """
+    return os.path.join(SNAPSHOT_DIR, f"gaia_2023_all_pdf_{revision}.parquet")
+
+def read_state() -> dict:
+    """
+    Reads the snapshot state file.
+
+    Returns:
+        dict: The snapshot state, or an empty dictionary if no state has been written yet.
+    """
+    try:
+        with open(os.path.join(SNAPSHOT_DIR, STATE_FILE), 'r') as state_file:
+            return json.load(state_file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def update_state(**values) -> None:
+    """
+    Updates the snapshot state file with the given values.
+    """
+    state = {**read_state(), **values}
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    temp_path = os.path.join(SNAPSHOT_DIR, STATE_FILE + ".tmp")
+    with open(temp_path, 'w') as state_file:
+        json.dump(state, state_file)
+    os.replace(temp_path, os.path.join(SNAPSHOT_DIR, STATE_FILE))
+
+def write_snapshot(table: pa.Table, revision: str) -> str:
+    """
+    Writes a snapshot for a dataset revision and marks it as the latest snapshot.
+
+    Args:
+        table (pa.Table): The filtered GAIA PDF metadata.
+        revision (str): The dataset revision the metadata was read from.
+
+    Returns:
+        str: The path of the written snapshot.
+    """
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    path = snapshot_path(revision)
+    # Write to a temporary file first so that a failed run never leaves a truncated snapshot behind
+    pq.write_table(table, path + ".tmp")
+    os.replace(path + ".tmp", path)
+    update_state(latest_revision=revision)
+    return path
+
+def read_snapshot(revision: str) -> pa.Table:
+    """
+    Reads the snapshot for a dataset revision as a memory-mapped Arrow table.
+
+    Args:
+        revision (str): The dataset revision.
+
+    Returns:
+        pa.Table: The snapshot, or None if no snapshot exists for the revision.
+    """
+    path = snapshot_path(revision)
+    if not os.path.exists(path):
+        return None
+    return pq.read_table(path, memory_map=True)
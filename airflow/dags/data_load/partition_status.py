@@ -0,0 +1,95 @@
+# This Python script records the HTTP status and latency of every request sent to the Unstructured partition API,
+# including the page requests sent by the split PDF hook of the partition client, so that the concurrency controller
+# backs off on the 429 and 5xx responses it is tuned on. The client sends its requests with httpx, whose send methods
+# are wrapped once per process. The ingest pipeline partitions documents in worker processes, so every process appends
+# its observations to a JSONL file of its own in the directory named by PARTITION_STATUS_DIR, and the wave loop drains
+# the directory after each pipeline run. Requests raising before a response (timeouts, connection errors) are recorded
+# with the status None and the name of the error class.
+
+import os
+import json
+import time
+import functools
+import threading
+from urllib.parse import urlparse
+import httpx
+
+# Environment variable naming the directory the observations are written to; nothing is recorded when it is unset
+STATUS_DIR_VARIABLE = "PARTITION_STATUS_DIR"
+
+_write_lock = threading.Lock()
+
+def _partition_host() -> str:
+    return urlparse(os.getenv("UNSTRUCTURED_API_URL", "")).netloc
+
+def record_status(request: httpx.Request, status_code: int, started: float, error: Exception = None) -> None:
+    """
+    Appends the outcome of a request to the partition API to the file of this process.
+    """
+    directory = os.getenv(STATUS_DIR_VARIABLE)
+    if not directory or request.url.netloc.decode('ascii') != _partition_host():
+        return
+    line = json.dumps({"status": status_code, "latency": time.perf_counter() - started,
+                       "error": type(error).__name__ if error else None})
+    with _write_lock, open(os.path.join(directory, f"{os.getpid()}.jsonl"), "a") as f:
+        f.write(line + "\n")
+
+def _wrap_send(send):
+    @functools.wraps(send)
+    def recorded_send(client, request, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = send(client, request, *args, **kwargs)
+        except Exception as e:
+            record_status(request, None, started, e)
+            raise
+        record_status(request, response.status_code, started)
+        return response
+    return recorded_send
+
+def _wrap_async_send(send):
+    @functools.wraps(send)
+    async def recorded_send(client, request, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = await send(client, request, *args, **kwargs)
+        except Exception as e:
+            record_status(request, None, started, e)
+            raise
+        record_status(request, response.status_code, started)
+        return response
+    return recorded_send
+
+def install_status_recorder() -> None:
+    """
+    Wraps the send methods of the httpx clients of this process so that requests to the partition API are recorded.
+    """
+    if getattr(httpx.Client.send, "_records_partition_status", False):
+        return
+    httpx.Client.send = _wrap_send(httpx.Client.send)
+    httpx.AsyncClient.send = _wrap_async_send(httpx.AsyncClient.send)
+    httpx.Client.send._records_partition_status = True
+
+def drain_statuses(directory: str) -> list:
+    """
+    Reads and removes the observations written to a status directory.
+
+    Args:
+        directory (str): The directory named by PARTITION_STATUS_DIR.
+
+    Returns:
+        list: The observations as (latency, status_code) tuples, in the form taken by the concurrency controller.
+    """
+    observations = []
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        with open(path) as f:
+            for line in f:
+                # A line may be incomplete if its process was killed while writing
+                try:
+                    observation = json.loads(line)
+                except ValueError:
+                    continue
+                observations.append((observation["latency"], observation["status"]))
+        os.remove(path)
+    return observations
@@ -0,0 +1,152 @@
+# This Python script holds the PDF to markdown conversion used by the open source extraction pipeline.
+# PDFs are opened straight from their bytes in memory (no temporary files), and markdown is produced one page at a time
+# and streamed into an S3 multipart upload, so peak memory stays bounded even for very large PDFs with embedded images.
+# Images can be externalised: instead of being inlined as base64, each image is written once to a content-addressed S3
+# object under `open_source_images/` and the markdown keeps a lightweight reference to it.
+# Large documents can also be converted as page-range shards on several workers and merged in page order.
+# It deliberately avoids the parameter store and database modules, so that the worker processes of the conversion
+# process pool can import it cheaply and without side effects.
+
+import re
+import time
+import base64
+import hashlib
+import boto3
+from importlib.metadata import version
+from botocore.exceptions import ClientError
+import pymupdf
+import pymupdf4llm
+from data_load.s3_transfer import S3MultipartWriter
+
+# Options passed to pymupdf4llm.to_markdown
+MARKDOWN_OPTIONS = {"embed_images": True, "table_strategy": "lines"}
+
+# Name and version of the extractor, used together with MARKDOWN_OPTIONS to key the extraction cache
+EXTRACTOR_NAME = "pymupdf4llm"
+EXTRACTOR_VERSION = version("pymupdf4llm")
+
+# S3 prefix of the externalised, content-addressed images
+IMAGE_PREFIX = 'open_source_images/'
+
+# Base64 images inlined by pymupdf4llm when embed_images=True
+EMBEDDED_IMAGE_PATTERN = re.compile(r'!\[([^\]]*)\]\(data:image/([A-Za-z0-9.+-]+);base64,([A-Za-z0-9+/=]+)\)')
+
+# S3 client of the current worker process, created on first use
+_s3_client = None
+
+# Image keys known to exist in S3 in the current worker process
+_stored_images = set()
+
+def get_s3_client(aws_access_key_id: str, aws_secret_access_key: str):
+    """
+    Returns the S3 client of the current process, creating it on first use.
+    """
+    global _s3_client
+    if _s3_client is None:
+        _s3_client = boto3.client('s3', aws_access_key_id=aws_access_key_id, aws_secret_access_key=aws_secret_access_key)
+    return _s3_client
+
+def count_pages(pdf_data: bytes) -> int:
+    """
+    Returns the number of pages of an in-memory PDF.
+    """
+    with pymupdf.open(stream=pdf_data, filetype="pdf") as doc:
+        return doc.page_count
+
+def externalize_images(md_text: str, s3_client, bucket_name: str) -> str:
+    """
+    Moves the base64 images of a markdown text into content-addressed S3 objects and replaces them with references.
+
+    Args:
+        md_text (str): Markdown text with images inlined as base64 data URIs.
+        s3_client: A boto3 S3 client.
+        bucket_name (str): The S3 bucket holding the images.
+
+    Returns:
+        str: The markdown text with `![](open_source_images/<sha256>.<format>)` references instead of data URIs.
+    """
+    def store_image(match) -> str:
+        alt_text, image_format, image_base64 = match.groups()
+        image_data = base64.b64decode(image_base64)
+        image_key = f"{IMAGE_PREFIX}{hashlib.sha256(image_data).hexdigest()}.{image_format}"
+        if image_key not in _stored_images:
+            # Identical images share one object, so only upload images that are not stored yet
+            try:
+                s3_client.head_object(Bucket=bucket_name, Key=image_key)
+            except ClientError:
+                s3_client.put_object(Bucket=bucket_name, Key=image_key, Body=image_data, ContentType=f"image/{image_format}")
+            _stored_images.add(image_key)
+        return f"![{alt_text}]({image_key})"
+
+    return EMBEDDED_IMAGE_PATTERN.sub(store_image, md_text)
+
+def iter_markdown_pages(pdf_data: bytes, start_page: int = 0, end_page: int = None, image_store: dict = None):
+    """
+    Converts an in-memory PDF to markdown text with embedded images and tables, one page at a time.
+    The header levels are always identified on the whole document, so the concatenated pages of any split into page
+    ranges are identical to converting the document in a single call.
+
+    Args:
+        pdf_data (bytes): The contents of the PDF file.
+        start_page (int, optional): The first page to convert (0-based). Defaults to 0.
+        end_page (int, optional): The page to stop before. Defaults to the end of the document.
+        image_store (dict, optional): The "bucket_name", "aws_access_key_id" and "aws_secret_access_key" used to
+            externalise images; images stay inlined as base64 when omitted.
+
+    Yields:
+        str: The markdown text of each page, in page order.
+    """
+    with pymupdf.open(stream=pdf_data, filetype="pdf") as doc:
+        hdr_info = pymupdf4llm.IdentifyHeaders(doc)
+        end_page = doc.page_count if end_page is None else min(end_page, doc.page_count)
+        for page_number in range(start_page, end_page):
+            md_text = pymupdf4llm.to_markdown(doc, pages=[page_number], hdr_info=hdr_info, **MARKDOWN_OPTIONS)
+            if image_store:
+                s3_client = get_s3_client(image_store["aws_access_key_id"], image_store["aws_secret_access_key"])
+                md_text = externalize_images(md_text, s3_client, image_store["bucket_name"])
+            yield md_text
+
+def convert_pdf_pages(pdf_data: bytes, start_page: int, end_page: int, image_store: dict = None) -> str:
+    """
+    Converts a page range of an in-memory PDF to markdown text; used to shard large documents across workers.
+
+    Args:
+        pdf_data (bytes): The contents of the PDF file.
+        start_page (int): The first page to convert (0-based).
+        end_page (int): The page to stop before.
+        image_store (dict, optional): The image store settings, see `iter_markdown_pages`.
+
+    Returns:
+        str: The markdown text of the page range.
+    """
+    return "".join(iter_markdown_pages(pdf_data, start_page, end_page, image_store))
+
+def convert_pdf_to_s3(pdf_data: bytes, bucket_name: str, output_key: str, aws_access_key_id: str,
+                      aws_secret_access_key: str, externalize: bool = False) -> dict:
+    """
+    Converts an in-memory PDF to markdown and streams the markdown page by page into an S3 object.
+
+    Args:
+        pdf_data (bytes): The contents of the PDF file.
+        bucket_name (str): The destination S3 bucket.
+        output_key (str): The destination S3 key.
+        aws_access_key_id (str): The AWS access key used by the worker process.
+        aws_secret_access_key (str): The AWS secret key used by the worker process.
+        externalize (bool, optional): Whether images are stored as separate S3 objects. Defaults to False.
+
+    Returns:
+        dict: A dictionary with the keys "output_key", "pages", "bytes" and "seconds" (conversion and upload time).
+    """
+    start_time = time.perf_counter()
+    s3_client = get_s3_client(aws_access_key_id, aws_secret_access_key)
+    image_store = None
+    if externalize:
+        image_store = {"bucket_name": bucket_name, "aws_access_key_id": aws_access_key_id,
+                       "aws_secret_access_key": aws_secret_access_key}
+    pages = 0
+    with S3MultipartWriter(s3_client, bucket_name, output_key) as writer:
+        for page_markdown in iter_markdown_pages(pdf_data, image_store=image_store):
+            writer.write(page_markdown.encode('utf-8'))
+            pages += 1
+    return {"output_key": output_key, "pages": pages, "bytes": writer.bytes_written,
+            "seconds": time.perf_counter() - start_time}
@@ -1,34 +1,112 @@
 # This script processes PDF files stored in an AWS S3 bucket by converting them to markdown text.
-# It connects to AWS S3 to read PDF files from a specific folder, processes them using the pymupdf4llm library,
+# It connects to AWS S3 to read PDF files from a specific folder, processes them in memory using the pymupdf4llm library,
 # and converts them to markdown format with embedded images and tables.
-# The processed markdown files are then uploaded back to the S3 bucket in a specified output folder as .txt files.
-# The script uses a temporary file to handle the PDF data during processing, ensuring efficient file management.
-# It also logs each successful upload after processing.
+# The markdown is streamed page by page back to the S3 bucket in a specified output folder as .txt files.
+# The CPU-bound conversions run on a process pool sized to the worker's cores, while the S3 downloads run on a thread
+# pool. The bucket is listed page by page so that processing starts with the first page, files are processed
+# largest first (among the files listed so far) to reduce stragglers, and the number of PDFs held in memory is bounded.
+# Images can be written to separate content-addressed S3 objects instead of being inlined as base64 in the .txt files.
+# PDFs above a page-count threshold are split into page ranges that are converted in parallel and merged in page order.
+# PDFs whose content was already converted with the same extractor version and options are restored from the
+# extraction cache instead of being converted again. In the fused download and extract mode, PDFs that were just
+# streamed to S3 are converted from the same in-memory buffer instead (see `InMemoryPdfConverter`).
+# It also logs the outcome of every file and a summary once processing is complete, and records the bytes, pages and
+# extraction time of every file in the pipeline metrics.
 
-import pymupdf4llm
 import os
 import boto3
-import pandas as pd
 import mysql.connector
+import time
+import heapq
+import hashlib
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
 from data_load.db_connection import get_db_connection
-from io import BytesIO
-from data_load.parameter_config_airflow import AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY, AWS_S3_BUCKET_NAME
-import tempfile
+import data_load.parameter_config_airflow as config
+from data_load.pdf_conversion import convert_pdf_to_s3, convert_pdf_pages, count_pages, EXTRACTOR_NAME, EXTRACTOR_VERSION, MARKDOWN_OPTIONS
+from data_load.extraction_cache import create_extraction_cache
+from data_load.s3_listing import iter_s3_pages
+from data_load.s3_transfer import S3MultipartWriter
+from data_load.pipeline_metrics import StageMetrics
 import logging
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 
-# Getting AWS credentials from environment variables
-aws_access_key_id = AWS_ACCESS_KEY_ID
-aws_secret_access_key = AWS_SECRET_ACCESS_KEY
-aws_bucket_name = AWS_S3_BUCKET_NAME
+# Default number of conversion processes and S3 I/O threads
+DEFAULT_NUM_WORKERS = os.cpu_count() or 1
+DEFAULT_IO_WORKERS = 8
 
-def process_pdf_open_source():
+# Documents with at least this many pages are split into shards of DEFAULT_SHARD_SIZE pages
+DEFAULT_SHARD_THRESHOLD = 50
+DEFAULT_SHARD_SIZE = 20
+
+# S3 folders read from and written to
+SOURCE_PREFIX = 'gaia_files/'
+OPEN_SOURCE_OUTPUT_FOLDER = 'open_source_processed/'
+
+def download_pdf(s3_client, key: str, cache) -> tuple:
+    """
+    Reads a PDF file from S3 and restores its markdown from the extraction cache when possible.
+
+    Args:
+        s3_client: A boto3 S3 client.
+        key (str): The S3 key of the PDF file.
+        cache (ExtractionCache): The extraction cache.
+
+    Returns:
+        tuple: The contents of the PDF file (None on a cache hit) and its SHA-256.
+    """
+    pdf_obj = s3_client.get_object(Bucket=config.AWS_S3_BUCKET_NAME, Key=key)
+    pdf_data = pdf_obj['Body'].read()
+    content_sha256 = hashlib.sha256(pdf_data).hexdigest()
+    if cache.restore(content_sha256, get_output_key(key)):
+        return None, content_sha256
+    return pdf_data, content_sha256
+
+def get_output_key(key: str) -> str:
+    """
+    Returns the S3 key of the .txt file holding the markdown text of a PDF.
+
+    Args:
+        key (str): The S3 key of the source PDF file.
+
+    Returns:
+        str: The S3 key of the .txt file in the open source output folder.
+    """
+    return OPEN_SOURCE_OUTPUT_FOLDER + key.split('/')[-1].replace('.pdf', '.txt')
+
+def process_pdf_open_source(num_workers: int = DEFAULT_NUM_WORKERS, io_workers: int = DEFAULT_IO_WORKERS,
+                            shard_threshold: int = DEFAULT_SHARD_THRESHOLD, shard_size: int = DEFAULT_SHARD_SIZE,
+                            externalize_images: bool = False, objects: list = None) -> dict:
     """
     This function processes PDF files from an S3 bucket by converting them to markdown text and uploading the
-    converted text files back to the S3 bucket. Uses pymupdf4llm for conversion, and handles PDFs using a temporary file.
+    converted text files back to the S3 bucket. Uses pymupdf4llm for conversion on a pool of `num_workers` processes,
+    which stream the markdown page by page to S3, while downloads run on `io_workers` threads. Documents with at least
+    `shard_threshold` pages are split into shards of `shard_size` pages that are converted in parallel and merged in
+    page order, producing the same output as the serial conversion.
+
+    Args:
+        num_workers (int, optional): The number of conversion processes. Defaults to the number of CPU cores.
+        io_workers (int, optional): The number of threads used for S3 downloads. Defaults to DEFAULT_IO_WORKERS.
+        shard_threshold (int, optional): The page count from which documents are sharded. Defaults to DEFAULT_SHARD_THRESHOLD.
+        shard_size (int, optional): The number of pages per shard. Defaults to DEFAULT_SHARD_SIZE.
+        externalize_images (bool, optional): Whether images are stored as content-addressed S3 objects and referenced
+            from the markdown instead of being embedded as base64. Defaults to False.
+        objects (list, optional): The S3 objects to process, as dictionaries with the keys "Key" and "Size" (e.g. the
+            files reported by object-created events). Defaults to every PDF under SOURCE_PREFIX.
+
+    Returns:
+        dict: A dictionary with the keys "succeeded" (list of processed S3 keys) and "failed" (mapping of S3 key to error).
     """
+    if num_workers < 1 or io_workers < 1 or shard_size < 1:
+        raise ValueError("num_workers, io_workers and shard_size must be positive integers.")
+
+    # Getting AWS credentials from the configuration
+    aws_access_key_id = config.AWS_ACCESS_KEY_ID
+    aws_secret_access_key = config.AWS_SECRET_ACCESS_KEY
+    aws_bucket_name = config.AWS_S3_BUCKET_NAME
+
     # MySQL connection (not used in the processing but available for future use)
     try:
         db_conn = get_db_connection()
@@ -48,49 +126,234 @@ def process_pdf_open_source():
     except Exception as e:
         logging.error(f"Error setting up S3 client: {e}")
         return
-    
-    try:
-        # List PDF files in the specified S3 directory
-        response = s3_client.list_objects_v2(Bucket=aws_bucket_name, Prefix='gaia_files/')
-        open_source_output_folder = 'open_source_processed/'
-    except Exception as e:
-        logging.error(f"Error listing objects in S3 bucket: {e}")
-        return
 
-    # Process each PDF file in the list
-    for obj in response.get('Contents', []):
-        if obj['Key'].endswith('.pdf'):
-            try:
-                # Read the PDF file from S3
-                pdf_obj = s3_client.get_object(Bucket=aws_bucket_name, Key=obj['Key'])
-                pdf_data = pdf_obj['Body'].read()
-                logging.info(f"Downloaded PDF: {obj['Key']}")
-            except Exception as e:
-                logging.error(f"Error reading PDF from S3: {obj['Key']}, {e}")
-                continue
-
-            try:
-                # Use a temporary file to store the PDF data for processing
-                with tempfile.NamedTemporaryFile(delete=True) as temp_file:
-                    temp_file.write(pdf_data)
-                    temp_file.flush()  # Ensure data is written to the temp file
-
-                    # Convert PDF to markdown text using pymupdf4llm
-                    md_text = pymupdf4llm.to_markdown(temp_file.name, embed_images=True, table_strategy='lines')
-                    logging.info(f"Converted PDF to markdown: {obj['Key']}")
-            except Exception as e:
-                logging.error(f"Error processing PDF to markdown: {obj['Key']}, {e}")
-                continue
-
-            try:
-                # Define output file name and path for uploading the markdown text as a .txt file
-                output_key = open_source_output_folder + obj['Key'].split('/')[-1].replace('.pdf', '.txt')
-
-                # Upload the markdown text to S3 as a .txt file
-                s3_client.put_object(Bucket=aws_bucket_name, Key=output_key, Body=md_text)
-                logging.info(f"Uploaded markdown file to S3: {output_key}")
-            except Exception as e:
-                logging.error(f"Error uploading markdown file to S3: {output_key}, {e}")
-                continue
-
-    logging.info("Processing completed.")
+    metrics = StageMetrics("process_pdf_open_source")
+    cache_options = {**MARKDOWN_OPTIONS, "externalize_images": externalize_images}
+    cache = create_extraction_cache(s3_client, aws_bucket_name, EXTRACTOR_NAME, EXTRACTOR_VERSION, cache_options)
+
+    image_store = None
+    if externalize_images:
+        image_store = {"bucket_name": aws_bucket_name, "aws_access_key_id": aws_access_key_id,
+                       "aws_secret_access_key": aws_secret_access_key}
+
+    # List PDF files in the specified S3 directory page by page, unless the files to process are given
+    pages = iter_s3_pages(s3_client, aws_bucket_name, SOURCE_PREFIX) if objects is None else iter([objects])
+    listing_done = False
+
+    # Heap of (-size, key) so that the largest listed file is always processed next
+    pending = []
+    results = {"succeeded": [], "failed": {}}
+    # Per-file metrics (bytes, pages, extraction seconds), recorded once the file is finished
+    file_metrics = {}
+
+    def list_next_page() -> None:
+        nonlocal listing_done
+        try:
+            page = next(pages)
+        except StopIteration:
+            listing_done = True
+            return
+        except Exception as e:
+            logging.error(f"Error listing objects in S3 bucket: {e}")
+            listing_done = True
+            return
+        for obj in page:
+            if obj['Key'].endswith('.pdf'):
+                heapq.heappush(pending, (-obj['Size'], obj['Key']))
+                file_metrics[obj['Key']] = {"bytes_downloaded": obj['Size']}
+
+    # Bound the number of PDFs held in memory between download and conversion
+    max_in_flight = num_workers * 2
+
+    # Worker processes are spawned rather than forked, as forking a process that already runs threads is unsafe
+    with ThreadPoolExecutor(max_workers=io_workers) as io_pool, \
+            ProcessPoolExecutor(max_workers=num_workers, mp_context=multiprocessing.get_context("spawn")) as cpu_pool:
+        # Maps each future to its (stage, key, shard index)
+        in_flight = {}
+        # PDFs between download and the end of their conversion, with their SHA-256
+        active = {}
+        # Merge state of sharded documents
+        sharded = {}
+
+        def fill_pipeline():
+            while len(active) < max_in_flight:
+                # Keep at least a pipeline's worth of files listed, so that the largest ones are picked first
+                while not listing_done and len(pending) < max_in_flight:
+                    list_next_page()
+                if not pending:
+                    return
+                _, key = heapq.heappop(pending)
+                active[key] = None
+                in_flight[io_pool.submit(download_pdf, s3_client, key, cache)] = ('download', key, None)
+
+        def finish(key: str, error: str = None, **values):
+            content_sha256 = active.pop(key, None)
+            metrics.record_file(key, error, **file_metrics.pop(key, {}), **values)
+            if error is None:
+                results["succeeded"].append(key)
+                io_pool.submit(cache.save, content_sha256, get_output_key(key))
+            else:
+                results["failed"][key] = error
+
+        def start_conversion(key: str, pdf_data: bytes):
+            page_count = count_pages(pdf_data) if num_workers > 1 else 0
+            if page_count < shard_threshold:
+                conversion = cpu_pool.submit(convert_pdf_to_s3, pdf_data, aws_bucket_name, get_output_key(key),
+                                             aws_access_key_id, aws_secret_access_key, externalize_images)
+                in_flight[conversion] = ('convert', key, None)
+                return
+
+            # Split the document into page ranges and merge the shards in page order as they complete
+            shard_ranges = [(start, min(start + shard_size, page_count)) for start in range(0, page_count, shard_size)]
+            sharded[key] = {
+                "writer": S3MultipartWriter(s3_client, aws_bucket_name, get_output_key(key)),
+                "shards": {},
+                "next": 0,
+                "total": len(shard_ranges),
+                "pages": page_count,
+                "started": time.perf_counter()
+            }
+            for index, (start_page, end_page) in enumerate(shard_ranges):
+                shard = cpu_pool.submit(convert_pdf_pages, pdf_data, start_page, end_page, image_store)
+                in_flight[shard] = ('shard', key, index)
+            logging.info(f"Split {key} ({page_count} pages) into {len(shard_ranges)} shards")
+
+        def merge_shard(key: str, index: int, md_text: str):
+            state = sharded[key]
+            state["shards"][index] = md_text
+            while state["next"] in state["shards"]:
+                state["writer"].write(state["shards"].pop(state["next"]).encode('utf-8'))
+                state["next"] += 1
+            if state["next"] == state["total"]:
+                state["writer"].close()
+                del sharded[key]
+                logging.info(f"Merged {state['total']} shards and uploaded markdown file to S3: {get_output_key(key)}")
+                # The shards are converted in parallel, so the extraction time of a sharded file is its elapsed time
+                finish(key, pages=state["pages"], bytes_uploaded=state["writer"].bytes_written,
+                       extraction_seconds=round(time.perf_counter() - state["started"], 3))
+
+        fill_pipeline()
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage, key, shard_index = in_flight.pop(future)
+                if stage == 'shard' and key not in sharded:
+                    # Another shard of this document already failed
+                    continue
+                try:
+                    value = future.result()
+                    if stage == 'download':
+                        pdf_data, active[key] = value
+                        if pdf_data is None:
+                            logging.info(f"Restored markdown from the extraction cache: {key}")
+                            active.pop(key)
+                            results["succeeded"].append(key)
+                            metrics.record_file(key, **file_metrics.pop(key, {}))
+                        else:
+                            logging.info(f"Downloaded PDF: {key}")
+                            start_conversion(key, pdf_data)
+                    elif stage == 'shard':
+                        merge_shard(key, shard_index, value)
+                    else:
+                        logging.info(f"Converted PDF to markdown and uploaded {value['pages']} pages to S3: {value['output_key']}")
+                        finish(key, pages=value['pages'], bytes_uploaded=value['bytes'],
+                               extraction_seconds=round(value['seconds'], 3))
+                except Exception as e:
+                    logging.error(f"Error in {stage} stage for PDF: {key}, {e}")
+                    state = sharded.pop(key, None)
+                    if state is not None:
+                        try:
+                            state["writer"].abort()
+                        except Exception as abort_error:
+                            logging.error(f"Error aborting the upload of {get_output_key(key)}: {abort_error}")
+                    finish(key, f"{stage}: {e}")
+            fill_pipeline()
+
+    cache.log_summary()
+    metrics.finish()
+    logging.info(f"Processing completed: {len(results['succeeded'])} succeeded, {len(results['failed'])} failed.")
+    for key, error in results["failed"].items():
+        logging.error(f"Failed to process {key}: {error}")
+    return results
+
+class InMemoryPdfConverter:
+    """
+    Converts PDFs that are already in memory (e.g. just streamed from Hugging Face to S3) with the open source pipeline,
+    so that the fused download and extract mode does not read them back from S3. Conversions run on a process pool,
+    outputs already in the extraction cache are restored instead, and new outputs are added to the cache. Documents are
+    converted whole, without page sharding. At most `num_workers * 2` PDFs are submitted and not yet converted;
+    `submit` waits for a conversion to finish beyond that, so memory grows with the workers, not the pending files.
+    """
+    def __init__(self, s3_client, metrics=None, num_workers: int = DEFAULT_NUM_WORKERS, externalize_images: bool = False):
+        if num_workers < 1:
+            raise ValueError("num_workers must be a positive integer.")
+        self.s3_client = s3_client
+        self.metrics = metrics
+        self.externalize_images = externalize_images
+        self.bucket_name = config.AWS_S3_BUCKET_NAME
+        self.credentials = (config.AWS_ACCESS_KEY_ID, config.AWS_SECRET_ACCESS_KEY)
+        self.cache = create_extraction_cache(s3_client, self.bucket_name, EXTRACTOR_NAME, EXTRACTOR_VERSION,
+                                             {**MARKDOWN_OPTIONS, "externalize_images": externalize_images})
+        self.pool = ProcessPoolExecutor(max_workers=num_workers, mp_context=multiprocessing.get_context("spawn"))
+        # Bound the number of PDFs held in memory between submission and the end of their conversion
+        self.max_in_flight = num_workers * 2
+        # Maps each conversion future to the (S3 key, SHA-256) of its PDF
+        self.in_flight = {}
+        self.results = {"succeeded": [], "failed": {}}
+
+    def submit(self, key: str, pdf_data: bytes, content_sha256: str) -> None:
+        """
+        Converts a PDF in the background, or restores its output from the extraction cache.
+
+        Args:
+            key (str): The S3 key of the PDF file.
+            pdf_data (bytes): The contents of the PDF file.
+            content_sha256 (str): The SHA-256 of the contents.
+        """
+        if self.cache.restore(content_sha256, get_output_key(key)):
+            logging.info(f"Restored markdown from the extraction cache: {key}")
+            self.results["succeeded"].append(key)
+            return
+        while len(self.in_flight) >= self.max_in_flight:
+            done, _ = wait(self.in_flight, return_when=FIRST_COMPLETED)
+            for conversion in done:
+                self.collect(conversion)
+        conversion = self.pool.submit(convert_pdf_to_s3, pdf_data, self.bucket_name, get_output_key(key),
+                                      *self.credentials, self.externalize_images)
+        self.in_flight[conversion] = (key, content_sha256)
+
+    def collect(self, conversion) -> None:
+        """
+        Records the result of a finished conversion and adds its output to the extraction cache.
+        """
+        key, content_sha256 = self.in_flight.pop(conversion)
+        try:
+            value = conversion.result()
+        except Exception as e:
+            logging.error(f"Error converting in-memory PDF: {key}, {e}")
+            self.results["failed"][key] = f"convert: {e}"
+            return
+        logging.info(f"Converted PDF to markdown and uploaded {value['pages']} pages to S3: {value['output_key']}")
+        self.results["succeeded"].append(key)
+        self.cache.save(content_sha256, value['output_key'])
+        if self.metrics is not None:
+            self.metrics.add(pages=value['pages'], bytes_uploaded=value['bytes'],
+                             extraction_seconds=round(value['seconds'], 3))
+
+    def close(self) -> dict:
+        """
+        Waits for the pending conversions and shuts down the process pool.
+
+        Returns:
+            dict: A dictionary with the keys "succeeded" (list of converted S3 keys) and "failed" (mapping of S3 key
+            to error).
+        """
+        try:
+            for conversion in list(self.in_flight):
+                self.collect(conversion)
+        finally:
+            self.pool.shutdown()
+        self.cache.log_summary()
+        logging.info(f"In-memory conversion completed: {len(self.results['succeeded'])} succeeded, "
+                     f"{len(self.results['failed'])} failed.")
+        return self.results
@@ -1,6 +1,16 @@
 from multiprocessing import set_start_method, Process
 import os
+import sys
+import time
+import uuid
+import shutil
+import tempfile
 import dotenv
+import boto3
+from importlib.metadata import version
+from urllib.parse import urlparse
+from datetime import datetime, timezone
+from botocore.exceptions import ClientError
 from unstructured_ingest.v2.pipeline.pipeline import Pipeline
 from unstructured_ingest.v2.interfaces import ProcessorConfig
 from unstructured_ingest.v2.processes.connectors.fsspec.s3 import (
@@ -11,12 +21,160 @@ from unstructured_ingest.v2.processes.connectors.fsspec.s3 import (
     S3UploaderConfig
 )
 from unstructured_ingest.v2.processes.partitioner import PartitionerConfig
+from data_load.extraction_cache import create_extraction_cache, compute_s3_sha256
+from data_load.s3_listing import iter_s3_objects
+from data_load.sync_manifest import load_manifest
+from data_load.delta_index import load_delta_state, save_delta_state, is_unchanged, record_output, publish_summary
+from data_load.adaptive_concurrency import AIMDLevel, PartitionConcurrencyController
+from data_load.partition_status import STATUS_DIR_VARIABLE, install_status_recorder, drain_statuses
+from data_load.pipeline_metrics import StageMetrics
 import logging
 
 # Set the start method for multiprocessing to avoid the "bootstrap" error
 set_start_method("spawn", force=True)  # "spawn" is safer on most systems
 
-def run_unstructured_pipeline():
+# Record the status of every partition API request for the concurrency controller; this also runs in the spawned
+# worker processes of the pipeline, which import this script
+install_status_recorder()
+
+# Partitioning options sent to the Unstructured API, also used to key the extraction cache
+# (split_pdf_concurrency_level does not change the output and is set by the concurrency controller)
+PARTITION_STRATEGY = "hi_res"
+ADDITIONAL_PARTITION_ARGS = {
+    "split_pdf_page": True,
+    # Failed page requests fail the document, so that throttled pages are retried instead of silently dropped
+    "split_pdf_allow_failed": False,
+    "infer_table_structure": True,
+    "extract_images_in_pdf": True,
+    "extract_image_block_types": ["Image"]
+}
+
+# Name and version of the extractor, used to key the extraction cache
+EXTRACTOR_NAME = "unstructured"
+EXTRACTOR_VERSION = version("unstructured-ingest")
+
+# Prefix under which the PDFs that miss the cache are staged for a pipeline run
+STAGING_PREFIX = 'unstructured_staging/'
+
+# Initial, minimum and maximum number of documents partitioned at the same time (ProcessorConfig num_processes)
+DOCUMENTS_IN_FLIGHT = (2, 1, 8)
+
+# Initial, minimum and maximum number of concurrent page requests per document (split_pdf_concurrency_level)
+SPLIT_CONCURRENCY = (8, 1, 15)
+
+# Documents sent through one pipeline run per document in flight; the concurrency is adjusted between runs
+WAVE_DOCUMENTS_PER_PROCESS = 2
+
+# Unit of the wave latency used when no request was recorded: seconds per MB per document in flight
+WAVE_LATENCY = "MB"
+
+# Number of pipeline runs a document is sent through before it is reported as failed
+MAX_DOCUMENT_ATTEMPTS = 2
+
+def parse_s3_uri(uri: str) -> tuple:
+    """
+    Splits an s3://bucket/prefix/ URI into the bucket name and the prefix.
+    """
+    parsed_uri = urlparse(uri)
+    prefix = parsed_uri.path.lstrip('/')
+    if prefix and not prefix.endswith('/'):
+        prefix += '/'
+    return parsed_uri.netloc, prefix
+
+def get_content_sha256(s3_client, bucket_name: str, obj: dict, manifest: dict) -> str:
+    """
+    Returns the SHA-256 of a source PDF, taken from the sync manifest when it still describes the object in S3 and
+    computed from the object's content otherwise.
+    """
+    entry = manifest.get(obj['Key'].split('/')[-1])
+    if entry and entry.get("s3_key") == obj['Key'] and entry.get("s3_etag") == obj['ETag'] and entry.get("sha256"):
+        return entry["sha256"]
+    return compute_s3_sha256(s3_client, bucket_name, obj['Key'])
+
+def create_concurrency_controller() -> PartitionConcurrencyController:
+    """
+    Creates the controller tuning the documents in flight and the split PDF concurrency level of the partition API.
+    """
+    return PartitionConcurrencyController(
+        documents=AIMDLevel("documents in flight", *DOCUMENTS_IN_FLIGHT),
+        split_concurrency=AIMDLevel("split PDF concurrency", *SPLIT_CONCURRENCY)
+    )
+
+def output_written_since(s3_client, bucket_name: str, key: str, since: datetime) -> bool:
+    """
+    Checks whether an S3 object exists and was written at or after the given time.
+    """
+    try:
+        return s3_client.head_object(Bucket=bucket_name, Key=key)['LastModified'] >= since.replace(microsecond=0)
+    except ClientError:
+        return False
+
+def get_objects(s3_client, bucket_name: str, keys: list) -> list:
+    """
+    Returns listing-style entries ("Key", "ETag", "Size") for the given S3 keys, skipping keys that do not exist.
+    """
+    objects = []
+    for key in keys:
+        try:
+            head = s3_client.head_object(Bucket=bucket_name, Key=key)
+        except ClientError as e:
+            logging.error(f"Skipping {key}, it could not be found: {e}")
+            continue
+        objects.append({'Key': key, 'ETag': head['ETag'], 'Size': head['ContentLength']})
+    return objects
+
+def get_etags(s3_client, bucket_name: str, keys: list) -> dict:
+    """
+    Returns a mapping of S3 key to ETag for the given keys that exist.
+    """
+    return {obj['Key']: obj['ETag'] for obj in get_objects(s3_client, bucket_name, keys)}
+
+def run_pipeline(staging_uri: str, output_uri: str, aws_access_key: str, aws_secret_key: str, unstructured_api_key: str,
+                 unstructured_api_url: str, num_processes: int, split_concurrency: int) -> None:
+    """
+    Runs the Unstructured ingest pipeline over the PDFs under an S3 prefix with the given concurrency settings.
+    """
+    Pipeline.from_configs(
+        context=ProcessorConfig(num_processes=num_processes),
+        indexer_config=S3IndexerConfig(remote_url=staging_uri),
+        downloader_config=S3DownloaderConfig(),
+        source_connection_config=S3ConnectionConfig(
+            access_config=S3AccessConfig(
+                key=aws_access_key,
+                secret=aws_secret_key
+            )
+        ),
+        partitioner_config=PartitionerConfig(
+            partition_by_api=True,
+            api_key=unstructured_api_key,
+            partition_endpoint=unstructured_api_url,
+            strategy=PARTITION_STRATEGY,
+            additional_partition_args={**ADDITIONAL_PARTITION_ARGS, "split_pdf_concurrency_level": split_concurrency}
+        ),
+        destination_connection_config=S3ConnectionConfig(
+            access_config=S3AccessConfig(
+                key=aws_access_key,
+                secret=aws_secret_key
+            )
+        ),
+        uploader_config=S3UploaderConfig(remote_url=output_uri)
+    ).run()
+
+def run_unstructured_pipeline(delta: bool = True, keys: list = None):
+    """
+    Partitions the PDFs under AWS_S3_URL with the Unstructured API and writes the JSON outputs to AWS_S3_OUTPUT_URI.
+
+    Args:
+        delta (bool, optional): Whether PDFs whose source and output are unchanged since the last run are skipped.
+            Defaults to True.
+        keys (list, optional): The S3 keys of the PDFs to process (e.g. the files reported by object-created events).
+            Defaults to every PDF under AWS_S3_URL.
+
+    Returns:
+        dict: The number of PDFs "skipped", "restored", "partitioned", "failed" and "removed", or None if the run
+        itself failed.
+    """
+    metrics = StageMetrics("run_unstructured_pipeline")
     try:
         logging.info("Starting the Unstructured Pipeline")
         print("Starting the Unstructured Pipeline")
@@ -34,47 +192,155 @@ def run_unstructured_pipeline():
             logging.error("One or more environment variables are missing")
             raise ValueError("Required environment variables are missing. Please check your .env file.")
 
-        # Run the pipeline
-        Pipeline.from_configs(
-            context=ProcessorConfig(),
-            indexer_config=S3IndexerConfig(remote_url=aws_s3_url),
-            downloader_config=S3DownloaderConfig(),
-            source_connection_config=S3ConnectionConfig(
-                access_config=S3AccessConfig(
-                    key=aws_access_key,
-                    secret=aws_secret_key
-                )
-            ),
-            partitioner_config=PartitionerConfig(
-                partition_by_api=True,
-                api_key=unstructured_api_key,
-                partition_endpoint=unstructured_api_url,
-                strategy="hi_res",
-                additional_partition_args={
-                    "split_pdf_page": True,
-                    "split_pdf_allow_failed": True,
-                    "split_pdf_concurrency_level": 15,
-                    "infer_table_structure": True,
-                    "extract_images_in_pdf": True,
-                    "extract_image_block_types": ["Image"]
-                }
-            ),
-            destination_connection_config=S3ConnectionConfig(
-                access_config=S3AccessConfig(
-                    key=aws_access_key,
-                    secret=aws_secret_key
-                )
-            ),
-            uploader_config=S3UploaderConfig(remote_url=aws_s3_output_uri)
-        ).run()
-        logging.info("Pipeline executed successfully")
-        print("Pipeline executed successfully")
+        bucket_name, source_prefix = parse_s3_uri(aws_s3_url)
+        output_bucket_name, output_prefix = parse_s3_uri(aws_s3_output_uri)
+        s3_client = boto3.client('s3', aws_access_key_id=aws_access_key, aws_secret_access_key=aws_secret_key)
+        partition_options = {"strategy": PARTITION_STRATEGY, **ADDITIONAL_PARTITION_ARGS}
+        cache = create_extraction_cache(s3_client, output_bucket_name, EXTRACTOR_NAME, EXTRACTOR_VERSION, partition_options)
+        manifest = load_manifest(s3_client, bucket_name)
+
+        # In delta mode, PDFs whose source and output objects are unchanged since the last run are skipped outright
+        delta_state = load_delta_state(s3_client, output_bucket_name) if delta else {}
+        output_etags = {}
+        if delta and keys is None:
+            output_etags = {obj['Key']: obj['ETag'] for obj in iter_s3_objects(s3_client, output_bucket_name, output_prefix)}
+        elif delta:
+            output_etags = get_etags(s3_client, output_bucket_name, [output_prefix + key.split('/')[-1] + '.json' for key in keys])
+        summary = {"skipped": 0, "restored": 0, "partitioned": 0, "failed": 0, "removed": 0}
+
+        # Restore cached outputs and collect the PDFs that still have to be partitioned
+        cache_misses, source_keys = [], set()
+        if keys is None:
+            sources = iter_s3_objects(s3_client, bucket_name, source_prefix)
+        else:
+            sources = get_objects(s3_client, bucket_name, keys)
+        for obj in sources:
+            if not obj['Key'].endswith('.pdf'):
+                continue
+            source_keys.add(obj['Key'])
+            output_key = output_prefix + obj['Key'].split('/')[-1] + '.json'
+            if delta and is_unchanged(delta_state, obj, output_key, output_etags):
+                summary["skipped"] += 1
+                continue
+            content_sha256 = get_content_sha256(s3_client, bucket_name, obj, manifest)
+            if cache.restore(content_sha256, output_key):
+                summary["restored"] += 1
+                record_output(delta_state, s3_client, output_bucket_name, obj, content_sha256, output_key)
+                metrics.record_file(obj['Key'])
+            else:
+                cache_misses.append({"key": obj['Key'], "source": obj, "sha256": content_sha256,
+                                     "output_key": output_key, "size": obj['Size'], "attempts": 0})
+
+        # Partition the cache misses in waves, adjusting the concurrency to the API's latency and errors between waves
+        controller = create_concurrency_controller()
+        status_dir = tempfile.mkdtemp(prefix="partition_status_")
+        os.environ[STATUS_DIR_VARIABLE] = status_dir
+        staging_root = f"{STAGING_PREFIX}{uuid.uuid4().hex}/"
+        remaining, failed, wave_number = cache_misses, [], 0
+        while remaining:
+            num_processes = controller.documents.level
+            split_concurrency = controller.split_concurrency.level
+            wave_size = num_processes * WAVE_DOCUMENTS_PER_PROCESS
+            wave, remaining = remaining[:wave_size], remaining[wave_size:]
+
+            # Stage the wave under a prefix of its own so that the pipeline only indexes those files
+            staging_prefix = f"{staging_root}{wave_number}/"
+            wave_number += 1
+            for document in wave:
+                s3_client.copy_object(Bucket=bucket_name, Key=staging_prefix + document["key"].split('/')[-1],
+                                      CopySource={'Bucket': bucket_name, 'Key': document["key"]})
+
+            started_at = datetime.now(timezone.utc)
+            started = time.perf_counter()
+            try:
+                run_pipeline(f"s3://{bucket_name}/{staging_prefix}", aws_s3_output_uri, aws_access_key, aws_secret_key,
+                             unstructured_api_key, unstructured_api_url, num_processes, split_concurrency)
+            except Exception as e:
+                logging.error(f"Pipeline run failed for wave {wave_number}: {e}")
+            finally:
+                for document in wave:
+                    s3_client.delete_object(Bucket=bucket_name, Key=staging_prefix + document["key"].split('/')[-1])
+            elapsed = time.perf_counter() - started
+
+            # Feed the status and latency of every API request of the wave, page requests included, to the controller
+            request_statuses = drain_statuses(status_dir)
+            for request_latency, status_code in request_statuses:
+                controller.record(request_latency, status_code)
+
+            # Seconds per MB per document in flight, so that waves of different sizes and widths are comparable
+            wave_mb = max(sum(document["size"] for document in wave) / (1024 * 1024), 0.001)
+            latency = elapsed * num_processes / wave_mb
+            for document in wave:
+                document["attempts"] += 1
+                if output_written_since(s3_client, output_bucket_name, document["output_key"], started_at):
+                    if not request_statuses:
+                        # No request was recorded (e.g. the client no longer uses httpx), fall back to the wave latency
+                        controller.record(latency, unit=WAVE_LATENCY)
+                    # Add the new output to the extraction cache and the delta state
+                    cache.save(document["sha256"], document["output_key"])
+                    record_output(delta_state, s3_client, output_bucket_name, document["source"],
+                                  document["sha256"], document["output_key"])
+                    summary["partitioned"] += 1
+                    # The API time of a document is estimated from its share of the wave's megabytes
+                    metrics.record_file(document["key"], bytes_uploaded=document["size"],
+                                        extraction_seconds=round(latency * document["size"] / (1024 * 1024), 3))
+                else:
+                    controller.record(None, None)
+                    if document["attempts"] < MAX_DOCUMENT_ATTEMPTS:
+                        remaining.append(document)
+                    else:
+                        failed.append(document["key"])
+                        metrics.record_file(document["key"], f"no output after {MAX_DOCUMENT_ATTEMPTS} attempts")
+
+            pause = controller.adjust()
+            if pause and remaining:
+                time.sleep(pause)
+
+        shutil.rmtree(status_dir, ignore_errors=True)
+        if cache_misses:
+            controller.log_summary()
+        cache.log_summary()
+        for key in failed:
+            logging.error(f"No output was produced for {key} after {MAX_DOCUMENT_ATTEMPTS} attempts")
+        summary["failed"] = len(failed)
+
+        if delta:
+            # Forget PDFs that were removed from the source prefix (only known after a full listing)
+            removed_keys = set(delta_state) - source_keys if keys is None else set()
+            for key in removed_keys:
+                del delta_state[key]
+                summary["removed"] += 1
+            # Only the entries of the PDFs this run saw are merged into the latest state, so that concurrent runs
+            # (e.g. shards) keep each other's entries
+            try:
+                save_delta_state(s3_client, output_bucket_name, delta_state,
+                                 keys if keys is not None else source_keys | removed_keys)
+            except Exception as e:
+                logging.error(f"Error saving the Unstructured delta state: {e}")
+            publish_summary(s3_client, output_bucket_name, summary)
+
+        if failed:
+            metrics.finish(error=f"{len(failed)} PDF(s) without output")
+            logging.error(f"Pipeline finished with failed PDFs: {summary}")
+            print(f"Pipeline finished with failed PDFs: {summary}")
+        else:
+            metrics.finish()
+            logging.info(f"Pipeline executed successfully: {summary}")
+            print(f"Pipeline executed successfully: {summary}")
+        return summary
     except Exception as e:
+        metrics.finish(error=str(e))
         logging.error(f"Error occurred in unstructured pipeline: {e}")
         print(f"Error occurred in unstructured pipeline: {e}")
         with open("pipeline_error.log", "a") as f:
-            f.write(f"Error: {e}\\n")
+            f.write(f"Error: {e}\n")
+        return None
 
 
 if __name__ == "__main__":
-    run_unstructured_pipeline()
\ No newline at end of file
+    # Comma-separated S3 keys restrict the run to those PDFs, e.g. the files reported by object-created events
+    source_keys = os.getenv("UNSTRUCTURED_SOURCE_KEYS")
+    summary = run_unstructured_pipeline(delta=os.getenv("UNSTRUCTURED_DELTA_MODE", "true").lower() != "false",
+                                        keys=[key for key in source_keys.split(',') if key] if source_keys else None)
+    # A non-zero exit fails the Airflow task, so that the shard is retried and its events are not acknowledged
+    sys.exit(1 if summary is None or summary["failed"] else 0)
@@ -0,0 +1,149 @@
+# This Python script records structured, per-stage and per-file metrics of the PDF pipeline, next to the free-text
+# data storage log. Every stage (a task, or one shard of a mapped task) records its wall time, bytes downloaded and
+# uploaded, database round trips, rows written, pages and extraction seconds (hence seconds per page), files and
+# failures. Records are appended as JSON lines to one metrics file per DAG run, and the stage totals of the run are
+# also exported in the Prometheus text format (e.g. for the node exporter's textfile collector), so that regressions
+# can be followed across runs. The DAG and run are taken from the AIRFLOW_CTX_* variables Airflow sets for each task.
+
+import os
+import re
+import json
+import time
+import threading
+from datetime import datetime, timezone
+import data_load.data_storage_log as logging_module
+
+# Directory holding the metrics files, one JSONL and one Prometheus file per DAG run
+METRICS_DIR = os.getenv("PIPELINE_METRICS_DIR", "/opt/airflow/logs/pipeline_metrics")
+
+# Counters recorded for every stage and file
+COUNTERS = ('bytes_downloaded', 'bytes_uploaded', 'db_round_trips', 'rows_written', 'pages', 'extraction_seconds',
+            'files', 'failures')
+
+# Prefix of the exported Prometheus metric names
+PROMETHEUS_PREFIX = 'pdf_pipeline_stage_'
+
+# Run identifier used outside of Airflow, shared by the stages of one process
+_local_run_id = f"manual_{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S')}"
+
+# Serialises writes to the metrics files from the threads of one process
+_write_lock = threading.Lock()
+
+def get_run_context() -> dict:
+    """
+    Returns the DAG id, run id, task id and try number of the current Airflow task, with local defaults.
+    """
+    return {
+        "dag_id": os.getenv("AIRFLOW_CTX_DAG_ID", "local"),
+        "run_id": os.getenv("AIRFLOW_CTX_DAG_RUN_ID", _local_run_id),
+        "task_id": os.getenv("AIRFLOW_CTX_TASK_ID", "local"),
+        "try_number": os.getenv("AIRFLOW_CTX_TRY_NUMBER")
+    }
+
+def get_metrics_path(context: dict, extension: str) -> str:
+    """
+    Returns the path of the metrics file of a DAG run, e.g. <METRICS_DIR>/<dag_id>/<run_id>.jsonl.
+    """
+    run_id = re.sub(r'[^A-Za-z0-9_.-]', '_', context["run_id"])
+    return os.path.join(METRICS_DIR, context["dag_id"], f"{run_id}.{extension}")
+
+def write_record(context: dict, record: dict) -> None:
+    path = get_metrics_path(context, 'jsonl')
+    line = json.dumps({"timestamp": datetime.now(timezone.utc).isoformat(), **context, **record}, default=str) + "\n"
+    with _write_lock:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Single appends of one line each, so records of concurrent tasks on the same host do not interleave
+        with open(path, 'a') as f:
+            f.write(line)
+
+class StageMetrics:
+    """
+    Metrics of one pipeline stage: counters added with `add` or per file with `record_file`. Safe to use from
+    several threads.
+    """
+    def __init__(self, stage: str):
+        self.stage = stage
+        self.context = get_run_context()
+        self.totals = dict.fromkeys(COUNTERS, 0)
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def add(self, **values) -> None:
+        """
+        Adds to the stage counters, e.g. `add(db_round_trips=1, rows_written=500)`.
+        """
+        with self._lock:
+            for name, value in values.items():
+                self.totals[name] = self.totals.get(name, 0) + (value or 0)
+
+    def record_file(self, file: str, error: str = None, **values) -> None:
+        """
+        Records the metrics of one file and adds them to the stage counters.
+
+        Args:
+            file (str): The file (e.g. S3 key) the metrics belong to.
+            error (str, optional): The error if the file failed.
+            **values: The counters of the file, e.g. bytes_downloaded, bytes_uploaded, pages, extraction_seconds.
+        """
+        self.add(files=1, failures=1 if error else 0, **values)
+        record = {"type": "file", "stage": self.stage, "file": file, "status": "failed" if error else "succeeded", **values}
+        if error:
+            record["error"] = error
+        if values.get("pages") and values.get("extraction_seconds") is not None:
+            record["seconds_per_page"] = round(values["extraction_seconds"] / values["pages"], 4)
+        try:
+            write_record(self.context, record)
+        except OSError as e:
+            logging_module.log_error(f"Error writing file metrics of {file}: {e}")
+
+    def finish(self, error: str = None) -> dict:
+        """
+        Writes the stage record and refreshes the Prometheus export of the run.
+
+        Returns:
+            dict: The stage record.
+        """
+        record = {"type": "stage", "stage": self.stage, "status": "failed" if error else "succeeded",
+                  "wall_seconds": round(time.perf_counter() - self.started, 3), **self.totals}
+        if self.totals["pages"]:
+            record["seconds_per_page"] = round(self.totals["extraction_seconds"] / self.totals["pages"], 4)
+        if error:
+            record["error"] = error
+        try:
+            write_record(self.context, record)
+            export_prometheus(self.context)
+        except OSError as e:
+            logging_module.log_error(f"Error writing stage metrics of {self.stage}: {e}")
+        logging_module.log_success(f"Stage metrics of {self.stage}: {record}")
+        return record
+
+def export_prometheus(context: dict) -> None:
+    """
+    Writes the stage totals of a DAG run, summed per stage and task, in the Prometheus text exposition format.
+    """
+    totals = {}
+    with open(get_metrics_path(context, 'jsonl')) as f:
+        for line in f:
+            record = json.loads(line)
+            if record.get("type") != "stage":
+                continue
+            stage_totals = totals.setdefault((record["stage"], record["task_id"]), {})
+            for name in ('wall_seconds',) + COUNTERS:
+                stage_totals[name] = stage_totals.get(name, 0) + (record.get(name) or 0)
+
+    lines = []
+    for name in ('wall_seconds',) + COUNTERS:
+        metric = PROMETHEUS_PREFIX + name
+        lines.append(f"# HELP {metric} Total {name.replace('_', ' ')} of the pipeline stage in the DAG run.")
+        lines.append(f"# TYPE {metric} gauge")
+        for (stage, task_id), stage_totals in sorted(totals.items()):
+            labels = f'dag_id="{context["dag_id"]}",run_id="{context["run_id"]}",stage="{stage}",task_id="{task_id}"'
+            lines.append(f"{metric}{{{labels}}} {stage_totals[name]}")
+
+    path = get_metrics_path(context, 'prom')
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with _write_lock:
+        with open(temp_path, 'w') as f:
+            f.write("\n".join(lines) + "\n")
+        # Replace the export atomically, so scrapers never read a partial file
+        os.replace(temp_path, path)
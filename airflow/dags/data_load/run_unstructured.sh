@@ -1,19 +1,20 @@
 #!/bin/bash
 
+# Stop at the first failing command, so that a failed pipeline run fails the Airflow task
+set -euo pipefail
+
 # Echo to show the process has started
 echo 'Starting the Bash script and importing variables from Python'
 
+# Make the data_load package importable by the configuration and pipeline scripts
+export PYTHONPATH="/opt/airflow/dags:${PYTHONPATH:-}"
 
-if [ -f /tmp/env_file.sh ]; then
-  source /tmp/env_file.sh  # This file was generated by the Python script
-else
-  echo "Environment file /tmp/env_file.sh not found!"
+# Import variables from Python; the parameters are read from SSM (or its fallbacks) only now
+exports=$(python3 -m data_load.parameter_config_airflow) || {
+  echo "Could not resolve the pipeline configuration!"
   exit 1
-fi
-
-# Import variables from Python using absolute path
-eval $(python3 /opt/airflow/dags/data_load/parameter_config_airflow.py)
-
+}
+eval "$exports"
 
 # Now, run your Python pipeline script
 python /opt/airflow/dags/data_load/pdf_extraction_unstructured.py
@@ -21,10 +22,3 @@ python /opt/airflow/dags/data_load/pdf_extraction_unstructured.py
 # Echo to indicate the process has completed
 echo 'Python script executed successfully'
 
-
-if [ -f /tmp/env_file.sh ]; then
-  rm /tmp/env_file.sh
-  echo "Environment file /tmp/env_file.sh removed."
-else
-  echo "Environment file /tmp/env_file.sh not found for removal."
-fi
\ No newline at end of file
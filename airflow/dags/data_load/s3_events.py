@@ -0,0 +1,223 @@
+# This Python script provides the queue of S3 object-created events behind the event-driven extraction DAG.
+# S3 event notifications for `gaia_files/` are delivered to an SQS queue (S3_EVENT_QUEUE_URL); for local runs and
+# tests, a directory-backed queue (S3_EVENT_QUEUE_DIR) stands in for SQS with the same receive / delete semantics.
+# Received messages stay invisible for a visibility timeout and are only deleted once every downstream task has
+# succeeded, so events of a failed run are delivered again (at-least-once). It also provides the Airflow sensor
+# callable that drains the queue and the task callables that process and acknowledge the received files.
+
+import os
+import json
+import time
+import uuid
+from urllib.parse import unquote_plus, urlparse
+import boto3
+from airflow.exceptions import AirflowException
+from airflow.sensors.base import PokeReturnValue
+from airflow.utils.state import TaskInstanceState
+import data_load.data_storage_log as logging_module
+
+# SQS queue receiving the S3 event notifications, or local directory standing in for it
+EVENT_QUEUE_URL = os.getenv("S3_EVENT_QUEUE_URL")
+EVENT_QUEUE_DIR = os.getenv("S3_EVENT_QUEUE_DIR")
+
+# Prefix and extension of the objects whose creation triggers an extraction
+SOURCE_PREFIX = 'gaia_files/'
+SOURCE_EXTENSION = '.pdf'
+
+# Maximum number of messages taken per poke, long-polling wait and visibility timeout (in seconds)
+MAX_MESSAGES_PER_POKE = 100
+WAIT_TIME_SECONDS = 5
+VISIBILITY_TIMEOUT = 3600
+
+# Tasks that must have succeeded before the events are acknowledged
+EXTRACTION_TASK_IDS = ('extract_new_pdfs_open_source', 'extract_new_pdfs_unstructured')
+
+class SQSEventQueue:
+    """
+    S3 event notifications delivered to an SQS queue.
+    """
+    def __init__(self, queue_url: str, sqs_client=None):
+        self.queue_url = queue_url
+        # The region is part of the queue URL, e.g. https://sqs.us-east-1.amazonaws.com/<account>/<queue>
+        self.sqs_client = sqs_client or boto3.client('sqs', region_name=urlparse(queue_url).netloc.split('.')[1])
+
+    def receive(self, max_messages: int, wait_seconds: int = WAIT_TIME_SECONDS,
+                visibility_timeout: int = VISIBILITY_TIMEOUT) -> list:
+        messages = []
+        while len(messages) < max_messages:
+            response = self.sqs_client.receive_message(
+                QueueUrl=self.queue_url,
+                MaxNumberOfMessages=min(10, max_messages - len(messages)),
+                WaitTimeSeconds=wait_seconds if not messages else 0,
+                VisibilityTimeout=visibility_timeout
+            )
+            batch = response.get('Messages', [])
+            if not batch:
+                break
+            messages.extend((message['ReceiptHandle'], message['Body']) for message in batch)
+        return messages
+
+    def delete(self, receipts: list) -> None:
+        for start in range(0, len(receipts), 10):
+            entries = [{'Id': str(index), 'ReceiptHandle': receipt} for index, receipt in enumerate(receipts[start:start + 10])]
+            self.sqs_client.delete_message_batch(QueueUrl=self.queue_url, Entries=entries)
+
+class LocalEventQueue:
+    """
+    Directory-backed stand-in for the SQS queue: each message is a JSON file, received messages are moved to an
+    `inflight/` subdirectory and return to the queue once their visibility timeout has expired.
+    """
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.inflight = os.path.join(directory, 'inflight')
+        os.makedirs(self.inflight, exist_ok=True)
+
+    def send(self, body: str) -> None:
+        name = f"{time.time_ns()}-{uuid.uuid4().hex}.json"
+        with open(os.path.join(self.directory, name + '.tmp'), 'w') as f:
+            f.write(body)
+        os.replace(os.path.join(self.directory, name + '.tmp'), os.path.join(self.directory, name))
+
+    def receive(self, max_messages: int, wait_seconds: int = WAIT_TIME_SECONDS,
+                visibility_timeout: int = VISIBILITY_TIMEOUT) -> list:
+        deadline = time.monotonic() + wait_seconds
+        while True:
+            # Messages whose visibility timeout expired become visible again
+            for name in os.listdir(self.inflight):
+                path = os.path.join(self.inflight, name)
+                if time.time() - os.path.getmtime(path) > visibility_timeout:
+                    os.replace(path, os.path.join(self.directory, name))
+
+            messages = []
+            for name in sorted(entry for entry in os.listdir(self.directory) if entry.endswith('.json')):
+                if len(messages) >= max_messages:
+                    break
+                try:
+                    os.replace(os.path.join(self.directory, name), os.path.join(self.inflight, name))
+                except FileNotFoundError:
+                    # Received by another consumer
+                    continue
+                # Start the visibility timeout at the time of receipt
+                os.utime(os.path.join(self.inflight, name))
+                with open(os.path.join(self.inflight, name)) as f:
+                    messages.append((name, f.read()))
+            if messages or time.monotonic() >= deadline:
+                return messages
+            time.sleep(0.5)
+
+    def delete(self, receipts: list) -> None:
+        for receipt in receipts:
+            try:
+                os.remove(os.path.join(self.inflight, receipt))
+            except FileNotFoundError:
+                pass
+
+def create_event_queue():
+    """
+    Returns the SQS queue of S3 events, or the local stand-in when S3_EVENT_QUEUE_DIR is set.
+    """
+    if EVENT_QUEUE_DIR:
+        return LocalEventQueue(EVENT_QUEUE_DIR)
+    if EVENT_QUEUE_URL:
+        return SQSEventQueue(EVENT_QUEUE_URL)
+    raise ValueError("S3_EVENT_QUEUE_URL or S3_EVENT_QUEUE_DIR must be set for the event-driven pipeline.")
+
+def build_object_created_event(bucket_name: str, key: str, size: int, etag: str = None) -> str:
+    """
+    Builds the body of an S3 object-created notification, e.g. to feed the local queue in tests.
+    """
+    return json.dumps({"Records": [{
+        "eventSource": "aws:s3",
+        "eventName": "ObjectCreated:Put",
+        "s3": {"bucket": {"name": bucket_name}, "object": {"key": key, "size": size, "eTag": etag}}
+    }]})
+
+def parse_object_created_events(body: str) -> list:
+    """
+    Extracts the created source PDFs from an S3 event notification, delivered directly or through SNS.
+
+    Args:
+        body (str): The message body.
+
+    Returns:
+        list: The created objects under SOURCE_PREFIX, as dictionaries with the keys "Key" and "Size".
+    """
+    message = json.loads(body)
+    if 'Message' in message and 'Records' not in message:
+        message = json.loads(message['Message'])
+
+    objects = []
+    for record in message.get('Records', []):
+        if not record.get('eventName', '').startswith('ObjectCreated'):
+            continue
+        # Keys are URL-encoded in event notifications
+        key = unquote_plus(record['s3']['object']['key'])
+        if key.startswith(SOURCE_PREFIX) and key.endswith(SOURCE_EXTENSION):
+            objects.append({"Key": key, "Size": record['s3']['object'].get('size', 0)})
+    return objects
+
+def poll_object_created_events(max_messages: int = MAX_MESSAGES_PER_POKE) -> PokeReturnValue:
+    """
+    Sensor callable: receives pending S3 events and completes once at least one new source PDF was reported.
+
+    Returns:
+        PokeReturnValue: Done when PDFs were received, with the XCom value {"objects": [...], "receipts": [...]}.
+    """
+    queue = create_event_queue()
+    objects, receipts = {}, []
+    for receipt, body in queue.receive(max_messages):
+        receipts.append(receipt)
+        try:
+            for obj in parse_object_created_events(body):
+                # Several events for the same key only need one extraction
+                objects[obj['Key']] = obj
+        except (ValueError, KeyError) as e:
+            logging_module.log_error(f"Ignoring malformed S3 event message: {e}")
+
+    if not objects:
+        # Test events and events for other prefixes need no processing
+        queue.delete(receipts)
+        return PokeReturnValue(is_done=False)
+
+    logging_module.log_success(f"Received {len(objects)} new PDF(s) from {len(receipts)} S3 event message(s).")
+    return PokeReturnValue(is_done=True, xcom_value={"objects": list(objects.values()), "receipts": receipts})
+
+def extract_new_pdfs_open_source(ti) -> dict:
+    """
+    Converts the PDFs received by the sensor with the open source pipeline; fails if any PDF failed, so that their
+    events are delivered again.
+    """
+    from data_load.extraction_shards import extract_shard_open_source
+    events = ti.xcom_pull(task_ids='wait_for_new_pdfs')
+    return extract_shard_open_source(events["objects"])
+
+def update_new_pdf_urls(ti, prefix: str) -> dict:
+    """
+    Links the outputs of the PDFs received by the sensor in the metadata table.
+    """
+    from data_load.update_url_froms3 import update_metadata_with_s3_urls
+    events = ti.xcom_pull(task_ids='wait_for_new_pdfs')
+    return update_metadata_with_s3_urls(prefix, source_keys=[obj["Key"] for obj in events["objects"]])
+
+def build_new_element_stores(ti) -> dict:
+    """
+    Builds the element stores of the PDFs received by the sensor.
+    """
+    from data_load.element_store import build_element_stores
+    events = ti.xcom_pull(task_ids='wait_for_new_pdfs')
+    return build_element_stores(source_keys=[obj["Key"] for obj in events["objects"]])
+
+def acknowledge_events(ti) -> None:
+    """
+    Deletes the event messages received by the sensor once all their files have been processed; fails without deleting
+    them if any extraction task of the run did not succeed, so that the events are delivered again.
+    """
+    dag_run = ti.get_dagrun()
+    unfinished = [task_id for task_id in EXTRACTION_TASK_IDS
+                  if getattr(dag_run.get_task_instance(task_id), 'state', None) != TaskInstanceState.SUCCESS]
+    if unfinished:
+        raise AirflowException(f"Not acknowledging the S3 events: {', '.join(unfinished)} did not succeed.")
+
+    events = ti.xcom_pull(task_ids='wait_for_new_pdfs')
+    create_event_queue().delete(events["receipts"])
+    logging_module.log_success(f"Acknowledged {len(events['receipts'])} S3 event message(s).")
@@ -0,0 +1,97 @@
+# This Python script provides the shared S3 listing utility used by the extraction and URL update tasks.
+# A single `list_objects_v2` call stops at 1,000 keys, so the listing is built on the boto3 paginator. Pages are
+# yielded as soon as they arrive, and a background thread fetches the following pages ahead of the consumer, so that
+# downstream work (downloads, DB updates) can start on the first page while later pages are still being listed.
+# `list_s3_etags` collects the ETags of a prefix through the same listing, for the incremental S3 sync.
+
+import queue
+import threading
+
+# Marks the end of the listing on the prefetch queue
+_END_OF_LISTING = object()
+
+def iter_s3_pages(s3_client, bucket_name: str, prefix: str, prefetch_pages: int = 2):
+    """
+    Lists the objects under an S3 prefix one page at a time.
+
+    Args:
+        s3_client: A boto3 S3 client.
+        bucket_name (str): The S3 bucket.
+        prefix (str): The S3 prefix to list.
+        prefetch_pages (int, optional): The number of pages fetched ahead of the consumer by a background thread;
+            0 lists synchronously. Defaults to 2.
+
+    Yields:
+        list: The object summaries (dictionaries with "Key", "Size", "ETag", ...) of one page.
+    """
+    paginator = s3_client.get_paginator('list_objects_v2')
+
+    if prefetch_pages < 1:
+        for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix):
+            yield page.get('Contents', [])
+        return
+
+    pages = queue.Queue(maxsize=prefetch_pages)
+    stopped = threading.Event()
+
+    def put(item) -> bool:
+        # Give up once the consumer has stopped, so the thread never blocks on a queue nobody reads
+        while not stopped.is_set():
+            try:
+                pages.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix):
+                if not put(page.get('Contents', [])):
+                    return
+        except Exception as e:
+            put(e)
+            return
+        put(_END_OF_LISTING)
+
+    threading.Thread(target=produce, name=f"s3-listing-{prefix}", daemon=True).start()
+    try:
+        while True:
+            item = pages.get()
+            if item is _END_OF_LISTING:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stopped.set()
+
+def iter_s3_objects(s3_client, bucket_name: str, prefix: str, prefetch_pages: int = 2):
+    """
+    Lists the objects under an S3 prefix, yielding each object as soon as its page arrives.
+
+    Args:
+        s3_client: A boto3 S3 client.
+        bucket_name (str): The S3 bucket.
+        prefix (str): The S3 prefix to list.
+        prefetch_pages (int, optional): The number of pages fetched ahead of the consumer. Defaults to 2.
+
+    Yields:
+        dict: The object summary of each object under the prefix.
+    """
+    for page in iter_s3_pages(s3_client, bucket_name, prefix, prefetch_pages):
+        yield from page
+
+def list_s3_etags(s3_client, bucket_name: str, prefix: str) -> dict:
+    """
+    Lists the objects under an S3 prefix and returns their ETags.
+
+    Args:
+        s3_client: A boto3 S3 client.
+        bucket_name (str): The S3 bucket.
+        prefix (str): The S3 prefix to list.
+
+    Returns:
+        dict: A mapping of S3 key to ETag.
+    """
+    return {obj['Key']: obj['ETag'] for obj in iter_s3_objects(s3_client, bucket_name, prefix)}
@@ -0,0 +1,257 @@
+# This Python script provides a bounded-concurrency transfer engine for copying files from HTTP sources (such as the
+# Hugging Face GAIA dataset) into AWS S3. Each HTTP body is streamed straight into a multipart `upload_fileobj` upload,
+# so the memory used per transfer stays constant regardless of the file size. Transfers run on a thread pool that
+# shares one pooled `requests.Session`, failed transfers are retried with exponential backoff, and a throughput summary
+# is written to the data storage log once all transfers have finished. It also provides `S3MultipartWriter`, which
+# streams generated output (such as extracted markdown) into S3 part by part. Transfers can optionally keep the bytes
+# they streamed, so that a file can be processed in memory right after its upload instead of being read back from S3.
+
+import time
+import hashlib
+import requests
+import urllib3
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from requests.adapters import HTTPAdapter
+from boto3.s3.transfer import TransferConfig
+from botocore.exceptions import BotoCoreError, ClientError
+import data_load.data_storage_log as logging_module
+
+# Default number of files transferred at the same time
+DEFAULT_MAX_WORKERS = 8
+
+# Default number of attempts per file and the base delay (in seconds) between attempts
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_RETRY_BACKOFF = 2
+
+# Number of transfers per worker submitted ahead of the consumer; finished results (and with keep_body their bytes)
+# wait for the consumer within this window, so the memory held does not grow with the number of files
+TRANSFER_WINDOW_PER_WORKER = 2
+
+# HTTP status codes worth retrying; any other non-200 status fails the file immediately
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# Connect and read timeouts (in seconds) for the HTTP download
+HTTP_TIMEOUT = (10, 300)
+
+# Multipart chunk size used for streaming uploads; memory per transfer is bounded by chunk size x concurrency
+MULTIPART_CHUNK_SIZE = 8 * 1024 * 1024
+S3_TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=MULTIPART_CHUNK_SIZE,
+    multipart_chunksize=MULTIPART_CHUNK_SIZE,
+    max_concurrency=2
+)
+
+class CountingStream:
+    """
+    Read-only file-like wrapper around a streamed HTTP body that counts and hashes the bytes handed to the S3 uploader,
+    and optionally keeps them.
+    """
+    def __init__(self, raw, keep: bool = False):
+        self.raw = raw
+        self.bytes_read = 0
+        self.sha256 = hashlib.sha256()
+        self.chunks = [] if keep else None
+
+    def read(self, size: int = -1) -> bytes:
+        chunk = self.raw.read(None if size is None or size < 0 else size)
+        self.bytes_read += len(chunk)
+        self.sha256.update(chunk)
+        if self.chunks is not None:
+            self.chunks.append(chunk)
+        return chunk
+
+def create_http_session(pool_size: int, headers: dict = None) -> requests.Session:
+    """
+    Creates a `requests.Session` whose connection pool is large enough to be shared by all transfer workers.
+
+    Args:
+        pool_size (int): The number of connections kept open per host, normally the number of workers.
+        headers (dict, optional): Headers sent with every request, e.g. the Hugging Face authorization header.
+
+    Returns:
+        requests.Session: The pooled HTTP session.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    if headers:
+        session.headers.update(headers)
+    return session
+
+def stream_url_to_s3(session: requests.Session, s3_client, file_url: str, bucket_name: str, s3_key: str,
+                     max_retries: int = DEFAULT_MAX_RETRIES, retry_backoff: float = DEFAULT_RETRY_BACKOFF,
+                     keep_body: bool = False) -> dict:
+    """
+    Streams a single file from an HTTP URL into S3, retrying transient failures with exponential backoff.
+
+    Args:
+        session (requests.Session): The pooled HTTP session used for the download.
+        s3_client: A boto3 S3 client.
+        file_url (str): The URL of the file to be downloaded.
+        bucket_name (str): The destination S3 bucket.
+        s3_key (str): The destination S3 object key.
+        max_retries (int, optional): The maximum number of attempts. Defaults to DEFAULT_MAX_RETRIES.
+        retry_backoff (float, optional): The base delay in seconds between attempts. Defaults to DEFAULT_RETRY_BACKOFF.
+        keep_body (bool, optional): Whether the uploaded bytes are also returned. Defaults to False.
+
+    Returns:
+        dict: A dictionary with the keys "success" (bool), "bytes" (int), "sha256" (str or None), "attempts" (int)
+        and "error" (str or None), and with keep_body the key "body" (bytes) once the upload succeeded.
+    """
+    error = None
+    for attempt in range(1, max_retries + 1):
+        try:
+            with session.get(file_url, stream=True, timeout=HTTP_TIMEOUT) as response:
+                if response.status_code != 200:
+                    error = f"HTTP {response.status_code}"
+                    if response.status_code not in RETRYABLE_STATUS_CODES:
+                        return {"success": False, "bytes": 0, "sha256": None, "attempts": attempt, "error": error}
+                else:
+                    response.raw.decode_content = True
+                    body = CountingStream(response.raw, keep=keep_body)
+                    s3_client.upload_fileobj(body, bucket_name, s3_key, Config=S3_TRANSFER_CONFIG)
+                    result = {"success": True, "bytes": body.bytes_read, "sha256": body.sha256.hexdigest(),
+                              "attempts": attempt, "error": None}
+                    if keep_body:
+                        result["body"] = b"".join(body.chunks)
+                    return result
+        # The body is read from the raw urllib3 stream, so a connection dropped or timing out mid-body raises a urllib3
+        # error (e.g. ProtocolError, ReadTimeoutError) rather than a requests exception
+        except (requests.exceptions.RequestException, urllib3.exceptions.HTTPError, BotoCoreError, ClientError) as e:
+            error = str(e)
+
+        logging_module.log_error(f"Attempt {attempt}/{max_retries} failed for {s3_key}: {error}")
+        if attempt < max_retries:
+            time.sleep(retry_backoff * 2 ** (attempt - 1))
+
+    return {"success": False, "bytes": 0, "sha256": None, "attempts": max_retries, "error": error}
+
+def transfer_files_to_s3(transfers: list, s3_client, bucket_name: str, headers: dict = None,
+                         max_workers: int = DEFAULT_MAX_WORKERS, max_retries: int = DEFAULT_MAX_RETRIES,
+                         keep_body: bool = False):
+    """
+    Streams a list of files into S3 on a bounded thread pool and yields each result as soon as it completes, so that
+    callers can act on finished files (e.g. update RDS) from their own thread while other transfers are in flight. At
+    most max_workers x TRANSFER_WINDOW_PER_WORKER transfers are submitted and not yet consumed at any time.
+
+    Args:
+        transfers (list): Dictionaries with at least the keys "file_url" and "s3_key"; any other keys are passed through.
+        s3_client: A boto3 S3 client (boto3 clients are safe to share between threads).
+        bucket_name (str): The destination S3 bucket.
+        headers (dict, optional): Headers sent with every download request.
+        max_workers (int, optional): The maximum number of concurrent transfers. Defaults to DEFAULT_MAX_WORKERS.
+        max_retries (int, optional): The maximum number of attempts per file. Defaults to DEFAULT_MAX_RETRIES.
+        keep_body (bool, optional): Whether each successful result carries the uploaded bytes under "body", e.g. to
+            process the file in memory without reading it back from S3. Defaults to False.
+
+    Yields:
+        dict: The transfer dictionary merged with the result of `stream_url_to_s3`.
+    """
+    if max_workers < 1:
+        raise ValueError("max_workers must be a positive integer.")
+
+    succeeded = failed = total_bytes = 0
+    start_time = time.perf_counter()
+
+    with create_http_session(max_workers, headers) as session, ThreadPoolExecutor(max_workers=max_workers) as executor:
+        def submit(transfer: dict) -> None:
+            future = executor.submit(stream_url_to_s3, session, s3_client, transfer["file_url"], bucket_name,
+                                     transfer["s3_key"], max_retries, keep_body=keep_body)
+            futures[future] = transfer
+
+        # Submit a sliding window of transfers instead of all of them, and forget each future once it is consumed
+        pending = iter(transfers)
+        futures = {}
+        for transfer in islice(pending, max_workers * TRANSFER_WINDOW_PER_WORKER):
+            submit(transfer)
+        while futures:
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                outcome = future.result()
+                result = {**futures.pop(future), **outcome}
+                # The body is handed over in the merged result only, so the future no longer references it
+                outcome.pop("body", None)
+                for transfer in islice(pending, 1):
+                    submit(transfer)
+                if result["success"]:
+                    succeeded += 1
+                    total_bytes += result["bytes"]
+                    logging_module.log_success(f"Streamed {result['s3_key']} to S3 ({result['bytes']} bytes, attempt {result['attempts']}).")
+                else:
+                    failed += 1
+                    logging_module.log_error(f"Failed to transfer {result['s3_key']} after {result['attempts']} attempt(s): {result['error']}")
+                yield result
+
+    elapsed = time.perf_counter() - start_time
+    megabytes = total_bytes / (1024 * 1024)
+    logging_module.log_success(
+        f"Transfer summary: {succeeded} succeeded, {failed} failed, {megabytes:.2f} MB in {elapsed:.2f}s "
+        f"({megabytes / elapsed if elapsed > 0 else 0:.2f} MB/s, {succeeded / elapsed if elapsed > 0 else 0:.2f} files/s, "
+        f"{max_workers} workers)."
+    )
+
+class S3MultipartWriter:
+    """
+    Write-only file-like object that streams bytes into an S3 object using a multipart upload, so that large outputs
+    can be uploaded piece by piece without ever being held in memory as a whole. Data is buffered until a part of
+    MULTIPART_CHUNK_SIZE bytes is available; outputs smaller than one part are written with a single `put_object`.
+    Used as a context manager, the upload is completed on a clean exit and aborted if an exception is raised.
+    """
+    def __init__(self, s3_client, bucket_name: str, s3_key: str, part_size: int = MULTIPART_CHUNK_SIZE):
+        self.s3_client = s3_client
+        self.bucket_name = bucket_name
+        self.s3_key = s3_key
+        self.part_size = part_size
+        self.buffer = bytearray()
+        self.parts = []
+        self.upload_id = None
+        self.bytes_written = 0
+
+    def write(self, data: bytes) -> int:
+        self.buffer.extend(data)
+        self.bytes_written += len(data)
+        while len(self.buffer) >= self.part_size:
+            self._upload_part(bytes(self.buffer[:self.part_size]))
+            del self.buffer[:self.part_size]
+        return len(data)
+
+    def _upload_part(self, data: bytes) -> None:
+        if self.upload_id is None:
+            self.upload_id = self.s3_client.create_multipart_upload(Bucket=self.bucket_name, Key=self.s3_key)['UploadId']
+        part_number = len(self.parts) + 1
+        response = self.s3_client.upload_part(Bucket=self.bucket_name, Key=self.s3_key, UploadId=self.upload_id,
+                                              PartNumber=part_number, Body=data)
+        self.parts.append({'PartNumber': part_number, 'ETag': response['ETag']})
+
+    def close(self) -> None:
+        """
+        Uploads any buffered data and completes the upload.
+        """
+        if self.upload_id is None:
+            self.s3_client.put_object(Bucket=self.bucket_name, Key=self.s3_key, Body=bytes(self.buffer))
+        else:
+            if self.buffer:
+                self._upload_part(bytes(self.buffer))
+            self.s3_client.complete_multipart_upload(Bucket=self.bucket_name, Key=self.s3_key, UploadId=self.upload_id,
+                                                     MultipartUpload={'Parts': self.parts})
+        self.buffer = bytearray()
+
+    def abort(self) -> None:
+        """
+        Aborts the multipart upload, if one was started, so that no orphaned parts are left in the bucket.
+        """
+        if self.upload_id is not None:
+            self.s3_client.abort_multipart_upload(Bucket=self.bucket_name, Key=self.s3_key, UploadId=self.upload_id)
+        self.buffer = bytearray()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
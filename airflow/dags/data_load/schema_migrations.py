@@ -0,0 +1,173 @@
+# This Python script manages the schema of gaia_metadata_tbl_pdf with ordered, versioned migrations, replacing the
+# DROP / CREATE that used to run on every metadata load. Applied versions are recorded in a `schema_migrations` table,
+# so each migration runs once per database. The migrations add a primary key on `task_id` (used by the S3 URL batch
+# updates), an index on `file_name` (used by `update_metadata_with_s3_urls`) and a stored SHA-256 hash of `Question`
+# with its own index (used by the API to look up a question without scanning the table); the hash column is invisible,
+# so `SELECT *` keeps returning the original columns. A query-plan check runs EXPLAIN on the hot queries and verifies
+# that they use those indexes. A single-row `gaia_catalogue_version` table lets the API know when its cached question
+# catalogue is stale.
+#
+# Usage: python -m data_load.schema_migrations [--check-plans]
+
+import sys
+import argparse
+import data_load.data_storage_log as logging_module
+
+# Ordered migrations as (version, description, statements); never edit a migration once it has been applied
+MIGRATIONS = [
+    ('0001', 'Create gaia_metadata_tbl_pdf', [
+        """
+        CREATE TABLE IF NOT EXISTS gaia_metadata_tbl_pdf (
+            task_id VARCHAR(255),
+            Question TEXT,
+            Level VARCHAR(3),
+            final_answer VARCHAR(255),
+            file_name VARCHAR(255),
+            file_path VARCHAR(255),
+            Annotator_Metadata TEXT,
+            source VARCHAR(255),
+            s3_url VARCHAR(255),
+            file_extension VARCHAR(255),
+            unstructured_api_url VARCHAR(255),
+            opensource_url VARCHAR(255)
+        )
+        """
+    ]),
+    ('0002', 'Add a primary key on task_id', [
+        "ALTER TABLE gaia_metadata_tbl_pdf MODIFY task_id VARCHAR(255) NOT NULL, ADD PRIMARY KEY (task_id)"
+    ]),
+    ('0003', 'Index file_name', [
+        "CREATE INDEX idx_gaia_metadata_file_name ON gaia_metadata_tbl_pdf (file_name)"
+    ]),
+    ('0004', 'Add an indexed SHA-256 hash of Question', [
+        """
+        ALTER TABLE gaia_metadata_tbl_pdf
+            ADD COLUMN question_hash CHAR(64) CHARACTER SET ascii
+                GENERATED ALWAYS AS (SHA2(Question, 256)) STORED INVISIBLE,
+            ADD INDEX idx_gaia_metadata_question_hash (question_hash)
+        """
+    ]),
+    ('0005', 'Add the question catalogue version row', [
+        """
+        CREATE TABLE IF NOT EXISTS gaia_catalogue_version (
+            id TINYINT PRIMARY KEY,
+            version BIGINT NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+        )
+        """,
+        "INSERT IGNORE INTO gaia_catalogue_version (id, version) VALUES (1, 0)"
+    ])
+]
+
+# Hot queries and the index each must use, as (name, EXPLAIN statement, parameters, table alias, expected key)
+HOT_QUERIES = [
+    ('s3_url_update_by_task_id', """
+        EXPLAIN UPDATE gaia_metadata_tbl_pdf AS t
+        JOIN (SELECT %s AS task_id, %s AS s3_url) AS u ON t.task_id = u.task_id
+        SET t.s3_url = u.s3_url
+     """, ('task', 'url'), 't', 'PRIMARY'),
+    ('url_update_by_file_name', """
+        EXPLAIN UPDATE gaia_metadata_tbl_pdf AS t
+        JOIN (SELECT %s AS file_name, %s AS url) AS s ON t.file_name = s.file_name
+        SET t.opensource_url = s.url
+     """, ('file.pdf', 'url'), 't', 'idx_gaia_metadata_file_name'),
+    ('question_lookup', """
+        EXPLAIN SELECT s3_url, opensource_url, unstructured_api_url
+        FROM gaia_metadata_tbl_pdf AS t
+        WHERE t.question_hash = SHA2(%s, 256) AND t.Question = %s
+     """, ('question', 'question'), 't', 'idx_gaia_metadata_question_hash')
+]
+
+def get_applied_versions(cursor) -> set:
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version VARCHAR(64) PRIMARY KEY,
+        description VARCHAR(255),
+        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+    cursor.execute("SELECT version FROM schema_migrations")
+    return {row[0] for row in cursor.fetchall()}
+
+def apply_migrations(connection, migrations: list = MIGRATIONS) -> list:
+    """
+    Applies the migrations that were not applied to the database yet, in order.
+
+    MySQL commits DDL statements implicitly, so each migration is recorded right after its statements succeeded; a
+    failing migration stops the run and is attempted again next time.
+
+    Args:
+        connection: An open MySQL connection.
+        migrations (list, optional): The migrations as (version, description, statements). Defaults to MIGRATIONS.
+
+    Returns:
+        list: The versions applied by this run.
+    """
+    cursor = connection.cursor()
+    try:
+        applied = get_applied_versions(cursor)
+        newly_applied = []
+        for version, description, statements in migrations:
+            if version in applied:
+                continue
+            for statement in statements:
+                cursor.execute(statement)
+            cursor.execute("INSERT INTO schema_migrations (version, description) VALUES (%s, %s)", (version, description))
+            connection.commit()
+            newly_applied.append(version)
+            logging_module.log_success(f"Applied schema migration {version}: {description}")
+        if not newly_applied:
+            logging_module.log_success("Schema of gaia_metadata_tbl_pdf is up to date.")
+        return newly_applied
+    finally:
+        cursor.close()
+
+def check_query_plans(connection, queries: list = HOT_QUERIES) -> dict:
+    """
+    Runs EXPLAIN on the hot queries and checks that each one reads gaia_metadata_tbl_pdf through its expected index.
+
+    Args:
+        connection: An open MySQL connection.
+        queries (list, optional): The queries as (name, EXPLAIN statement, parameters, table alias, expected key).
+            Defaults to HOT_QUERIES.
+
+    Returns:
+        dict: For each query, a dictionary with the keys "expected_key", "key" (the index used), "access_type" and
+            "uses_index" (bool).
+    """
+    cursor = connection.cursor(dictionary=True)
+    results = {}
+    try:
+        for name, statement, params, table, expected_key in queries:
+            cursor.execute(statement, params)
+            plan = {row['table']: row for row in cursor.fetchall()}
+            row = plan.get(table, {})
+            results[name] = {"expected_key": expected_key, "key": row.get('key'), "access_type": row.get('type'),
+                             "uses_index": row.get('key') == expected_key}
+            if results[name]["uses_index"]:
+                logging_module.log_success(f"Query plan of {name} uses {expected_key} ({row.get('type')} access).")
+            else:
+                logging_module.log_error(f"Query plan of {name} does not use {expected_key}: {row}")
+        return results
+    finally:
+        cursor.close()
+
+if __name__ == "__main__":
+    from data_load.db_connection import get_db_connection
+
+    parser = argparse.ArgumentParser(description="Migrate the schema of gaia_metadata_tbl_pdf.")
+    parser.add_argument("--check-plans", action="store_true", help="Verify that the hot queries use their indexes.")
+    args = parser.parse_args()
+
+    connection = get_db_connection()
+    try:
+        print(f"Applied migrations: {apply_migrations(connection) or 'none'}")
+        if args.check_plans:
+            plans = check_query_plans(connection)
+            for name, result in plans.items():
+                print(f"{name}: key={result['key']} type={result['access_type']} "
+                      f"{'OK' if result['uses_index'] else 'expected ' + result['expected_key']}")
+            if not all(result["uses_index"] for result in plans.values()):
+                sys.exit(1)
+    finally:
+        connection.close()
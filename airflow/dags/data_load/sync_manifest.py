@@ -0,0 +1,146 @@
+# This Python script maintains the sync manifest used to make the Hugging Face -> S3 transfer incremental.
+# The manifest is a JSON object stored in S3 (outside of `gaia_files/`, so the extraction pipelines never index it)
+# that records, for every GAIA file name, the upstream ETag reported by Hugging Face, the content hash and size of the
+# bytes that were uploaded, and the ETag of the resulting S3 object. Before transferring anything the upload task
+# compares the upstream fingerprints (one HEAD request per file) and the current S3 listing against the manifest and
+# only transfers files that are new or changed. Byte-identical files that appear under more than one name or split are
+# grouped by their content fingerprint so that Hugging Face is only downloaded from once per unique content, and the
+# content is stored once: the manifest entries of the other names point at the S3 object of the first name.
+
+import json
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from botocore.exceptions import ClientError
+import data_load.data_storage_log as logging_module
+from data_load.s3_transfer import create_http_session, HTTP_TIMEOUT, DEFAULT_MAX_WORKERS
+
+# S3 key of the sync manifest
+MANIFEST_KEY = 'sync_manifest/gaia_files.json'
+
+def load_manifest(s3_client, bucket_name: str) -> dict:
+    """
+    Loads the sync manifest from S3.
+
+    Args:
+        s3_client: A boto3 S3 client.
+        bucket_name (str): The S3 bucket holding the manifest.
+
+    Returns:
+        dict: A mapping of file name to manifest entry, or an empty dictionary if no manifest exists yet.
+    """
+    try:
+        manifest_obj = s3_client.get_object(Bucket=bucket_name, Key=MANIFEST_KEY)
+        manifest = json.loads(manifest_obj['Body'].read())
+        logging_module.log_success(f"Loaded sync manifest with {len(manifest)} entries.")
+        return manifest
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') in ('NoSuchKey', '404'):
+            logging_module.log_success("No sync manifest found, all files will be transferred.")
+        else:
+            logging_module.log_error(f"Error loading sync manifest, all files will be transferred: {e}")
+        return {}
+
+def save_manifest(s3_client, bucket_name: str, manifest: dict) -> None:
+    """
+    Writes the sync manifest back to S3.
+
+    Args:
+        s3_client: A boto3 S3 client.
+        bucket_name (str): The S3 bucket holding the manifest.
+        manifest (dict): A mapping of file name to manifest entry.
+    """
+    s3_client.put_object(Bucket=bucket_name, Key=MANIFEST_KEY, Body=json.dumps(manifest, indent=2, sort_keys=True),
+                         ContentType='application/json')
+    logging_module.log_success(f"Saved sync manifest with {len(manifest)} entries.")
+
+def fetch_source_fingerprint(session: requests.Session, file_url: str) -> dict:
+    """
+    Fetches the upstream fingerprint of a file with a HEAD request, without downloading its body.
+    Hugging Face reports the SHA-256 of LFS files in `X-Linked-Etag` on the redirect response.
+
+    Args:
+        session (requests.Session): The pooled HTTP session.
+        file_url (str): The URL of the file.
+
+    Returns:
+        dict: A dictionary with the keys "etag" and "size", or None if the fingerprint could not be determined.
+    """
+    try:
+        response = session.head(file_url, allow_redirects=False, timeout=HTTP_TIMEOUT)
+    except requests.exceptions.RequestException as e:
+        logging_module.log_error(f"Error fetching fingerprint for {file_url}: {e}")
+        return None
+
+    etag = response.headers.get('X-Linked-Etag') or response.headers.get('ETag')
+    if response.status_code >= 400 or not etag:
+        return None
+
+    size = response.headers.get('X-Linked-Size') or response.headers.get('Content-Length')
+    return {"etag": etag.removeprefix('W/').strip('"'), "size": int(size) if size else None}
+
+def fetch_source_fingerprints(transfers: list, headers: dict = None, max_workers: int = DEFAULT_MAX_WORKERS) -> dict:
+    """
+    Fetches the upstream fingerprints of a list of transfers concurrently.
+
+    Args:
+        transfers (list): Dictionaries with at least the key "file_url".
+        headers (dict, optional): Headers sent with every request.
+        max_workers (int, optional): The maximum number of concurrent requests. Defaults to DEFAULT_MAX_WORKERS.
+
+    Returns:
+        dict: A mapping of file URL to fingerprint (or None).
+    """
+    file_urls = list({transfer["file_url"] for transfer in transfers})
+    with create_http_session(max_workers, headers) as session, ThreadPoolExecutor(max_workers=max_workers) as executor:
+        fingerprints = executor.map(lambda file_url: fetch_source_fingerprint(session, file_url), file_urls)
+        return dict(zip(file_urls, fingerprints))
+
+def plan_sync(transfers: list, manifest: dict, fingerprints: dict, s3_etags: dict) -> tuple:
+    """
+    Splits the transfers into files that are unchanged and groups of files that need to be synced.
+
+    A file is unchanged when its upstream ETag matches the manifest and the S3 object recorded in the manifest still
+    exists with the same ETag. The S3 key of an unchanged file is set to the recorded object, which is the object of
+    another file for duplicates; such a duplicate only stays unchanged if that other file is unchanged too, since its
+    object is about to be overwritten otherwise. The remaining files are grouped by upstream ETag (or by S3 key if no
+    fingerprint is available); only the first file of each group is downloaded and stored, and the others point at it.
+
+    Args:
+        transfers (list): Dictionaries with the keys "file_name", "file_url" and "s3_key".
+        manifest (dict): The current sync manifest.
+        fingerprints (dict): A mapping of file URL to upstream fingerprint.
+        s3_etags (dict): A mapping of S3 key to the ETag of the object currently stored in the bucket.
+
+    Returns:
+        tuple: A list of unchanged transfers and a list of groups, each group being a list of transfers whose first
+        element is the one to download.
+    """
+    unchanged, changed = [], []
+    for transfer in transfers:
+        fingerprint = fingerprints.get(transfer["file_url"])
+        transfer["source_etag"] = fingerprint["etag"] if fingerprint else None
+        entry = manifest.get(transfer["file_name"])
+
+        if (fingerprint and entry
+                and entry.get("source_etag") == fingerprint["etag"]
+                and s3_etags.get(entry.get("s3_key")) == entry.get("s3_etag")):
+            unchanged.append(transfer)
+        else:
+            changed.append(transfer)
+
+    # Duplicates pointing at the object of a changed file are synced again with their group
+    changed_keys = {transfer["s3_key"] for transfer in changed}
+    for transfer in list(unchanged):
+        stored_key = manifest[transfer["file_name"]]["s3_key"]
+        if stored_key != transfer["s3_key"] and stored_key in changed_keys:
+            unchanged.remove(transfer)
+            changed.append(transfer)
+        else:
+            transfer["s3_key"] = stored_key
+
+    groups = {}
+    for transfer in changed:
+        group_key = transfer["source_etag"] or transfer["s3_key"]
+        groups.setdefault(group_key, []).append(transfer)
+
+    return unchanged, list(groups.values())
@@ -1,9 +1,12 @@
 # This script fetches file URLs from an AWS S3 bucket and updates a metadata table in MySQL RDS.
 
-# It connects to AWS S3 using `boto3` to list objects under a specified prefix (folder path).
+# It connects to AWS S3 using `boto3` to list objects under a specified prefix (folder path) page by page.
 # Extracts file names, removes ".json" extensions, and converts ".txt" extensions to ".pdf" for metadata consistency.
 # Establishes a connection to an AWS RDS MySQL instance using a custom `get_db_connection` function.
 # Updates either the `unstructured_api_url` or `opensource_url` column in the MySQL table based on the file prefix.
+# The file name to URL mapping is loaded into a temporary staging table and applied with a single joined UPDATE,
+# and S3 files or PDF rows that did not match are reported. Byte-identical GAIA files are stored once, so rows whose
+# s3_url points at the PDF of another file name take the extraction URL of that file.
 # Includes exception handling for S3 and MySQL interactions to ensure robust error management and proper logging.
 # Closes the MySQL connection gracefully after updating the metadata, ensuring the database is updated successfully.
 
@@ -13,24 +16,80 @@ import re
 import boto3
 import mysql.connector
 from mysql.connector import Error
+from botocore.exceptions import ClientError
 from dotenv import load_dotenv
 from data_load.db_connection import get_db_connection
-from data_load.parameter_config_airflow import AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY, AWS_S3_BUCKET_NAME
+from data_load.s3_listing import iter_s3_pages
+from data_load.pipeline_metrics import StageMetrics
+import data_load.parameter_config_airflow as config
+
+# Number of staged (file_name, url) pairs inserted per statement
+STAGING_INSERT_BATCH_SIZE = 1000
+
+# Maximum number of unmatched file names listed in the output
+UNMATCHED_REPORT_LIMIT = 50
+
+# Columns of gaia_metadata_tbl_pdf updated for each S3 prefix
+URL_COLUMNS = {'unstructured_extract/': 'unstructured_api_url'}
+DEFAULT_URL_COLUMN = 'opensource_url'
+
+def get_metadata_file_name(file_key: str) -> str:
+    """
+    Maps the S3 key of an extraction output to the file name of its source PDF in the metadata table.
+    """
+    file_name_with_extension = file_key.split('/')[-1]
+    # Replace ".json" with "" and ".txt" with ".pdf"
+    file_name = re.sub(r'\.json$', '', file_name_with_extension)
+    return re.sub(r'\.txt$', '.pdf', file_name)
+
+def get_output_key(prefix: str, source_key: str) -> str:
+    """
+    Maps the S3 key of a source PDF to the key of its extraction output under the given prefix.
+    """
+    file_name = source_key.split('/')[-1]
+    if prefix == 'unstructured_extract/':
+        return prefix + file_name + '.json'
+    return prefix + re.sub(r'\.pdf$', '.txt', file_name)
+
+def iter_output_pages(s3, bucket_name: str, prefix: str, source_keys: list = None):
+    """
+    Yields the extraction outputs under a prefix page by page, or only the outputs of the given source PDFs.
+    """
+    if source_keys is None:
+        yield from iter_s3_pages(s3, bucket_name, prefix)
+        return
+    page = []
+    for source_key in source_keys:
+        output_key = get_output_key(prefix, source_key)
+        try:
+            s3.head_object(Bucket=bucket_name, Key=output_key)
+            page.append({'Key': output_key})
+        except ClientError:
+            print(f"No output found for {source_key} at {output_key}.")
+    yield page
 
 # Function to fetch all file URLs from S3 and update metadata table in MySQL RDS
-def update_metadata_with_s3_urls(prefix):
+def update_metadata_with_s3_urls(prefix, source_keys=None):
     """
     This function retrieves file URLs from an S3 bucket and updates the relevant metadata in an AWS RDS MySQL table.
     It processes files under the specified prefix and updates either the 'unstructured_api_url' or 'opensource_url' column.
+    The file name to URL mapping is loaded into a temporary staging table in batches and applied with a single joined
+    UPDATE, so the metadata table is scanned once instead of once per file. S3 files without a metadata row and PDF
+    rows without an S3 file are reported.
     
     Args:
         prefix (str): The S3 directory (prefix) to search for files.
+        source_keys (list, optional): The S3 keys of the source PDFs whose outputs are linked, e.g. the files reported
+            by object-created events. Defaults to every file under the prefix.
+
+    Returns:
+        dict: A dictionary with the keys "staged", "updated", "unmatched_files" and "rows_without_url", or None on error.
     """
     
     # AWS S3 credentials
-    aws_access_key_id = AWS_ACCESS_KEY_ID
-    aws_secret_access_key = AWS_SECRET_ACCESS_KEY
-    aws_bucket_name = AWS_S3_BUCKET_NAME
+    aws_access_key_id = config.AWS_ACCESS_KEY_ID
+    aws_secret_access_key = config.AWS_SECRET_ACCESS_KEY
+    aws_bucket_name = config.AWS_S3_BUCKET_NAME
 
     # Initialize S3 client
     try:
@@ -40,70 +99,110 @@ def update_metadata_with_s3_urls(prefix):
         print(f"Error initializing S3 client: {e}")
         return
 
-    # Fetch all file URLs from the S3 directory
-    try:
-        response = s3.list_objects_v2(Bucket=aws_bucket_name, Prefix=prefix)
-    except Exception as e:
-        print(f"Error fetching objects from S3: {e}")
-        return
-
-    # If no files are found
-    if 'Contents' not in response:
-        print("No files found in the given S3 directory.")
-        return
-
-    # Extract URLs and clean up file names
-    file_urls = []
-    file_names = []
-    try:
-        for obj in response['Contents']:
-            file_key = obj['Key']
-            file_url = f"https://{aws_bucket_name}.s3.amazonaws.com/{file_key}"
-            file_name_with_extension = file_key.split('/')[-1]
-            # Replace ".json" with "" and ".txt" with ".pdf"
-            file_name = re.sub(r'\.json$', '', file_name_with_extension)
-            file_name = re.sub(r'\.txt$', '.pdf', file_name)
-
-            file_names.append(file_name)
-            file_urls.append(file_url)
-        print("File URLs and names processed successfully.")
-    except Exception as e:
-        print(f"Error processing file URLs and names: {e}")
-        return
+    # Determine which column to update based on the prefix
+    url_column = URL_COLUMNS.get(prefix, DEFAULT_URL_COLUMN)
 
-    # Update MySQL table with URLs
+    metrics = StageMetrics(f"update_{url_column}")
+    error = None
+    conn = None
+    cursor = None
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
-        for url, file_name in zip(file_urls, file_names):
-            print(f"Updating file: {file_name} with URL: {url}")
-        
-            # Determine which column to update based on the prefix
-            if prefix == 'unstructured_extract/':
-                update_query = """
-                UPDATE gaia_metadata_tbl_pdf
-                SET unstructured_api_url = %s
-                WHERE file_name = %s
-                """
-            else:
-                update_query = """
-                UPDATE gaia_metadata_tbl_pdf
-                SET opensource_url = %s
-                WHERE file_name = %s
-                """
-            
-            # Execute the update query
-            cursor.execute(update_query, (url, file_name))
-    
-        # Commit changes to the database
+
+        # Stage the file name to URL mapping as each page of the S3 listing arrives
+        cursor.execute("""
+        CREATE TEMPORARY TABLE s3_url_staging (
+            file_name VARCHAR(255) PRIMARY KEY,
+            url VARCHAR(255)
+        )
+        """)
+        insert_query = """
+        INSERT INTO s3_url_staging (file_name, url) VALUES (%s, %s)
+        ON DUPLICATE KEY UPDATE url = VALUES(url)
+        """
+        files_found = 0
+        pending = []
+        for page in iter_output_pages(s3, aws_bucket_name, prefix, source_keys):
+            for obj in page:
+                file_key = obj['Key']
+                pending.append((get_metadata_file_name(file_key), f"https://{aws_bucket_name}.s3.amazonaws.com/{file_key}"))
+                files_found += 1
+                if len(pending) >= STAGING_INSERT_BATCH_SIZE:
+                    cursor.executemany(insert_query, pending)
+                    metrics.add(db_round_trips=1)
+                    pending = []
+        if pending:
+            cursor.executemany(insert_query, pending)
+            metrics.add(db_round_trips=1)
+        # The CREATE of the staging table
+        metrics.add(db_round_trips=1, files=files_found)
+
+        # If no files are found
+        if files_found == 0:
+            print("No files found in the given S3 directory.")
+            return
+
+        # Apply the whole mapping with one joined UPDATE
+        cursor.execute(f"""
+        UPDATE gaia_metadata_tbl_pdf AS t
+        JOIN s3_url_staging AS s ON t.file_name = s.file_name
+        SET t.{url_column} = s.url
+        """)
+        rows_updated = cursor.rowcount
+        # Duplicates of a staged file share its source object, and so its extraction output
+        cursor.execute(f"""
+        UPDATE gaia_metadata_tbl_pdf AS t
+        JOIN gaia_metadata_tbl_pdf AS p ON t.s3_url = p.s3_url AND t.file_name <> p.file_name
+        JOIN s3_url_staging AS s ON p.file_name = s.file_name
+        SET t.{url_column} = s.url
+        """)
+        rows_updated += cursor.rowcount
         conn.commit()
-        print("Metadata table updated successfully.")
+        metrics.add(db_round_trips=3, rows_written=rows_updated)
+
+        # Report the S3 files without a metadata row, and the PDF rows without an S3 file
+        cursor.execute("""
+        SELECT s.file_name
+        FROM s3_url_staging AS s
+        LEFT JOIN gaia_metadata_tbl_pdf AS t ON t.file_name = s.file_name
+        WHERE t.file_name IS NULL
+        ORDER BY s.file_name
+        """)
+        unmatched_files = [row[0] for row in cursor.fetchall()]
+        metrics.add(db_round_trips=1)
+        rows_without_url = 0
+        if source_keys is None:
+            # Only meaningful after a full listing of the prefix
+            cursor.execute("""
+            SELECT COUNT(*)
+            FROM gaia_metadata_tbl_pdf AS t
+            LEFT JOIN s3_url_staging AS s ON t.file_name = s.file_name
+            WHERE t.file_name LIKE '%.pdf' AND s.file_name IS NULL
+            """)
+            rows_without_url = cursor.fetchone()[0]
+            metrics.add(db_round_trips=1)
+
+        print(f"Metadata table updated successfully: {files_found} files staged, {rows_updated} rows updated in {url_column}.")
+        if unmatched_files:
+            print(f"{len(unmatched_files)} S3 files did not match any metadata row: {unmatched_files[:UNMATCHED_REPORT_LIMIT]}")
+        if rows_without_url:
+            print(f"{rows_without_url} PDF rows have no file under {prefix}.")
+        return {"staged": files_found, "updated": rows_updated, "unmatched_files": unmatched_files,
+                "rows_without_url": rows_without_url}
     except mysql.connector.Error as e:
+        error = str(e)
         print(f"Error updating RDS table: {e}")
+        if conn is not None and conn.is_connected():
+            conn.rollback()
     except Exception as e:
+        error = str(e)
         print(f"Unexpected error: {e}")
     finally:
-        if conn.is_connected():
-            cursor.close()
+        metrics.finish(error=error)
+        if conn is not None and conn.is_connected():
+            if cursor is not None:
+                cursor.close()
+            # Closing the session also drops the temporary staging table
             conn.close()
             print("MySQL connection closed after updating metadata.")
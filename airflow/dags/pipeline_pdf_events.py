@@ -0,0 +1,116 @@
+from airflow import DAG
+from airflow.operators.python import PythonOperator
+from airflow.operators.bash import BashOperator
+from airflow.sensors.python import PythonSensor
+from datetime import datetime, timedelta
+from data_load.s3_events import (
+    poll_object_created_events,
+    extract_new_pdfs_open_source,
+    update_new_pdf_urls,
+    build_new_element_stores,
+    acknowledge_events
+)
+from data_load.catalogue_version import publish_catalogue_version
+
+# Default arguments for the DAG
+default_args = {
+    'owner': 'airflow',
+    'depends_on_past': False,
+    'start_date': datetime(2024, 10, 4),
+    'email_on_failure': False,
+    'email_on_retry': False,
+    'retries': 1,
+    'retry_delay': timedelta(minutes=1)
+}
+
+# Define the DAG; a new run starts as soon as the previous one finishes
+dag = DAG(
+    'trigger_pdf_extract_on_upload',
+    default_args=default_args,
+    description='DAG to extract and link GAIA PDFs as soon as they are uploaded to S3',
+    schedule='@continuous',
+    max_active_runs=1,
+    catchup=False,
+)
+
+# Sensor draining the queue of S3 object-created events for gaia_files/
+wait_for_new_pdfs = PythonSensor(
+    task_id='wait_for_new_pdfs',
+    python_callable=poll_object_created_events,
+    poke_interval=5,
+    timeout=timedelta(hours=1).total_seconds(),
+    soft_fail=True,
+    dag=dag
+)
+
+# Task to process the new PDFs using an open-source tool
+extract_new_pdfs_open_source_task = PythonOperator(
+    task_id='extract_new_pdfs_open_source',
+    python_callable=extract_new_pdfs_open_source,
+    dag=dag
+)
+
+# Task to process the new PDFs using the unstructured bash script
+extract_new_pdfs_unstructured_task = BashOperator(
+    task_id='extract_new_pdfs_unstructured',
+    bash_command='data_load/run_unstructured.sh',
+    env={"UNSTRUCTURED_SOURCE_KEYS": "{{ ti.xcom_pull(task_ids='wait_for_new_pdfs')['objects'] | map(attribute='Key') | join(',') }}"},
+    append_env=True,
+    dag=dag
+)
+
+# Task to convert the Unstructured output of the new PDFs into element stores
+build_new_element_stores_task = PythonOperator(
+    task_id='build_new_element_stores',
+    python_callable=build_new_element_stores,
+    dag=dag
+)
+
+# Tasks to update metadata with the S3 URLs of the new outputs
+update_new_urls_open_source = PythonOperator(
+    task_id='update_new_urls_open_source',
+    python_callable=update_new_pdf_urls,
+    op_kwargs={'prefix': 'open_source_processed/'},
+    dag=dag
+)
+
+update_new_urls_unstructured = PythonOperator(
+    task_id='update_new_urls_unstructured',
+    python_callable=update_new_pdf_urls,
+    op_kwargs={'prefix': 'unstructured_extract/'},
+    dag=dag
+)
+
+# Task to delete the processed event messages, only once both extractions and every other task have succeeded
+acknowledge_events_task = PythonOperator(
+    task_id='acknowledge_events',
+    python_callable=acknowledge_events,
+    trigger_rule='all_success',
+    dag=dag
+)
+
+# Task invalidating the question catalogue cached by the API once the new URLs are written
+publish_question_catalogue = PythonOperator(
+    task_id='publish_question_catalogue',
+    python_callable=publish_catalogue_version,
+    trigger_rule='none_failed_min_one_success',
+    dag=dag
+)
+
+# Define task dependencies
+wait_for_new_pdfs >> extract_new_pdfs_open_source_task >> update_new_urls_open_source
+wait_for_new_pdfs >> extract_new_pdfs_unstructured_task >> build_new_element_stores_task >> update_new_urls_unstructured
+[extract_new_pdfs_open_source_task, extract_new_pdfs_unstructured_task,
+ update_new_urls_open_source, update_new_urls_unstructured] >> acknowledge_events_task
+[update_new_urls_open_source, update_new_urls_unstructured] >> publish_question_catalogue
+
+# DAG Comments:
+# - The DAG is the event-driven counterpart of trigger_pdf_extract_load: S3 object-created notifications for gaia_files/
+#   are sent to an SQS queue (S3_EVENT_QUEUE_URL, or a local directory stand-in set with S3_EVENT_QUEUE_DIR).
+# - The sensor drains the queue every few seconds, and only the PDFs named in the events are extracted, converted and
+#   linked in RDS, without rescanning the bucket or the metadata table.
+# - Events are acknowledged only after all tasks succeed, including the Unstructured extraction, which fails when any
+#   PDF is left without output; the messages of a failed run become visible again after the visibility timeout and
+#   are processed by a later run.
+# - Once the URLs are written, publish_question_catalogue increments the catalogue version, so that the API stops
+#   serving its cached question catalogue.
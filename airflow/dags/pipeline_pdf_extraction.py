@@ -1,11 +1,23 @@
+import os
 from airflow import DAG
 from airflow.operators.python import PythonOperator
 from datetime import datetime, timedelta
 from data_load.data_load import load_gaia_metadata_tbl
 from data_load.data_load import upload_gaia_files_to_s3_and_update_rds 
-from data_load.pdf_extraction_open_source import process_pdf_open_source
 from airflow.operators.bash import BashOperator
 from data_load.update_url_froms3 import update_metadata_with_s3_urls
+from data_load.element_store import build_element_stores
+from data_load.catalogue_version import publish_catalogue_version
+from data_load.extraction_shards import (
+    plan_extraction_shards,
+    extract_shard_open_source,
+    reduce_shard_results,
+    to_unstructured_env,
+    to_source_keys
+)
+
+# Whether the upload stage also converts the PDFs it uploads from memory (fused download and extract mode)
+FUSED_EXTRACTION = os.getenv("PIPELINE_FUSED_EXTRACTION", "false").lower() == "true"
 
 # Default arguments for the DAG
 default_args = {
@@ -39,14 +51,30 @@ load_gaia_metadata_tbl = PythonOperator(
 load_pdf_files_into_s3 = PythonOperator(
     task_id='load_pdf_files_into_s3',
     python_callable=upload_gaia_files_to_s3_and_update_rds,
+    op_kwargs={'fused': FUSED_EXTRACTION},
     dag=dag
 )
 
-# Task to process PDFs using an open-source tool
-process_pdfs_open_source_task = PythonOperator(
-        task_id='process_pdfs_open_source_task',
-        python_callable=process_pdf_open_source,  # Reference the function
-        dag=dag
+# Task to split the PDFs recorded in the sync manifest into shards of similar size
+plan_extraction_shards_task = PythonOperator(
+    task_id='plan_extraction_shards',
+    python_callable=plan_extraction_shards,
+    dag=dag
+)
+
+# Mapped task processing each shard of PDFs using an open-source tool; every shard is retried on its own
+process_pdfs_open_source_task = PythonOperator.partial(
+    task_id='process_pdfs_open_source_task',
+    python_callable=extract_shard_open_source,
+    dag=dag
+).expand(op_kwargs=plan_extraction_shards_task.output)
+
+# Reduce step combining the results of the open source shards
+reduce_open_source_shards = PythonOperator(
+    task_id='reduce_open_source_shards',
+    python_callable=reduce_shard_results,
+    op_kwargs={'task_id': 'process_pdfs_open_source_task'},
+    dag=dag
 )
 
 '''process_pdfs_using_unstructured = PythonOperator(
@@ -55,10 +83,26 @@ process_pdfs_open_source_task = PythonOperator(
         dag=dag
 )'''
 
-# Task to run a bash script for unstructured PDF processing
-process_pdfs_using_unstructured = BashOperator(
+# Mapped task running the bash script for unstructured PDF processing on each shard
+process_pdfs_using_unstructured = BashOperator.partial(
     task_id='run_unstructured_using_bash',
     bash_command='data_load/run_unstructured.sh',  # Path to the bash script
+    append_env=True,
+    dag=dag
+).expand(env=plan_extraction_shards_task.output.map(to_unstructured_env))
+
+# Mapped task converting the Unstructured JSON output of each shard into compact columnar element stores
+build_unstructured_element_store = PythonOperator.partial(
+    task_id='build_unstructured_element_store',
+    python_callable=build_element_stores,
+    dag=dag
+).expand(op_kwargs=plan_extraction_shards_task.output.map(to_source_keys))
+
+# Reduce step combining the results of the unstructured shards
+reduce_unstructured_shards = PythonOperator(
+    task_id='reduce_unstructured_shards',
+    python_callable=reduce_shard_results,
+    op_kwargs={'task_id': 'build_unstructured_element_store'},
     dag=dag
 )
 
@@ -78,19 +122,39 @@ update_s3url_unstructured = PythonOperator(
     dag=dag
 )
 
+# Task invalidating the question catalogue cached by the API; runs even after a failure, since the table may have changed
+publish_question_catalogue = PythonOperator(
+    task_id='publish_question_catalogue',
+    python_callable=publish_catalogue_version,
+    trigger_rule='all_done',
+    dag=dag
+)
+
 # Define task dependencies
-load_gaia_metadata_tbl >> load_pdf_files_into_s3
-load_pdf_files_into_s3 >> process_pdfs_open_source_task >> update_s3url_open_source
-load_pdf_files_into_s3 >> process_pdfs_using_unstructured >> update_s3url_unstructured
+load_gaia_metadata_tbl >> load_pdf_files_into_s3 >> plan_extraction_shards_task
+process_pdfs_open_source_task >> reduce_open_source_shards >> update_s3url_open_source
+process_pdfs_using_unstructured >> build_unstructured_element_store >> reduce_unstructured_shards >> update_s3url_unstructured
+[update_s3url_open_source, update_s3url_unstructured] >> publish_question_catalogue
 
 # Function Comments:
 # load_gaia_metadata_tbl: This function is responsible for loading the GAIA metadata into a target table. It sets up the initial metadata required for downstream PDF processing.
-# upload_gaia_files_to_s3_and_update_rds: This function uploads GAIA PDF files into an S3 bucket and updates the RDS database with the respective metadata.
-# process_pdf_open_source: This function extracts data from GAIA PDFs using open-source tools. It processes the PDFs to retrieve valuable information and store it in a structured format.
+# upload_gaia_files_to_s3_and_update_rds: This function uploads GAIA PDF files into an S3 bucket and updates the RDS database with the respective metadata. In fused mode it also converts each PDF with the open-source tool from memory.
+# plan_extraction_shards: This function splits the PDFs recorded in the sync manifest into shards of similar total size, one per mapped extraction task.
+# extract_shard_open_source: This function extracts data from one shard of GAIA PDFs using open-source tools. It processes the PDFs to retrieve valuable information and store it in a structured format.
+# reduce_shard_results: This function combines the results of all mapped shard tasks once they have finished.
 # update_metadata_with_s3_urls: This function updates the metadata table with URLs pointing to the processed PDF files in S3, enabling easy access to extracted data.
 # run_unstructured_using_bash: This bash script task allows for processing PDFs using an unstructured extraction method, giving flexibility to use custom scripts or tools for more complex use cases.
+# publish_catalogue_version: This function increments the question catalogue version once the run is done, so that the API serves the updated metadata instead of its cached catalogue.
+# build_element_stores: This function converts the Unstructured JSON element lists into Parquet element stores with a per-page index, so that consumers can read only the text or a page range.
 
 # DAG Comments:
 # - The DAG is responsible for processing PDFs from the GAIA dataset.
 # - The workflow consists of loading metadata, uploading files to S3, extracting data using two different methods (open-source and unstructured extraction), and updating metadata with S3 URLs.
-# - Dependencies between tasks are defined to ensure that the operations are performed in the correct sequence.
\ No newline at end of file
+# - Dependencies between tasks are defined to ensure that the operations are performed in the correct sequence.
+# - With PIPELINE_FUSED_EXTRACTION=true, the upload stage converts each PDF from the bytes it just uploaded, and the
+#   open source shards skip those PDFs instead of downloading them from S3 again; the Unstructured pipeline still reads
+#   its input from S3.
+# - The extraction stages fan out with dynamic task mapping over the shards, so they spread across the Airflow workers
+#   and a failing PDF only retries its own shard; the URL updates run once, after the reduce steps.
+# - publish_question_catalogue runs last, even after a failure, and increments the catalogue version read by the API,
+#   which then rebuilds its cached question catalogue.
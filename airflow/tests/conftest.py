@@ -0,0 +1,15 @@
+# Makes the data_load package of the DAGs folder importable from the tests, and writes the pipeline metrics and the
+# data storage log of the tests to temporary directories.
+
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "dags"))
+
+@pytest.fixture(autouse=True)
+def isolated_outputs(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    import data_load.pipeline_metrics as pipeline_metrics
+    monkeypatch.setattr(pipeline_metrics, "METRICS_DIR", str(tmp_path / "metrics"))
+    return tmp_path
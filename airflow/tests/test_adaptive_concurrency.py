@@ -0,0 +1,45 @@
+from data_load.adaptive_concurrency import AIMDLevel, PartitionConcurrencyController
+
+def create_controller() -> PartitionConcurrencyController:
+    return PartitionConcurrencyController(AIMDLevel("documents", 4, 1, 6), AIMDLevel("split", 8, 1, 15),
+                                          backoff=2, max_backoff=5)
+
+def test_healthy_windows_increase_additively_up_to_the_maximum():
+    controller = create_controller()
+
+    for _ in range(3):
+        controller.record(1.0, 200)
+        assert controller.adjust() == 0
+
+    assert controller.documents.level == 6
+    assert controller.split_concurrency.level == 11
+
+def test_congested_windows_decrease_multiplicatively_and_back_off():
+    controller = create_controller()
+
+    pauses = []
+    for _ in range(3):
+        controller.record(1.0, 429)
+        pauses.append(controller.adjust())
+
+    assert controller.documents.history == [4, 2, 1, 1]
+    assert controller.split_concurrency.history == [8, 5, 3, 2]
+    # The pause doubles with each congested window, up to the maximum, and is reset by a healthy window
+    assert pauses == [2, 4, 5]
+    controller.record(1.0, 200)
+    assert controller.adjust() == 0
+    controller.record(None, None)
+    assert controller.adjust() == 2
+
+def test_latency_is_compared_with_the_best_latency_of_its_unit():
+    controller = create_controller()
+    controller.record(0.5, 200)
+    controller.adjust()
+    controller.record(40.0, 200, unit="MB")
+    controller.adjust()
+
+    # A slow wave in seconds per MB is not compared with the seconds per request
+    assert controller.documents.history == [4, 5, 6]
+    controller.record(100.0, 200, unit="MB")
+    assert controller.adjust() == 2
+    assert controller.documents.level == 4
@@ -0,0 +1,184 @@
+import json
+import pytest
+
+pytest.importorskip("boto3")
+pytest.importorskip("mysql.connector")
+pytest.importorskip("datasets")
+pytest.importorskip("pyarrow")
+from botocore.exceptions import ClientError
+
+import data_load.data_load as data_load
+from data_load.sync_manifest import MANIFEST_KEY
+from data_load.s3_listing import list_s3_etags
+
+BUCKET = "test-bucket"
+
+class FakePaginator:
+    def __init__(self, s3_client):
+        self.s3_client = s3_client
+
+    def paginate(self, Bucket, Prefix):
+        keys = sorted(key for bucket, key in self.s3_client.objects if bucket == Bucket and key.startswith(Prefix))
+        # Two objects per page, so the listing spans several pages
+        for start in range(0, len(keys), 2):
+            yield {"Contents": [{"Key": key, "ETag": self.s3_client.etag(key), "Size": 1} for key in keys[start:start + 2]]}
+
+class FakeS3Client:
+    def __init__(self, objects: dict):
+        self.objects = {(BUCKET, key): data for key, data in objects.items()}
+
+    def etag(self, key: str) -> str:
+        return f'"etag-{self.objects[(BUCKET, key)].decode()}"'
+
+    def get_paginator(self, operation):
+        assert operation == 'list_objects_v2'
+        return FakePaginator(self)
+
+    def get_object(self, Bucket, Key):
+        if (Bucket, Key) not in self.objects:
+            raise ClientError({"Error": {"Code": "NoSuchKey", "Message": "Not Found"}}, "GetObject")
+        import io
+        return {"Body": io.BytesIO(self.objects[(Bucket, Key)])}
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self.objects[(Bucket, Key)] = Body.encode() if isinstance(Body, str) else Body
+        return {"ETag": self.etag(Key)}
+
+    def head_object(self, Bucket, Key):
+        return {"ETag": self.etag(Key), "ContentLength": len(self.objects[(Bucket, Key)])}
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+        self.rowcount = 0
+
+    def execute(self, query, params=None):
+        self.connection.queries.append((query, params))
+        self.rowcount = len(params) // 2 if params else 0
+
+    def fetchall(self):
+        return self.connection.records
+
+    def close(self):
+        pass
+
+class FakeConnection:
+    def __init__(self, records: list):
+        self.records = records
+        self.queries = []
+        self.open = True
+
+    def is_connected(self):
+        return self.open
+
+    def cursor(self, dictionary=False):
+        return FakeCursor(self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.open = False
+
+def test_incremental_upload_transfers_only_changed_files(monkeypatch):
+    records = [
+        {"task_id": "t1", "file_name": "a.pdf", "source": "validation"},
+        {"task_id": "t2", "file_name": "b.pdf", "source": "validation"},
+        {"task_id": "t3", "file_name": "c.pdf", "source": "test"}
+    ]
+    s3_client = FakeS3Client({"gaia_files/a.pdf": b"a", "gaia_files/b.pdf": b"b-old", "gaia_files/z.pdf": b"z"})
+    # a.pdf is unchanged upstream and in S3, b.pdf changed upstream, c.pdf is new
+    manifest = {
+        "a.pdf": {"source_etag": "src-a", "s3_key": "gaia_files/a.pdf", "s3_etag": s3_client.etag("gaia_files/a.pdf")},
+        "b.pdf": {"source_etag": "src-b-old", "s3_key": "gaia_files/b.pdf", "s3_etag": s3_client.etag("gaia_files/b.pdf")}
+    }
+    s3_client.put_object(BUCKET, MANIFEST_KEY, json.dumps(manifest))
+    connection = FakeConnection(records)
+    transferred = []
+
+    def fake_transfer_files_to_s3(transfers, s3, bucket_name, *args, **kwargs):
+        for transfer in transfers:
+            transferred.append(transfer["s3_key"])
+            data = transfer["file_name"].encode()
+            s3.put_object(bucket_name, transfer["s3_key"], data)
+            yield {**transfer, "success": True, "bytes": len(data), "sha256": "sha", "attempts": 1, "error": None}
+
+    # Resolve the configuration without SSM
+    monkeypatch.setattr(data_load.config.provider, "get", {
+        "ACCESS_KEY_ID_AWS": "key", "SECRET_ACCESS_KEY_AWS": "secret", "S3_BUCKET_NAME_AWS": BUCKET,
+        "HUGGINGFACE_TOKEN": "token"
+    }.get)
+    monkeypatch.setattr(data_load, "get_db_connection", lambda: connection)
+    monkeypatch.setattr(data_load.boto3, "client", lambda *args, **kwargs: s3_client)
+    monkeypatch.setattr(data_load, "fetch_source_fingerprints", lambda transfers, *args: {
+        transfer["file_url"]: {"etag": f"src-{transfer['file_name'][0]}", "size": 1} for transfer in transfers
+    } | {transfers[1]["file_url"]: {"etag": "src-b-new", "size": 1}})
+    monkeypatch.setattr(data_load, "transfer_files_to_s3", fake_transfer_files_to_s3)
+
+    data_load.upload_gaia_files_to_s3_and_update_rds(incremental=True)
+
+    assert sorted(transferred) == ["gaia_files/b.pdf", "gaia_files/c.pdf"]
+    saved_manifest = json.loads(s3_client.objects[(BUCKET, MANIFEST_KEY)])
+    assert saved_manifest["b.pdf"]["source_etag"] == "src-b-new"
+    assert saved_manifest["c.pdf"]["s3_etag"] == s3_client.etag("gaia_files/c.pdf")
+    # All three records receive their S3 URL, the unchanged one included
+    update_params = [params for query, params in connection.queries if "UPDATE gaia_metadata_tbl_pdf" in query]
+    updated_task_ids = {value for params in update_params for value in params[0::2]}
+    assert updated_task_ids == {"t1", "t2", "t3"}
+
+def test_duplicates_are_stored_once(monkeypatch):
+    records = [
+        {"task_id": "t1", "file_name": "a.pdf", "source": "validation"},
+        {"task_id": "t2", "file_name": "b.pdf", "source": "test"}
+    ]
+    s3_client = FakeS3Client({})
+    connection = FakeConnection(records)
+    transferred = []
+
+    def fake_transfer_files_to_s3(transfers, s3, bucket_name, *args, **kwargs):
+        for transfer in transfers:
+            transferred.append(transfer["s3_key"])
+            s3.put_object(bucket_name, transfer["s3_key"], b"same")
+            yield {**transfer, "success": True, "bytes": 4, "sha256": "sha", "attempts": 1, "error": None}
+
+    monkeypatch.setattr(data_load.config.provider, "get", {
+        "ACCESS_KEY_ID_AWS": "key", "SECRET_ACCESS_KEY_AWS": "secret", "S3_BUCKET_NAME_AWS": BUCKET,
+        "HUGGINGFACE_TOKEN": "token"
+    }.get)
+    monkeypatch.setattr(data_load, "get_db_connection", lambda: connection)
+    monkeypatch.setattr(data_load.boto3, "client", lambda *args, **kwargs: s3_client)
+    monkeypatch.setattr(data_load, "fetch_source_fingerprints", lambda transfers, *args: {
+        transfer["file_url"]: {"etag": "src-same", "size": 4} for transfer in transfers
+    })
+    monkeypatch.setattr(data_load, "transfer_files_to_s3", fake_transfer_files_to_s3)
+
+    data_load.upload_gaia_files_to_s3_and_update_rds(incremental=True)
+
+    assert transferred == ["gaia_files/a.pdf"]
+    assert (BUCKET, "gaia_files/b.pdf") not in s3_client.objects
+    # Both records point at the single stored object
+    update_params = [params for query, params in connection.queries if "UPDATE gaia_metadata_tbl_pdf" in query]
+    urls = {task_id: url for params in update_params for task_id, url in zip(params[0::2], params[1::2])}
+    assert urls == {task_id: f"https://{BUCKET}.s3.amazonaws.com/gaia_files/a.pdf" for task_id in ("t1", "t2")}
+    saved_manifest = json.loads(s3_client.objects[(BUCKET, MANIFEST_KEY)])
+    assert saved_manifest["b.pdf"]["s3_key"] == "gaia_files/a.pdf"
+
+def test_list_s3_etags_reads_every_page():
+    s3_client = FakeS3Client({f"gaia_files/{name}.pdf": name.encode() for name in "abcde"} | {"other/x.pdf": b"x"})
+
+    etags = list_s3_etags(s3_client, BUCKET, "gaia_files/")
+
+    assert etags == {f"gaia_files/{name}.pdf": f'"etag-{name}"' for name in "abcde"}
+
+def test_metadata_load_records_a_missing_snapshot_as_failed(monkeypatch):
+    finished = []
+    monkeypatch.setattr(data_load, "get_db_connection", lambda: FakeConnection([]))
+    monkeypatch.setattr(data_load.gaia_snapshot, "read_state", lambda: {})
+    monkeypatch.setattr(data_load.StageMetrics, "finish", lambda self, error=None: finished.append(error))
+
+    data_load.load_gaia_metadata_tbl(snapshot_only=True)
+
+    assert finished == ["Snapshot only mode requested but no GAIA snapshot is available."]
@@ -0,0 +1,80 @@
+import io
+import json
+import pytest
+
+pytest.importorskip("boto3")
+from botocore.exceptions import ClientError
+
+import data_load.delta_index as delta_index
+from data_load.delta_index import DELTA_STATE_KEY, load_delta_state, save_delta_state
+
+BUCKET = "test-bucket"
+
+class ConditionalS3Client:
+    """
+    Stores one object per key and enforces the If-Match and If-None-Match conditions of put_object. `before_put` runs
+    before each write, e.g. to simulate another writer.
+    """
+    def __init__(self):
+        self.objects = {}
+        self.version = 0
+        self.before_put = None
+
+    def get_object(self, Bucket, Key):
+        if Key not in self.objects:
+            raise ClientError({"Error": {"Code": "NoSuchKey", "Message": "Not Found"}}, "GetObject")
+        body, etag = self.objects[Key]
+        return {"Body": io.BytesIO(body), "ETag": etag}
+
+    def put_object(self, Bucket, Key, Body, IfMatch=None, IfNoneMatch=None, **kwargs):
+        if self.before_put is not None:
+            before_put, self.before_put = self.before_put, None
+            before_put()
+        current = self.objects.get(Key)
+        if (IfMatch is not None and (current is None or current[1] != IfMatch)) or (IfNoneMatch == '*' and current):
+            raise ClientError({"Error": {"Code": "PreconditionFailed", "Message": "At least one precondition failed"}},
+                              "PutObject")
+        self.version += 1
+        self.objects[Key] = (Body.encode() if isinstance(Body, str) else Body, f'"v{self.version}"')
+        return {"ETag": self.objects[Key][1]}
+
+def entry(name: str) -> dict:
+    return {"source_etag": f'"{name}"', "sha256": name, "output_key": f"unstructured_extract/{name}.json",
+            "output_etag": f'"out-{name}"'}
+
+def test_concurrent_shards_keep_each_others_entries(monkeypatch):
+    monkeypatch.setattr(delta_index.time, "sleep", lambda seconds: None)
+    s3_client = ConditionalS3Client()
+    save_delta_state(s3_client, BUCKET, {"gaia_files/old.pdf": entry("old")}, ["gaia_files/old.pdf"])
+
+    # Both shards loaded the state before either saved; shard b saves while shard a is writing
+    shard_a = load_delta_state(s3_client, BUCKET) | {"gaia_files/a.pdf": entry("a")}
+    shard_b = load_delta_state(s3_client, BUCKET) | {"gaia_files/b.pdf": entry("b")}
+    s3_client.before_put = lambda: save_delta_state(s3_client, BUCKET, shard_b, ["gaia_files/b.pdf"])
+    save_delta_state(s3_client, BUCKET, shard_a, ["gaia_files/a.pdf"])
+
+    state = json.loads(s3_client.objects[DELTA_STATE_KEY][0])
+    assert sorted(state) == ["gaia_files/a.pdf", "gaia_files/b.pdf", "gaia_files/old.pdf"]
+
+def test_keys_missing_from_the_run_state_are_removed():
+    s3_client = ConditionalS3Client()
+    save_delta_state(s3_client, BUCKET, {"gaia_files/a.pdf": entry("a"), "gaia_files/b.pdf": entry("b")},
+                     ["gaia_files/a.pdf", "gaia_files/b.pdf"])
+
+    state = save_delta_state(s3_client, BUCKET, {}, ["gaia_files/b.pdf"])
+
+    assert sorted(state) == ["gaia_files/a.pdf"]
+
+def test_save_gives_up_after_repeated_conflicts(monkeypatch):
+    monkeypatch.setattr(delta_index.time, "sleep", lambda seconds: None)
+    s3_client = ConditionalS3Client()
+    save_delta_state(s3_client, BUCKET, {}, [])
+    original_put = s3_client.put_object
+
+    def conflicting_put(**kwargs):
+        original_put(Bucket=BUCKET, Key=DELTA_STATE_KEY, Body="{}")
+        return original_put(**kwargs)
+
+    monkeypatch.setattr(s3_client, "put_object", conflicting_put)
+    with pytest.raises(RuntimeError):
+        save_delta_state(s3_client, BUCKET, {"gaia_files/a.pdf": entry("a")}, ["gaia_files/a.pdf"])
@@ -0,0 +1,39 @@
+import pytest
+
+httpx = pytest.importorskip("httpx")
+
+from data_load.partition_status import STATUS_DIR_VARIABLE, install_status_recorder, drain_statuses
+
+def answer(request):
+    if request.url.path == "/throttled":
+        return httpx.Response(429)
+    if request.url.path == "/timeout":
+        raise httpx.ReadTimeout("timed out", request=request)
+    return httpx.Response(200, json=[])
+
+def test_partition_requests_are_recorded_with_their_status(tmp_path, monkeypatch):
+    monkeypatch.setenv(STATUS_DIR_VARIABLE, str(tmp_path))
+    monkeypatch.setenv("UNSTRUCTURED_API_URL", "https://partition.test/general/v0/general")
+    install_status_recorder()
+
+    with httpx.Client(transport=httpx.MockTransport(answer)) as client:
+        client.post("https://partition.test/general/v0/general")
+        client.post("https://partition.test/throttled")
+        with pytest.raises(httpx.ReadTimeout):
+            client.post("https://partition.test/timeout")
+        # Requests to other hosts are not partition requests
+        client.get("https://other.test/")
+
+    statuses = [status for _, status in drain_statuses(str(tmp_path))]
+    assert statuses == [200, 429, None]
+    assert drain_statuses(str(tmp_path)) == []
+
+def test_nothing_is_recorded_without_a_status_directory(tmp_path, monkeypatch):
+    monkeypatch.delenv(STATUS_DIR_VARIABLE, raising=False)
+    monkeypatch.setenv("UNSTRUCTURED_API_URL", "https://partition.test/")
+    install_status_recorder()
+
+    with httpx.Client(transport=httpx.MockTransport(answer)) as client:
+        client.post("https://partition.test/")
+
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,106 @@
+import time
+import pytest
+
+pytest.importorskip("boto3")
+pytest.importorskip("requests")
+urllib3 = pytest.importorskip("urllib3")
+
+import data_load.s3_transfer as s3_transfer
+
+class TruncatedBody:
+    """
+    Raw HTTP body whose connection drops after the first chunk.
+    """
+    decode_content = False
+
+    def __init__(self, first_chunk: bytes):
+        self.first_chunk = first_chunk
+
+    def read(self, size=None):
+        if self.first_chunk:
+            chunk, self.first_chunk = self.first_chunk, b''
+            return chunk
+        raise urllib3.exceptions.ProtocolError("Connection broken: IncompleteRead(4 bytes read, 6 more expected)")
+
+class FakeBody:
+    decode_content = False
+
+    def __init__(self, data: bytes):
+        self.data = data
+
+    def read(self, size=None):
+        chunk, self.data = (self.data, b'') if size is None else (self.data[:size], self.data[size:])
+        return chunk
+
+class FakeResponse:
+    def __init__(self, body: bytes, truncated: bool):
+        self.status_code = 200
+        self.raw = TruncatedBody(body[:4]) if truncated else FakeBody(body)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+class FakeSession:
+    def __init__(self, bodies: dict, truncated: set):
+        self.bodies = bodies
+        self.truncated = truncated
+
+    def get(self, url, **kwargs):
+        return FakeResponse(self.bodies[url], url in self.truncated)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+class FakeS3Client:
+    def __init__(self):
+        self.objects = {}
+
+    def upload_fileobj(self, fileobj, bucket, key, Config=None):
+        data = b''
+        while chunk := fileobj.read(1024):
+            data += chunk
+        self.objects[key] = data
+
+def test_truncated_body_fails_only_its_file(monkeypatch):
+    session = FakeSession({"https://hf.test/a.pdf": b"0123456789", "https://hf.test/b.pdf": b"complete"},
+                          truncated={"https://hf.test/a.pdf"})
+    monkeypatch.setattr(s3_transfer, "create_http_session", lambda pool_size, headers=None: session)
+    monkeypatch.setattr(s3_transfer.time, "sleep", lambda seconds: None)
+    s3_client = FakeS3Client()
+
+    results = {result["s3_key"]: result for result in s3_transfer.transfer_files_to_s3(
+        [{"file_url": "https://hf.test/a.pdf", "s3_key": "gaia_files/a.pdf"},
+         {"file_url": "https://hf.test/b.pdf", "s3_key": "gaia_files/b.pdf"}], s3_client, "bucket", max_retries=2)}
+
+    assert not results["gaia_files/a.pdf"]["success"]
+    assert results["gaia_files/a.pdf"]["attempts"] == 2
+    assert "IncompleteRead" in results["gaia_files/a.pdf"]["error"]
+    assert results["gaia_files/b.pdf"]["success"]
+    assert s3_client.objects == {"gaia_files/b.pdf": b"complete"}
+
+def test_transfers_are_submitted_in_a_bounded_window(monkeypatch):
+    started = []
+
+    def fake_stream_url_to_s3(session, s3_client, file_url, bucket_name, s3_key, max_retries, keep_body=False):
+        started.append(s3_key)
+        return {"success": True, "bytes": 1, "sha256": "sha", "attempts": 1, "error": None, "body": b"x"}
+
+    monkeypatch.setattr(s3_transfer, "create_http_session", lambda pool_size, headers=None: FakeSession({}, set()))
+    monkeypatch.setattr(s3_transfer, "stream_url_to_s3", fake_stream_url_to_s3)
+    transfers = [{"file_url": f"https://hf.test/{i}.pdf", "s3_key": f"gaia_files/{i}.pdf"} for i in range(50)]
+
+    results = s3_transfer.transfer_files_to_s3(transfers, FakeS3Client(), "bucket", max_workers=2, keep_body=True)
+    first = next(results)
+    # Give the workers time to run everything they were handed while the consumer holds the first result
+    time.sleep(0.2)
+
+    assert len(started) <= 2 * s3_transfer.TRANSFER_WINDOW_PER_WORKER + 1
+    assert first["body"] == b"x"
+    assert len([first, *results]) == 50
+    assert len(started) == 50
@@ -0,0 +1,44 @@
+import pytest
+
+pytest.importorskip("boto3")
+pytest.importorskip("requests")
+
+from data_load.sync_manifest import plan_sync
+
+def make_transfer(file_name: str) -> dict:
+    return {"task_id": file_name[0], "file_name": file_name, "file_url": f"https://hf.test/{file_name}",
+            "s3_key": f"gaia_files/{file_name}"}
+
+def test_duplicates_are_grouped_behind_one_download():
+    transfers = [make_transfer("a.pdf"), make_transfer("b.pdf"), make_transfer("c.pdf")]
+    fingerprints = {"https://hf.test/a.pdf": {"etag": "same"}, "https://hf.test/b.pdf": {"etag": "same"},
+                    "https://hf.test/c.pdf": {"etag": "other"}}
+
+    unchanged, groups = plan_sync(transfers, {}, fingerprints, {})
+
+    assert unchanged == []
+    assert [[transfer["file_name"] for transfer in group] for group in groups] == [["a.pdf", "b.pdf"], ["c.pdf"]]
+
+def test_unchanged_duplicate_points_at_the_stored_object():
+    transfers = [make_transfer("a.pdf"), make_transfer("b.pdf")]
+    fingerprints = {"https://hf.test/a.pdf": {"etag": "same"}, "https://hf.test/b.pdf": {"etag": "same"}}
+    # b.pdf was stored once, as the object of a.pdf
+    manifest = {name: {"source_etag": "same", "s3_key": "gaia_files/a.pdf", "s3_etag": '"s3-a"'}
+                for name in ("a.pdf", "b.pdf")}
+
+    unchanged, groups = plan_sync(transfers, manifest, fingerprints, {"gaia_files/a.pdf": '"s3-a"'})
+
+    assert groups == []
+    assert [transfer["s3_key"] for transfer in unchanged] == ["gaia_files/a.pdf", "gaia_files/a.pdf"]
+
+def test_duplicate_of_a_changed_file_is_synced_again():
+    transfers = [make_transfer("a.pdf"), make_transfer("b.pdf")]
+    # a.pdf changed upstream, so its object is about to be overwritten while b.pdf still has the old content
+    fingerprints = {"https://hf.test/a.pdf": {"etag": "new"}, "https://hf.test/b.pdf": {"etag": "same"}}
+    manifest = {name: {"source_etag": "same", "s3_key": "gaia_files/a.pdf", "s3_etag": '"s3-a"'}
+                for name in ("a.pdf", "b.pdf")}
+
+    unchanged, groups = plan_sync(transfers, manifest, fingerprints, {"gaia_files/a.pdf": '"s3-a"'})
+
+    assert unchanged == []
+    assert [[transfer["s3_key"] for transfer in group] for group in groups] == [["gaia_files/a.pdf"], ["gaia_files/b.pdf"]]
@@ -1,6 +1,6 @@
 import streamlit as st
 import requests
-from parameter_config import FAST_API_DEV_URL
+import parameter_config
 
 # Function for the login page
 def login():
@@ -28,7 +28,7 @@ def login():
             }
 
             # Send a POST request to the FastAPI login endpoint
-            response = requests.post(f"{FAST_API_DEV_URL}/auth/login/", json=payload)
+            response = requests.post(f"{parameter_config.FAST_API_DEV_URL}/auth/login/", json=payload)
 
             if response.status_code == 200:
                 data = response.json()
@@ -0,0 +1,152 @@
+# This Python script benchmarks the concurrent request throughput of the FastAPI user lookup, the query behind every
+# authenticated request, before and after the move to the async database layer:
+#   - blocking: a sync `def` route opening a mysql.connector connection per request, as the routes did before, so that
+#     every request holds a worker thread of the FastAPI thread pool while MySQL answers;
+#   - async: an `async def` route awaiting `fetch_user_from_db` on the aiomysql pool.
+# Each request can run a `SELECT SLEEP(...)` first to simulate a slow query. While the lookups run, a probe calls a
+# route without database access every 50 ms, to measure how much slow queries delay unrelated requests. The apps are
+# driven in-process through httpx's ASGI transport against the database configured in the parameter store, and the
+# script reports requests/sec, p50/p95 lookup latency and the p95 probe latency of each variant.
+#
+# Usage: python benchmarks/benchmark_api_concurrency.py <username> [--requests 400] [--concurrency 100] [--slow-query 0.05]
+# Requires httpx, which is not part of the service requirements.
+
+import os
+import sys
+import math
+import time
+import asyncio
+import argparse
+import httpx
+from fastapi import FastAPI
+
+# Make the fast_api package and parameter_config importable
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fast_api.config.db_connection import get_db_connection, close_my_sql_connection
+from fast_api.config.async_db_connection import async_db_connection, close_async_db_pool, DB_POOL_SIZE
+from fast_api.models.user_models import fetch_user_from_db
+
+# Seconds between two probe requests
+PROBE_INTERVAL = 0.05
+
+def percentile(values: list, fraction: float) -> float:
+    """
+    Returns the nearest-rank percentile of a list of values, or None for an empty list.
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[max(0, math.ceil(fraction * len(ordered)) - 1)], 3)
+
+def fetch_user_blocking(username: str, slow_query: float) -> list:
+    """
+    Looks up a user with blocking calls on a connection of its own, as `fetch_user_from_db` did before.
+    """
+    mydb = mydata = None
+    try:
+        mydb = get_db_connection()
+        mydata = mydb.cursor()
+        if slow_query:
+            mydata.execute("SELECT SLEEP(%s)", (slow_query,))
+            mydata.fetchall()
+        mydata.execute("SELECT first_name, username, hashed_password FROM users_tbl WHERE username = %s", (username,))
+        return mydata.fetchall()
+    finally:
+        close_my_sql_connection(mydb, mydata)
+
+def create_blocking_app(slow_query: float) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/user/{username}")
+    def get_user(username: str):
+        return {"found": bool(fetch_user_blocking(username, slow_query))}
+
+    @app.get("/probe")
+    def probe():
+        return {}
+
+    return app
+
+def create_async_app(slow_query: float) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/user/{username}")
+    async def get_user(username: str):
+        if slow_query:
+            async with async_db_connection() as connection:
+                async with connection.cursor() as cursor:
+                    await cursor.execute("SELECT SLEEP(%s)", (slow_query,))
+                    await cursor.fetchall()
+        return {"found": await fetch_user_from_db(username) is not None}
+
+    @app.get("/probe")
+    async def probe():
+        return {}
+
+    return app
+
+async def run_variant(app: FastAPI, username: str, requests: int, concurrency: int) -> dict:
+    """
+    Sends the lookups with at most `concurrency` in flight while probing, and returns the throughput and latencies.
+    """
+    latencies, probe_latencies, failures = [], [], 0
+    semaphore = asyncio.Semaphore(concurrency)
+    done = asyncio.Event()
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://benchmark",
+                                 timeout=None) as client:
+        async def lookup():
+            nonlocal failures
+            async with semaphore:
+                started = time.perf_counter()
+                response = await client.get(f"/user/{username}")
+                latencies.append(time.perf_counter() - started)
+                failures += response.status_code != 200
+
+        async def probe():
+            while not done.is_set():
+                started = time.perf_counter()
+                await client.get("/probe")
+                probe_latencies.append(time.perf_counter() - started)
+                await asyncio.sleep(PROBE_INTERVAL)
+
+        # Warm up the pool before measuring
+        await client.get(f"/user/{username}")
+        probe_task = asyncio.create_task(probe())
+        started = time.perf_counter()
+        await asyncio.gather(*(lookup() for _ in range(requests)))
+        elapsed = time.perf_counter() - started
+        done.set()
+        await probe_task
+
+    return {
+        "requests_per_sec": round(requests / elapsed, 1),
+        "latency_p50_sec": percentile(latencies, 0.50),
+        "latency_p95_sec": percentile(latencies, 0.95),
+        "probe_p95_sec": percentile(probe_latencies, 0.95),
+        "failures": failures
+    }
+
+async def main():
+    parser = argparse.ArgumentParser(description="Compare blocking and async database routes under concurrent load.")
+    parser.add_argument("username", help="A user present in users_tbl")
+    parser.add_argument("--requests", type=int, default=400, help="Number of lookups per variant")
+    parser.add_argument("--concurrency", type=int, default=100, help="Lookups in flight at the same time")
+    parser.add_argument("--slow-query", type=float, default=0.05, help="Seconds of SELECT SLEEP before each lookup")
+    args = parser.parse_args()
+
+    print(f"{args.requests} lookups, {args.concurrency} concurrent, {args.slow_query}s slow query, "
+          f"pool size {DB_POOL_SIZE}")
+    variants = {"blocking": create_blocking_app(args.slow_query), "async": create_async_app(args.slow_query)}
+    try:
+        for name, app in variants.items():
+            result = await run_variant(app, args.username, args.requests, args.concurrency)
+            print(f"{name}: {result['requests_per_sec']} req/s, p50 {result['latency_p50_sec']}s, "
+                  f"p95 {result['latency_p95_sec']}s, probe p95 {result['probe_p95_sec']}s, "
+                  f"{result['failures']} failure(s)")
+    finally:
+        await close_async_db_pool()
+
+if __name__ == "__main__":
+    asyncio.run(main())
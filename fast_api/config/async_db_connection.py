@@ -0,0 +1,129 @@
+# This Python script manages the asynchronous connections of the FastAPI service to the AWS RDS MySQL database.
+# Connections come from an aiomysql pool bound to the event loop of the service, so that route handlers await their
+# queries instead of holding a worker thread while MySQL answers. The pool is created on first use, sized from the
+# environment (DB_POOL_SIZE), recycles connections older than DB_POOL_RECYCLE_SECONDS and is closed when FastAPI shuts
+# down. `async_db_connection()` checks a connection out for the duration of an `async with` block, failing after
+# DB_POOL_TIMEOUT seconds, and pings connections idle for longer than DB_POOL_VALIDATE_AFTER_SECONDS on checkout, so
+# that connections dropped by an RDS failover or by the server's wait_timeout are reopened before the request uses
+# them. `get_async_pool_stats()` reports the checkout wait times and occupancy.
+
+import os
+import time
+import asyncio
+from contextlib import asynccontextmanager
+import aiomysql
+from project_logging import logging_module
+import parameter_config
+
+# Maximum number of open connections, and seconds a request waits for one before failing
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+
+# Connections older than this are closed and replaced
+DB_POOL_RECYCLE_SECONDS = int(os.getenv("DB_POOL_RECYCLE_SECONDS", "3600"))
+
+# Connections idle for longer than this are pinged, and reconnected if needed, on checkout
+DB_POOL_VALIDATE_AFTER_SECONDS = int(os.getenv("DB_POOL_VALIDATE_AFTER_SECONDS", "30"))
+
+# Connections opened when the pool is created
+DB_POOL_MIN_SIZE = 1
+
+class AsyncPoolTimeout(Exception):
+    """
+    Raised when no database connection becomes available within the pool timeout.
+    """
+
+def get_connection_settings() -> dict:
+    # Resolving the parameters may call SSM, so this runs in a worker thread
+    return {
+        "host": parameter_config.RDS_HOST_AWS,
+        "user": parameter_config.RDS_USERNAME_AWS,
+        "password": parameter_config.RDS_PASSWORD_AWS,
+        "port": int(parameter_config.RDS_DB_PORT_AWS),
+        "db": parameter_config.RDS_DATABASE_AWS
+    }
+
+# The application-wide pool, created on first use in the event loop of the service
+_pool = None
+_pool_lock = asyncio.Lock()
+_stats = {"checkouts": 0, "timeouts": 0, "validated": 0, "invalid": 0, "total_wait_seconds": 0.0, "max_wait_seconds": 0.0}
+
+async def get_async_pool() -> aiomysql.Pool:
+    global _pool
+    async with _pool_lock:
+        if _pool is None or _pool.closed:
+            settings = await asyncio.to_thread(get_connection_settings)
+            _pool = await aiomysql.create_pool(minsize=DB_POOL_MIN_SIZE, maxsize=DB_POOL_SIZE,
+                                               pool_recycle=DB_POOL_RECYCLE_SECONDS, connect_timeout=DB_POOL_TIMEOUT,
+                                               autocommit=False, **settings)
+            logging_module.log_success(f"Created the async MySQL connection pool (size {DB_POOL_SIZE}).")
+        return _pool
+
+@asynccontextmanager
+async def async_db_connection():
+    """
+    Checks a connection out of the application-wide async pool for the duration of an `async with` block.
+
+    Yields:
+        aiomysql.Connection: An open MySQL connection. Uncommitted changes are rolled back when it is returned.
+
+    Raises:
+        AsyncPoolTimeout: If no connection becomes available within DB_POOL_TIMEOUT seconds.
+        aiomysql.Error: If an idle connection cannot be reopened.
+    """
+    pool = await get_async_pool()
+    started = time.monotonic()
+    try:
+        connection = await asyncio.wait_for(pool.acquire(), DB_POOL_TIMEOUT)
+    except asyncio.TimeoutError:
+        _stats["timeouts"] += 1
+        raise AsyncPoolTimeout(f"No database connection available after {DB_POOL_TIMEOUT}s "
+                               f"({pool.size - pool.freesize} of {pool.maxsize} in use).")
+    # The pool only discards connections closed by the server when it has already read their EOF, so a connection
+    # idle for a while is pinged, which reopens it if the server has dropped it
+    if asyncio.get_running_loop().time() - connection.last_usage > DB_POOL_VALIDATE_AFTER_SECONDS:
+        _stats["validated"] += 1
+        try:
+            await connection.ping(reconnect=True)
+        except Exception:
+            _stats["invalid"] += 1
+            connection.close()
+            pool.release(connection)
+            raise
+    waited = time.monotonic() - started
+    _stats["checkouts"] += 1
+    _stats["total_wait_seconds"] += waited
+    _stats["max_wait_seconds"] = max(_stats["max_wait_seconds"], waited)
+    try:
+        yield connection
+    finally:
+        try:
+            # Do not hand an open transaction to the next request; the pool would close the connection instead
+            if connection.get_transaction_status():
+                await connection.rollback()
+        except Exception:
+            connection.close()
+        pool.release(connection)
+
+async def close_async_db_pool() -> None:
+    """
+    Closes the application-wide async pool, e.g. on FastAPI shutdown.
+    """
+    global _pool
+    async with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.close()
+        await pool.wait_closed()
+        logging_module.log_success("Closed the async MySQL connection pool.")
+
+def get_async_pool_stats() -> dict:
+    """
+    Returns the occupancy of the application-wide async pool and the number and wait times of the checkouts so far.
+    """
+    stats = dict(_stats)
+    stats["average_wait_seconds"] = stats["total_wait_seconds"] / stats["checkouts"] if stats["checkouts"] else 0.0
+    if _pool is not None:
+        stats.update({"size": _pool.maxsize, "open": _pool.size, "idle": _pool.freesize,
+                      "in_use": _pool.size - _pool.freesize})
+    return stats
@@ -1,8 +1,16 @@
+from contextlib import asynccontextmanager
 from .routes import auth_routes, data_routes, openai_routes
+from .config.async_db_connection import close_async_db_pool
 from fastapi import FastAPI
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Close the pooled database connections on shutdown
+    await close_async_db_pool()
+
 # Create FastAPI instance
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # Include the routers
 app.include_router(auth_routes.router, prefix="/auth", tags=["auth"])
@@ -1,3 +1,4 @@
+import asyncio
 from fastapi import APIRouter, HTTPException, status
 from fast_api.schemas.request_schemas import LoginRequest, RegisterUserRequest
 from fast_api.services.auth_service import hash_password, create_jwt_token
@@ -6,16 +7,17 @@ from fast_api.models.user_models import fetch_user_from_db, insert_user
 router = APIRouter()
 
 @router.post("/register/")
-def register(request: RegisterUserRequest):
+async def register(request: RegisterUserRequest):
     username = request.username
     password = request.password
     first_name = request.first_name
     last_name = request.last_name
     email = request.email
-    user = fetch_user_from_db(username)
+    user = await fetch_user_from_db(username)
     if user is None:
-        # Insert the user with the hashed password into the database
-        insert_user(first_name, username, hash_password(password))  # Ensure this function inserts hashed password
+        # Insert the user with the hashed password into the database; reading the secret key may call SSM
+        hashed_password = await asyncio.to_thread(hash_password, password)
+        await insert_user(first_name, username, hashed_password)  # Ensure this function inserts hashed password
         return {"message": "User registered successfully"}
     else:
         raise HTTPException(
@@ -25,18 +27,20 @@ def register(request: RegisterUserRequest):
         )
     
 @router.post("/login/")
-def login(request: LoginRequest):
+async def login(request: LoginRequest):
     username = request.username
     password = request.password
-    user = fetch_user_from_db(username)
+    user = await fetch_user_from_db(username)
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail='User not found.',
             headers={"WWW-Authenticate": "Bearer"},
         )
-    if user.iloc[0]["username"] and user.iloc[0]["hashed_password"] == hash_password(password):
-        token, expiration = create_jwt_token({"username": username})
+    # Reading the secret key may call SSM once the configuration cache expires
+    hashed_password = await asyncio.to_thread(hash_password, password)
+    if user.iloc[0]["username"] and user.iloc[0]["hashed_password"] == hashed_password:
+        token, expiration = await asyncio.to_thread(create_jwt_token, {"username": username})
         return {"access_token": token,
                 "token_type": "bearer",
                 "expires": expiration.isoformat(),
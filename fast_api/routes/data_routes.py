@@ -1,33 +1,40 @@
-from fastapi import APIRouter, HTTPException, status, Depends
+from fastapi import APIRouter, HTTPException, status, Depends, Header, Response
 from fast_api.schemas.request_schemas import DownloadRequest
 from fast_api.services.auth_service import get_current_user
-from fast_api.services.data_service import fetch_data_from_db, download_file
+from fast_api.services.data_service import download_file
+from fast_api.services.catalogue_service import catalogue_cache, etag_matches
+from fast_api.config.async_db_connection import get_async_pool_stats
 import pandas as pd
-from typing import List, Dict
+from typing import List, Dict, Optional
 from project_logging import logging_module
 
 router = APIRouter()
 
 @router.get("/fetch-questions/", response_model=List[dict])
-def get_questions_for_user(current_user: Dict = Depends(get_current_user)):
+async def get_questions_for_user(current_user: Dict = Depends(get_current_user),
+                                 if_none_match: Optional[str] = Header(None)):
 
     # Log the user who is making the request
     logging_module.log_success(f"User '{current_user['username']}' is fetching data from the database.")
 
-    # Fetch data from the database
-    data = fetch_data_from_db()
+    # Fetch the cached catalogue, rebuilt from the database when it is out of date
+    body, etag = await catalogue_cache.get()
 
-    if isinstance(data, pd.DataFrame):
-        return data.to_dict(orient="records")
-    else:
+    if body is None:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="No data returned from the database",
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+    # Clients revalidate on every load, and skip the body when their copy is current
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
 @router.get("/fetch-download-url/", response_model=Dict)
-def get_download_url(request: DownloadRequest, current_user: Dict = Depends(get_current_user)):
+async def get_download_url(request: DownloadRequest, current_user: Dict = Depends(get_current_user)):
 
     # Log the user who is making the request
     logging_module.log_success(f"User '{current_user['username']}' is fetching data from the database.")
@@ -36,9 +43,17 @@ def get_download_url(request: DownloadRequest, current_user: Dict = Depends(get_
     df = pd.DataFrame(request.df)
     question = request.question
     extraction_method = request.extraction_method
+    include_images = request.include_images is not False
 
-    logging_module.log_success(f"Question: {question}, Extraction Method: {extraction_method}")
+    logging_module.log_success(f"Question: {question}, Extraction Method: {extraction_method}, Include Images: {include_images}, "
+                               f"Pages: {request.first_page}-{request.last_page}")
 
-    download_url = download_file(question, df, extraction_method)
+    download_url = await download_file(question, df, extraction_method, include_images, request.first_page, request.last_page)
                   
-    return download_url
\ No newline at end of file
+    return download_url
+
+@router.get("/db-pool-stats/", response_model=Dict)
+async def get_db_pool_stats(current_user: Dict = Depends(get_current_user)):
+
+    # Occupancy and checkout wait times of the database connection pool, used to size the pool under load
+    return get_async_pool_stats()
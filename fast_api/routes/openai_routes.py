@@ -1,3 +1,4 @@
+import asyncio
 from fastapi import APIRouter, Depends
 from fast_api.schemas.request_schemas import OpenAIRequest
 from fast_api.services.auth_service import get_current_user
@@ -8,7 +9,7 @@ from typing import Dict, Optional
 router = APIRouter()
 
 @router.get("/fetch-openai-response/", response_model=Optional[str])
-def get_openai_response(request: OpenAIRequest, current_user: Dict = Depends(get_current_user)):
+async def get_openai_response(request: OpenAIRequest, current_user: Dict = Depends(get_current_user)):
     
     # Log the user who is making the request
     logging_module.log_success(f"User '{current_user['username']}' is sending request to OpenAI.")
@@ -19,11 +20,14 @@ def get_openai_response(request: OpenAIRequest, current_user: Dict = Depends(get
     file_extract = request.file_extract
     loaded_file = request.loaded_file
     
-    client = OpenAIClient()
+    def send_prompt():
+        client = OpenAIClient()
 
-    if file_extract and loaded_file:
-        response = client.file_validation_prompt(loaded_file["path"], question_selected, model)
-    else:
-        response = client.validation_prompt(question_selected, model, annotated_steps)
+        if file_extract and loaded_file:
+            return client.file_validation_prompt(loaded_file["path"], question_selected, model)
+        return client.validation_prompt(question_selected, model, annotated_steps)
+
+    # The OpenAI client blocks while the model answers, so the request runs in a worker thread
+    response = await asyncio.to_thread(send_prompt)
 
     return response
\ No newline at end of file
@@ -16,6 +16,9 @@ class DownloadRequest(BaseModel):
     question: str
     df: List[Dict]
     extraction_method: Optional[str] = None
+    include_images: Optional[bool] = Field(True, description="Whether images are inlined into PyMuPDF extracts; False returns the text-only view (optional)")
+    first_page: Optional[int] = Field(None, ge=0, description="The first page of Unstructured extracts to include; a page range returns the text of the elements only (optional)")
+    last_page: Optional[int] = Field(None, ge=0, description="The last page of Unstructured extracts to include (optional)")
 
 class OpenAIRequest(BaseModel):
     model: str = Field(..., min_length=3, max_length=15, description="The model to send the request to")
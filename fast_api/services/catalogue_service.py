@@ -0,0 +1,103 @@
+# This Python script caches the question catalogue served by `GET /data/fetch-questions/` in the FastAPI process.
+# The catalogue is read from gaia_metadata_tbl_pdf and serialised to JSON once, together with a strong ETag (the
+# SHA-256 of the body), and reused until it is older than CATALOGUE_TTL_SECONDS or the catalogue version row written
+# by the Airflow DAGs at the end of each run changes. The version row is read at most every
+# CATALOGUE_VERSION_CHECK_SECONDS, so most requests are answered without touching the database, and clients that send
+# the ETag back in `If-None-Match` get `304 Not Modified` without a body.
+
+import os
+import json
+import time
+import asyncio
+import hashlib
+from project_logging import logging_module
+from fast_api.config.async_db_connection import async_db_connection
+from fast_api.services.data_service import fetch_data_from_db
+
+# Seconds after which the catalogue is rebuilt even if its version did not change
+CATALOGUE_TTL_SECONDS = int(os.getenv("CATALOGUE_TTL_SECONDS", "300"))
+
+# Seconds between two reads of the catalogue version
+CATALOGUE_VERSION_CHECK_SECONDS = float(os.getenv("CATALOGUE_VERSION_CHECK_SECONDS", "5"))
+
+class CatalogueCache:
+    """
+    The serialised question catalogue of this process, rebuilt when it expires or its version changes.
+    """
+    def __init__(self, ttl: int = CATALOGUE_TTL_SECONDS, version_check_seconds: float = CATALOGUE_VERSION_CHECK_SECONDS):
+        self.ttl = ttl
+        self.version_check_seconds = version_check_seconds
+        self.body = None
+        self.etag = None
+        self.version = None
+        self.expires_at = 0
+        self.version_checked_at = 0
+        # Incremented by every rebuild
+        self.generation = 0
+        self._lock = asyncio.Lock()
+
+    async def get(self) -> tuple:
+        """
+        Returns the catalogue, rebuilding it first if it is missing, expired or out of date.
+
+        Returns:
+            tuple: The JSON body (bytes) and its strong ETag, or (None, None) if the catalogue cannot be read.
+        """
+        if self.body is not None and time.monotonic() < self.expires_at and not await self.version_changed():
+            return self.body, self.etag
+        generation = self.generation
+        async with self._lock:
+            # Another request may have rebuilt the catalogue while this one waited
+            if self.generation == generation:
+                await self.rebuild()
+            return self.body, self.etag
+
+    async def version_changed(self) -> bool:
+        if time.monotonic() - self.version_checked_at < self.version_check_seconds:
+            return False
+        self.version_checked_at = time.monotonic()
+        version = await fetch_catalogue_version()
+        # An unreadable version leaves the catalogue to the TTL
+        return version is not None and version != self.version
+
+    async def rebuild(self) -> None:
+        # Read the version first, so that a change made while the rows are read triggers another rebuild
+        version = await fetch_catalogue_version()
+        data = await fetch_data_from_db()
+        if data is None:
+            # Keep serving the previous catalogue, if any, and retry on the next request
+            self.expires_at = 0
+            return
+        body = json.dumps(data.to_dict(orient="records"), separators=(',', ':'), default=str).encode('utf-8')
+        self.body, self.etag = body, f'"{hashlib.sha256(body).hexdigest()}"'
+        self.version, self.version_checked_at = version, time.monotonic()
+        self.expires_at = time.monotonic() + self.ttl
+        self.generation += 1
+        logging_module.log_success(f"Cached the question catalogue (version {version}, {len(body)} bytes).")
+
+async def fetch_catalogue_version() -> int:
+    """
+    Returns the catalogue version published by the Airflow DAGs, or None if it cannot be read.
+    """
+    try:
+        async with async_db_connection() as mydb:
+            async with mydb.cursor() as mydata:
+                await mydata.execute("SELECT version FROM gaia_catalogue_version WHERE id = 1")
+                row = await mydata.fetchone()
+        return row[0] if row else None
+    except Exception as e:
+        # Without the version row, the catalogue is only refreshed by the TTL
+        logging_module.log_error(f"Error reading the question catalogue version: {e}")
+        return None
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """
+    Returns whether an `If-None-Match` header matches the ETag, using the weak comparison required for GET requests.
+    """
+    if not if_none_match or not etag:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(',')]
+    return '*' in candidates or etag in [candidate.removeprefix('W/') for candidate in candidates]
+
+# The catalogue cache of this process
+catalogue_cache = CatalogueCache()
@@ -1,22 +1,47 @@
-import mysql.connector
+import asyncio
+import pymysql
 import pandas as pd
-from fast_api.config.db_connection import close_my_sql_connection, get_db_connection
+from fast_api.config.async_db_connection import async_db_connection
 from project_logging import logging_module
 import boto3
 from urllib.parse import urlparse, unquote
 import os
+import re
+import json
+import base64
 import requests
 import tempfile
 from project_logging import logging_module
 import pandas as pd
-from parameter_config import ACCESS_KEY_ID_AWS, SECRET_ACCESS_KEY_AWS
+import pyarrow as pa
+import pyarrow.parquet as pq
+from botocore.exceptions import ClientError
+import parameter_config
 
-# Initialize S3 client
-s3 = boto3.client('s3',
-                  aws_access_key_id=ACCESS_KEY_ID_AWS,
-                  aws_secret_access_key=SECRET_ACCESS_KEY_AWS)
+# S3 client, created on first use so that importing the service does not resolve the credentials
+_s3_client = None
+_s3_credentials = None
 
-def fetch_data_from_db() -> pd.DataFrame:
+def get_s3_client():
+    """
+    Returns the S3 client, created again when the credentials in the parameter store have changed.
+    """
+    global _s3_client, _s3_credentials
+    credentials = (parameter_config.ACCESS_KEY_ID_AWS, parameter_config.SECRET_ACCESS_KEY_AWS)
+    if _s3_client is None or credentials != _s3_credentials:
+        _s3_client = boto3.client('s3', aws_access_key_id=credentials[0], aws_secret_access_key=credentials[1])
+        _s3_credentials = credentials
+    return _s3_client
+
+# References left in the PyMuPDF extracts for images stored as separate content-addressed objects
+IMAGE_REFERENCE_PATTERN = re.compile(r'!\[([^\]]*)\]\((open_source_images/[0-9a-f]{64}\.([A-Za-z0-9.+-]+))\)')
+
+# Columnar element stores built from the Unstructured JSON output, and the columns served to clients
+UNSTRUCTURED_PREFIX = 'unstructured_extract/'
+ELEMENT_PREFIX = 'unstructured_elements/'
+ELEMENT_COLUMNS = ['type', 'page_number', 'text']
+
+async def fetch_data_from_db() -> pd.DataFrame:
     """
     Fetches data from the 'user login' table in the MySQL database and returns it as a pandas DataFrame.
 
@@ -24,32 +49,26 @@ def fetch_data_from_db() -> pd.DataFrame:
         pd.DataFrame: A DataFrame containing the data fetched from the database, or None if an error occurs.
     """
     try:
-        # Connect to MySQL database
-        mydb = get_db_connection()
-        
-        if mydb.is_connected():
-            logging_module.log_success("Connected to the database for fetching data.")
-
-            # Create a cursor object
-            mydata = mydb.cursor()
+        # Check a connection out of the async pool
+        async with async_db_connection() as mydb:
+            async with mydb.cursor() as mydata:
+                # Execute the query
+                await mydata.execute("SELECT * FROM gaia_metadata_tbl_pdf")
 
-            # Execute the query
-            mydata.execute("SELECT * FROM gaia_metadata_tbl_pdf")
-            
-            # Fetch all the data
-            myresult = mydata.fetchall()
+                # Fetch all the data
+                myresult = await mydata.fetchall()
 
-            logging_module.log_success("Fetched data from gaia_metadata_tbl_pdf")
+                logging_module.log_success("Fetched data from gaia_metadata_tbl_pdf")
 
-            # Get column names
-            columns = [col[0] for col in mydata.description]
+                # Get column names
+                columns = [col[0] for col in mydata.description]
 
-            # Store the fetched data into a pandas DataFrame
-            df = pd.DataFrame(myresult, columns=columns)
+        # Store the fetched data into a pandas DataFrame
+        df = pd.DataFrame(myresult, columns=columns)
 
-            return df
+        return df
 
-    except mysql.connector.Error as e:
+    except pymysql.Error as e:
         logging_module.log_error(f"Database error occurred: {e}")
         return None
 
@@ -57,9 +76,37 @@ def fetch_data_from_db() -> pd.DataFrame:
         logging_module.log_error(f"An unexpected error occurred: {e}")
         return None
 
-    finally:
-        # Ensure that the cursor and connection are properly closed
-        close_my_sql_connection(mydb, mydata)
+# Columns of gaia_metadata_tbl_pdf holding the S3 URL of each extraction method
+URL_COLUMNS = {'U': 'unstructured_api_url', 'P': 'opensource_url'}
+DEFAULT_URL_COLUMN = 's3_url'
+
+async def fetch_url_for_question(question: str, extraction_method: str = None) -> dict:
+    """
+    Looks up the S3 URL of a question through the indexed SHA-256 hash of the question, instead of scanning the table.
+
+    Args:
+        question (str): The question text.
+        extraction_method (str, optional): 'U' for the Unstructured output, 'P' for the PyMuPDF output, or None for
+            the source file.
+
+    Returns:
+        dict: A dictionary with the keys "found" (bool) and "url" (str or None), or None if the lookup failed.
+    """
+    url_column = URL_COLUMNS.get(extraction_method, DEFAULT_URL_COLUMN)
+    try:
+        async with async_db_connection() as mydb:
+            async with mydb.cursor() as mydata:
+                # The hash narrows the search to the index, the text comparison guards against collisions
+                await mydata.execute(f"""
+                    SELECT {url_column} FROM gaia_metadata_tbl_pdf
+                    WHERE question_hash = SHA2(%s, 256) AND Question = %s
+                    LIMIT 1
+                """, (question, question))
+                row = await mydata.fetchone()
+        return {"found": row is not None, "url": row[0] if row else None}
+    except Exception as e:
+        logging_module.log_error(f"Error looking up the question in the database: {e}")
+        return None
 
 def parse_s3_url(url: str) -> tuple:
     """
@@ -91,60 +138,124 @@ def generate_presigned_url(s3_url: str, expiration: int = 3600) -> str:
     
     try:
         # Generate pre-signed URL that expires in the given time (default: 1 hour)
-        presigned_url = s3.generate_presigned_url('get_object',
-                                                  Params={'Bucket': bucket_name, 'Key': object_key},
-                                                  ExpiresIn=expiration)
+        presigned_url = get_s3_client().generate_presigned_url('get_object',
+                                                               Params={'Bucket': bucket_name, 'Key': object_key},
+                                                               ExpiresIn=expiration)
         return presigned_url
     except Exception as e:
         logging_module.log_error(f"Error generating pre-signed URL: {e}")
         return None
 
-def process_data_and_generate_url(question: str, df, extraction_method: str = None) -> str:
+async def process_data_and_generate_url(question: str, df, extraction_method: str = None) -> str:
     """
-    Fetches data from the database, extracts the S3 URL for the specified question, and generates a pre-signed URL if available.
+    Looks up the S3 URL for the specified question in the database, and generates a pre-signed URL if available.
+    The rows sent by the client are only used when the database lookup fails.
 
     Args:
         question (str): The question for which the associated S3 URL needs to be retrieved.
+        df (pd.DataFrame): The metadata rows sent by the client, used as a fallback.
+        extraction_method (str, optional): 'U' for the Unstructured output, 'P' for the PyMuPDF output, or None for
+            the source file.
 
     Returns:
         str: A pre-signed URL for the S3 file if available.
     """
-    if df is not None:
-        # Extract the S3 URL for the specified Question
+    lookup = await fetch_url_for_question(question, extraction_method)
+    if lookup is None and df is not None:
+        # Fall back to the rows sent by the client
         matching_rows = df[df['Question'] == question]
-        if not matching_rows.empty:
-            if extraction_method == 'U':
-                s3_url_variable = matching_rows['unstructured_api_url'].values[0]
-                print("S3 URL: ", s3_url_variable)
-                logging_module.log_success(f"Unstructured S3 URL: {s3_url_variable}")
-            elif extraction_method == 'P':
-                s3_url_variable = matching_rows['opensource_url'].values[0]
-                logging_module.log_success(f"PyMuPDF S3 URL: {s3_url_variable}")
-            else:
-                s3_url_variable = matching_rows['s3_url'].values[0]
-                logging_module.log_success(f"S3 URL: {s3_url_variable}")
-
-            # Check if s3_url_variable is null
-            if s3_url_variable is not None:
-                # Generate a pre-signed URL for the S3 file
-                presigned_url = generate_presigned_url(s3_url_variable, expiration=3600)  # URL valid for 1 hour
-                return presigned_url
-            else:
-                logging_module.log_success("No File is associated with this Question")
-                return None
-        else:
-            logging_module.log_error("No matching Question found")
-            return None
-    else:
+        lookup = {"found": not matching_rows.empty,
+                  "url": matching_rows[URL_COLUMNS.get(extraction_method, DEFAULT_URL_COLUMN)].values[0]
+                         if not matching_rows.empty else None}
+
+    if lookup is None:
         logging_module.log_error("Failed to fetch data from the database")
         return None
+    if not lookup["found"]:
+        logging_module.log_error("No matching Question found")
+        return None
+
+    s3_url_variable = lookup["url"]
+    logging_module.log_success(f"S3 URL ({URL_COLUMNS.get(extraction_method, DEFAULT_URL_COLUMN)}): {s3_url_variable}")
+
+    # Check if s3_url_variable is null
+    if s3_url_variable is not None:
+        # Generate a pre-signed URL for the S3 file; resolving the S3 credentials may call SSM
+        presigned_url = await asyncio.to_thread(generate_presigned_url, s3_url_variable, 3600)  # URL valid for 1 hour
+        return presigned_url
+    else:
+        logging_module.log_success("No File is associated with this Question")
+        return None
  
-def download_file(question: str, df: pd.DataFrame, extraction_method: str = None) -> dict:
+def render_image_references(md_text: str, bucket_name: str, include_images: bool = True) -> str:
+    """
+    Renders the image references of a PyMuPDF extract either as a text-only view or with the images inlined.
+
+    Args:
+        md_text (str): The markdown text containing `![](open_source_images/...)` references.
+        bucket_name (str): The S3 bucket holding the images.
+        include_images (bool, optional): Whether the images are inlined as base64 data URIs. Defaults to True.
+
+    Returns:
+        str: The markdown text without image references, or with each reference replaced by the inlined image.
+    """
+    if not include_images:
+        return IMAGE_REFERENCE_PATTERN.sub('', md_text)
+
+    images = {}
+    def inline_image(match) -> str:
+        alt_text, image_key, image_format = match.groups()
+        if image_key not in images:
+            image_obj = get_s3_client().get_object(Bucket=bucket_name, Key=image_key)
+            images[image_key] = base64.b64encode(image_obj['Body'].read()).decode()
+        return f"![{alt_text}](data:image/{image_format};base64,{images[image_key]})"
+
+    return IMAGE_REFERENCE_PATTERN.sub(inline_image, md_text)
+
+def read_element_store(bucket_name: str, json_key: str, first_page: int = None, last_page: int = None) -> list:
+    """
+    Reads the text elements of an Unstructured extract from its columnar element store, optionally for a page range.
+    Only the row groups of the requested pages and the type, page number and text columns are decoded.
+
+    Args:
+        bucket_name (str): The S3 bucket holding the element store.
+        json_key (str): The S3 key of the Unstructured JSON output, e.g. `unstructured_extract/<file>.pdf.json`.
+        first_page (int, optional): The first page to read. Defaults to the first page of the document.
+        last_page (int, optional): The last page to read (inclusive). Defaults to the last page of the document.
+
+    Returns:
+        list: The elements as dictionaries with the keys "type", "page_number" and "text", or None if the element
+            store does not exist.
+    """
+    store_key = ELEMENT_PREFIX + json_key.split('/')[-1].removesuffix('.json') + '.parquet'
+    try:
+        store_obj = get_s3_client().get_object(Bucket=bucket_name, Key=store_key)
+    except ClientError:
+        return None
+
+    parquet_file = pq.ParquetFile(pa.BufferReader(store_obj['Body'].read()))
+    page_index = json.loads(parquet_file.schema_arrow.metadata[b'page_index'])
+    row_groups = [
+        row_group for row_group, (page_number, _, _) in enumerate(page_index)
+        if (first_page is None or page_number >= first_page) and (last_page is None or page_number <= last_page)
+    ]
+    return parquet_file.read_row_groups(row_groups, columns=ELEMENT_COLUMNS).to_pylist()
+
+async def download_file(question: str, df: pd.DataFrame, extraction_method: str = None, include_images: bool = True,
+                        first_page: int = None, last_page: int = None) -> dict:
     """
     Downloads a file from the given URL and saves it as a temporary file with the appropriate extension.
+    For PyMuPDF extracts with externalised images, the images are inlined again unless `include_images` is False, which
+    returns the text-only view.
+    For Unstructured extracts, the full JSON output is downloaded unless a page range is requested, in which case only
+    the text elements of those pages are read from the columnar element store when it exists.
 
     Args:
         url (str): The URL of the file to be downloaded.
+        include_images (bool, optional): Whether images are inlined into PyMuPDF extracts. Defaults to True.
+        first_page (int, optional): The first page of Unstructured extracts to include. Defaults to the first page.
+        last_page (int, optional): The last page of Unstructured extracts to include. Defaults to the last page.
+            Without either page, the full JSON output with the metadata of every element is returned.
 
     Returns:
         dict: A dictionary containing the following keys:
@@ -152,8 +263,17 @@ def download_file(question: str, df: pd.DataFrame, extraction_method: str = None
             - "path" (str): The path to the downloaded temporary file.
             - "extension" (str): The file extension of the downloaded file.
     """
+    file_name = await process_data_and_generate_url(question, df, extraction_method)
+
+    # The download and the file write block, so they run in a worker thread
+    return await asyncio.to_thread(save_file, file_name, extraction_method, include_images, first_page, last_page)
+
+def save_file(file_name: str, extraction_method: str = None, include_images: bool = True, first_page: int = None,
+              last_page: int = None) -> dict:
+    """
+    Downloads the file behind a pre-signed URL into a temporary file, see `download_file`.
+    """
     # Parse the URL to extract the file name
-    file_name = process_data_and_generate_url(question, df, extraction_method)
     parsed_url = urlparse(file_name)
     path = unquote(parsed_url.path)
     filename = os.path.basename(path)
@@ -166,12 +286,30 @@ def download_file(question: str, df: pd.DataFrame, extraction_method: str = None
     # Create a temporary file in the specified directory
     temp = tempfile.NamedTemporaryFile(delete=False, suffix=extension, dir=temp_dir)
 
-    # Get the file from the URL
-    response = requests.get(file_name)
-    response.raise_for_status()  # Check if the download was successful
+    # The element store only holds the type, page number and text of each element, so it only serves page ranges
+    elements = None
+    page_range = first_page is not None or last_page is not None
+    if extraction_method == 'U' and page_range and UNSTRUCTURED_PREFIX in path:
+        bucket_name, object_key = parse_s3_url(file_name)
+        try:
+            elements = read_element_store(bucket_name, unquote(object_key), first_page, last_page)
+        except Exception as e:
+            logging_module.log_error(f"Error reading the element store, falling back to the JSON output: {e}")
+
+    if elements is not None:
+        content = json.dumps(elements, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    else:
+        # Get the file from the URL
+        response = requests.get(file_name)
+        response.raise_for_status()  # Check if the download was successful
+        content = response.content
+
+    if extraction_method == 'P':
+        bucket_name, _ = parse_s3_url(file_name)
+        content = render_image_references(content.decode('utf-8'), bucket_name, include_images).encode('utf-8')
 
     # Write the content to the temporary file
-    temp.write(response.content)
+    temp.write(content)
     temp.close()  # Close the file to finalize writing
     
     return {"url": file_name, "path": temp.name, "extension": extension}
\ No newline at end of file
@@ -1,4 +1,17 @@
-import boto3
+# This Python script provides the configuration of the FastAPI service and the Streamlit app, stored in the AWS SSM
+# Parameter Store. Parameters are resolved lazily on first access (e.g. `parameter_config.RDS_HOST_AWS`) rather than at
+# import, so that worker and session start-up do not wait on SSM. Resolution, the TTL, the encrypted on-disk cache
+# (CONFIG_CACHE_PATH) and the environment variable fallback are provided by the `ConfigProvider` shared with the
+# Airflow pipeline, which lives with the DAGs in `airflow/dags/data_load/config_provider.py` and is copied next to
+# this file in the image.
+
+import os
+import sys
+import tempfile
+
+# Load the shared provider from the image, or from the DAGs folder of a checkout
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "airflow", "dags", "data_load"))
+from config_provider import ConfigProvider
 
 # Define the parameter names to be retrieved
 parameter_names = [
@@ -14,27 +27,18 @@ parameter_names = [
     'FASTAPI_DEV_URL'
 ]
 
-# Create an SSM client
-ssm_client = boto3.client('ssm', region_name='us-east-1')  # Replace 'your-region' with your AWS region
+# Module attributes that differ from their parameter name
+ATTRIBUTE_PARAMETERS = {'FAST_API_DEV_URL': 'FASTAPI_DEV_URL'}
 
-# Retrieve parameters from AWS SSM Parameter Store
-response = ssm_client.get_parameters(
-    Names=parameter_names,
-    WithDecryption=True  # Ensure secure strings are decrypted
-)
+# Encrypted on-disk cache of the last values read from SSM; disabled when no CONFIG_CACHE_KEY is configured
+CONFIG_CACHE_PATH = os.getenv("CONFIG_CACHE_PATH", os.path.join(tempfile.gettempdir(), "parameter_config.cache"))
 
-# Extract parameters from the response
-parameters = response.get('Parameters', [])
-parameters_dict = {param['Name']: param['Value'] for param in parameters}
+# The shared provider of this process
+provider = ConfigProvider(parameter_names, CONFIG_CACHE_PATH)
 
-# Store the values in variables
-ACCESS_KEY_ID_AWS = parameters_dict.get('ACCESS_KEY_ID_AWS')
-SECRET_ACCESS_KEY_AWS = parameters_dict.get('SECRET_ACCESS_KEY_AWS')
-RDS_HOST_AWS = parameters_dict.get('RDS_HOST_AWS')
-RDS_USERNAME_AWS = parameters_dict.get('RDS_USERNAME_AWS')
-RDS_PASSWORD_AWS = parameters_dict.get('RDS_PASSWORD_AWS')
-RDS_DB_PORT_AWS = parameters_dict.get('RDS_DB_PORT_AWS')
-RDS_DATABASE_AWS = parameters_dict.get('RDS_DATABASE_AWS')
-OPENAI_API_KEY = parameters_dict.get('OPENAI_API_KEY')
-SECRET_KEY = parameters_dict.get('SECRET_KEY')
-FAST_API_DEV_URL = parameters_dict.get('FASTAPI_DEV_URL')
\ No newline at end of file
+def __getattr__(name: str):
+    # Resolve the parameters on attribute access, e.g. `parameter_config.RDS_HOST_AWS`
+    parameter_name = ATTRIBUTE_PARAMETERS.get(name, name)
+    if parameter_name in parameter_names:
+        return provider.get(parameter_name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -2,20 +2,35 @@ import requests
 import pandas as pd
 from project_logging import logging_module
 
+# Last question catalogue received from each API, with its ETag
+_questions_cache = {}
+
 def fetch_questions(api_url, headers):
+    cached = _questions_cache.get(api_url)
+    if cached:
+        # Revalidate the cached catalogue; the API answers 304 without a body when it is unchanged
+        headers = {**headers, "If-None-Match": cached[0]}
     response = requests.get(f"{api_url}/data/fetch-questions/", headers=headers)
+    if response.status_code == 304 and cached:
+        return cached[1]
     if response.status_code == 200:
-        return pd.DataFrame(response.json())
+        data = pd.DataFrame(response.json())
+        if response.headers.get("ETag"):
+            _questions_cache[api_url] = (response.headers["ETag"], data)
+        return data
     else:
         logging_module.log_error(f"Error: {response.status_code} - {response.text}")
         return None
 
-def fetch_download_url(api_url, question_selected, dataframe, headers, extraction_method = None):
+def fetch_download_url(api_url, question_selected, dataframe, headers, extraction_method = None, include_images = True, first_page = None, last_page = None):
     df_json = dataframe.to_dict(orient="records")
     payload = {
         "question": question_selected,
         "df": df_json,
-        "extraction_method": extraction_method
+        "extraction_method": extraction_method,
+        "include_images": include_images,
+        "first_page": first_page,
+        "last_page": last_page
     }
     response = requests.get(f"{api_url}/data/fetch-download-url/", json=payload, headers=headers)
     return response.json() if response.status_code == 200 else None
@@ -20,8 +20,8 @@ def extract_json_contents(file_path):
         # Load the JSON data
         data = json.load(file)
 
-    # Convert the JSON data to a formatted string
-    json_string = json.dumps(data, indent=4)
+    # Convert the JSON data to a compact string, as whitespace only adds tokens to the prompt
+    json_string = json.dumps(data, ensure_ascii=False, separators=(',', ':'))
     
     return json_string
 